@@ -0,0 +1,103 @@
+"""
+ASGI 入口：
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5409
+
+main.py 中的路由保持不变，由 asgiref 转换为 ASGI 应用；与 app.run() 相比：
+  - 服务器自身的事件循环即共享事件循环（myUtils/async_runtime.py），
+    async 视图、登录、打开账号、账号校验、发布任务都以 task 形式运行在该循环上
+  - 同步视图在独立线程池中执行（ASGI_THREADS），互不阻塞
+  - 登录 SSE（/login）由原生 ASGI 处理（login_sse），在事件循环上等待登录消息，不占用线程池；
+    通过 receive() 收到 http.disconnect 时立即取消登录会话并关闭其浏览器上下文
+启动/退出通过 lifespan 事件完成（初始化数据库、启动发布 worker 和账号后台刷新）。
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import main
+from myUtils.async_runtime import get_runtime
+
+# 执行同步视图的线程数，每个进行中的请求占用一个（登录 SSE 不占用）
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '64'))
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="wsgi")
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    # asgiref 默认 thread_sensitive=True，会把所有请求串行到同一个线程上执行
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False, executor=_executor)
+
+
+class _WsgiApp(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _WsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+_flask_app = _WsgiApp(main.app)
+
+
+async def login_sse(scope, receive, send) -> None:
+    """/login 的原生 ASGI 实现：与 main.login 相同的参数和事件流，同时监听客户端断开。"""
+    args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+    status_queue, session_id, on_close = main.start_login(*main.login_params(args))
+    headers = dict(main.LOGIN_SSE_HEADERS, **{'X-Login-Session': session_id, 'Access-Control-Allow-Origin': '*'})
+
+    async def stream() -> None:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+        async for chunk in main.sse_stream_async(status_queue, session_id):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def disconnected() -> None:
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    pump = asyncio.ensure_future(stream())
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        # 流正常结束，或客户端先断开（此时 send 不会报错，只能通过 receive 得知）
+        await asyncio.wait({pump, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump, watcher):
+            task.cancel()
+        await asyncio.gather(pump, watcher, return_exceptions=True)
+        on_close()
+    if pump.done() and not pump.cancelled() and pump.exception() is not None:
+        raise pump.exception()
+
+
+# 由原生 ASGI 处理的 SSE 路由（GET），其余请求交给 Flask
+SSE_ROUTES = {'/login': login_sse}
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                get_runtime().attach(asyncio.get_running_loop())
+                # 初始化数据库、启动 worker 线程都是同步操作，放到线程中执行
+                await asyncio.to_thread(main.startup)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] in SSE_ROUTES:
+        await SSE_ROUTES[scope['path']](scope, receive, send)
+    else:
+        await _flask_app(scope, receive, send)
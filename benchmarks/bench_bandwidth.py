@@ -0,0 +1,177 @@
+"""
+带宽调度压测：在模拟的上行链路上对比不调度（全部同时传输）与 BandwidthScheduler 的效果，不需要真实平台。
+
+    python benchmarks/bench_bandwidth.py --items 24 --uplink-mbps 32 --timeout 300
+
+模拟模型（虚拟时钟，几秒内跑完）：
+  - 链路总速率固定，同时传输的文件平分带宽（processor sharing），单个传输另有平台侧速率上限
+  - 每个发布项：打开页面（--prep 秒）-> 传输文件 -> 点击发布（--publish 秒）；传输超过 --timeout 秒按平台超时失败
+  - 定时发布时间随机，调度器按发布时间先后放行；与 run_publish_batch 相同，先等带宽准入再占并发名额（--concurrency）
+输出完成数、超时数、成功传输的数据量和总耗时、平均传输耗时以及优先级倒置比例（发布时间早的反而更晚开始传输的发布项对所占比例）。
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import random
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.bandwidth import BandwidthScheduler  # noqa: E402
+
+MB = 1024 * 1024
+
+
+class SimulatedLink:
+    """虚拟时钟驱动的共享上行链路。"""
+
+    def __init__(self, capacity: float, per_transfer_cap: float, dt: float = 0.1):
+        self.capacity = capacity
+        self.per_transfer_cap = per_transfer_cap
+        self.dt = dt
+        self.now = 0.0
+        self._timers = []
+        self._seq = itertools.count()
+        # [剩余字节, 截止时间, future]
+        self._transfers = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._timers, (self.now + seconds, next(self._seq), future))
+        return future
+
+    def transfer(self, size: int, timeout: float) -> asyncio.Future:
+        """返回的 future 在传输完成时为 True，超时为 False。"""
+        future = asyncio.get_running_loop().create_future()
+        self._transfers.append([float(size), self.now + timeout, future])
+        return future
+
+    async def run(self, tasks, on_tick=None) -> None:
+        """on_tick：每推进一步虚拟时间后调用，用于检查调度器状态。"""
+        pending = set(tasks)
+        while pending:
+            # 让所有协程推进到下一个等待点，再推进虚拟时间
+            for _ in range(20):
+                await asyncio.sleep(0)
+            pending = {t for t in pending if not t.done()}
+            self.now += self.dt
+            if self._transfers:
+                rate = min(self.capacity / len(self._transfers), self.per_transfer_cap)
+                still = []
+                for item in self._transfers:
+                    item[0] -= rate * self.dt
+                    if item[0] <= 0:
+                        item[2].set_result(True)
+                    elif self.now >= item[1]:
+                        item[2].set_result(False)
+                    else:
+                        still.append(item)
+                self._transfers = still
+            while self._timers and self._timers[0][0] <= self.now:
+                _, _, future = heapq.heappop(self._timers)
+                if not future.done():
+                    future.set_result(None)
+            if on_tick is not None:
+                on_tick()
+
+
+@dataclass
+class Item:
+    platform: str
+    size: int
+    priority: float
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    transfer_seconds: float = 0.0
+    ok: bool = False
+
+
+def make_items(count: int, seed: int) -> list[Item]:
+    rng = random.Random(seed)
+    return [Item(rng.choice(['douyin', 'kuaishou', 'xhs', 'tencent']), int(rng.uniform(50, 400) * MB),
+                 rng.uniform(0, 3 * 86400)) for _ in range(count)]
+
+
+async def simulate(items: list[Item], args, scheduled: bool, on_tick=None) -> SimulatedLink:
+    """on_tick(scheduler)：每个虚拟时间步之后调用。"""
+    link = SimulatedLink(args.uplink_mbps * MB / 8, args.per_transfer_mbps * MB / 8)
+    scheduler = BandwidthScheduler(capacity=link.capacity if args.known_uplink else None,
+                                   min_rate=args.min_rate_kbps * 1024, initial_slots=args.initial_slots,
+                                   platform_limit=args.platform_max_mb * MB, platform_limits={},
+                                   clock=link.clock)
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def run_one(item: Item):
+        ticket = await scheduler.acquire(item.platform, item.size, item.priority) if scheduled else None
+        try:
+            async with slots:
+                await link.sleep(args.prep)
+                if ticket:
+                    scheduler.start(ticket)
+                item.started_at = link.now
+                item.ok = await link.transfer(item.size, args.timeout)
+                item.transfer_seconds = link.now - item.started_at
+                if ticket:
+                    scheduler.release(ticket, measured=item.ok)
+                if item.ok:
+                    await link.sleep(args.publish)
+        finally:
+            if ticket:
+                scheduler.release(ticket, measured=False)
+        item.finished_at = link.now
+
+    await link.run([asyncio.ensure_future(run_one(item)) for item in items],
+                   on_tick=(lambda: on_tick(scheduler)) if on_tick else None)
+    if scheduled:
+        rate = scheduler.stats()['rate']
+        print(f"  estimated uplink: {rate * 8 / MB:.1f} Mbps after {scheduler.samples} samples" if rate else
+              "  estimated uplink: n/a")
+    return link
+
+
+def inversions(items: list[Item]) -> float:
+    """开始传输的顺序与发布时间顺序不一致的发布项对所占比例（同一时刻开始的不计）。"""
+    pairs = [(a, b) for a, b in itertools.combinations(items, 2) if a.started_at != b.started_at]
+    if not pairs:
+        return 0.0
+    bad = sum(1 for a, b in pairs if (a.priority < b.priority) != (a.started_at < b.started_at))
+    return bad / len(pairs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bandwidth scheduler simulation")
+    parser.add_argument('--items', type=int, default=24)
+    parser.add_argument('--concurrency', type=int, default=8, help="同时进行的发布项（发布 worker × 批内并发）")
+    parser.add_argument('--uplink-mbps', type=float, default=32)
+    parser.add_argument('--per-transfer-mbps', type=float, default=24, help="平台侧单个传输的速率上限")
+    parser.add_argument('--timeout', type=float, default=300, help="平台传输超时（秒）")
+    parser.add_argument('--prep', type=float, default=5, help="打开页面到开始传输的耗时（秒）")
+    parser.add_argument('--publish', type=float, default=5, help="传输完成到发布完成的耗时（秒）")
+    parser.add_argument('--min-rate-kbps', type=float, default=1024)
+    parser.add_argument('--initial-slots', type=int, default=2)
+    parser.add_argument('--platform-max-mb', type=float, default=1024)
+    parser.add_argument('--known-uplink', action='store_true', help="把链路速率直接告诉调度器（UPLOAD_BANDWIDTH_KBPS），不自动测量")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.items} items, uplink {args.uplink_mbps} Mbps, concurrency {args.concurrency}, timeout {args.timeout}s")
+    for scheduled in (False, True):
+        items = make_items(args.items, args.seed)
+        print(f"\n{'scheduler' if scheduled else 'no scheduler'}:")
+        link = asyncio.run(simulate(items, args, scheduled))
+        done = [item for item in items if item.ok]
+        avg = sum(item.transfer_seconds for item in done) / len(done) if done else 0.0
+        delivered = sum(item.size for item in done) / MB
+        print(f"  completed {len(done)}/{len(items)}, timed out {len(items) - len(done)}, "
+              f"delivered {delivered:.0f} MB in {link.now:.0f}s, avg transfer {avg:.0f}s, "
+              f"priority inversions {inversions(items):.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+B站分片上传压测：在本地模拟的 upos 服务（fake_upos.py）上重放一组上传，对比线路和并发分片数的选择策略。
+
+    python benchmarks/bench_bilibili_upload.py --sizes 8,32,64
+
+策略：
+  - fixed：固定线路 bda2、3 个并发分片、不自适应（原先 biliup 默认的做法）
+  - adaptive：固定线路 bda2，从 3 个并发开始按吞吐自适应
+  - auto：探测线路（LineProbe）并按文件大小估算初始并发数（tune_threads），再自适应
+每种策略使用新的线路缓存，第一次上传包含探测耗时，之后命中缓存。
+线路特性（延迟 / 单连接速率 / 总速率）可用 --profile 覆盖，如 --profile qn=0.2,1.5,12。
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_upos import MB, FakeUpos, LineProfile  # noqa: E402
+from uploader.bilibili_uploader.line_probe import LineProbe  # noqa: E402
+from uploader.bilibili_uploader.upos import UposUploader  # noqa: E402
+
+# 线路 -> (延迟秒, 单连接 MB/s, 总速率 MB/s)；默认线路 bda2 并不是最快的
+DEFAULT_PROFILES = {
+    'bda2': (0.05, 2, 4),
+    'bldsa': (0.3, 0.5, 2),
+    'qn': (0.2, 1.5, 12),
+    'ws': (0.02, 4, 6),
+    'tx': (0.1, 1, 3),
+}
+
+STRATEGIES = {
+    'fixed': dict(line='bda2', threads=3, max_threads=3),
+    'adaptive': dict(line='bda2', threads=3),
+    'auto': dict(line='auto', threads=0),
+}
+
+
+class _Quiet:
+    def info(self, message):
+        pass
+
+
+def run_strategy(name: str, fake: FakeUpos, files: list[Path], args, workdir: Path) -> None:
+    options = dict(STRATEGIES[name])
+    options.setdefault('max_threads', args.max_threads)
+    probe = LineProbe(fake.line_table(), 'http', cache_file=workdir / f'{name}-lines.json',
+                      streams=args.probe_streams, payload_kb=args.probe_kb,
+                      chunk_size=int(args.chunk_mb * MB), max_threads=args.max_threads, logger=_Quiet())
+    total_bytes, total_seconds = 0, 0.0
+    print(f"\n{name}:")
+    for file in files:
+        uploader = UposUploader({}, scheme='http', preupload_url=fake.preupload_url, lines=fake.line_table(),
+                                resume_dir=workdir / f'{name}-resume', probe=probe, logger=_Quiet(), **options)
+        started = time.perf_counter()
+        state = uploader.prepare(file)
+        prepared = time.perf_counter()
+        uploader.complete(uploader.transfer(state))
+        elapsed = time.perf_counter() - started
+        size = file.stat().st_size
+        total_bytes += size
+        total_seconds += elapsed
+        limits = [limit for limit, _ in uploader.concurrency.history]
+        print(f"  {size / MB:6.0f} MB  line {state.line:<5} threads {limits[0] if limits else options['threads']}"
+              f"->{uploader.concurrency.limit}  {elapsed:6.2f}s (prepare {prepared - started:.2f}s)  "
+              f"{size / MB / elapsed:5.2f} MB/s")
+    print(f"  total {total_bytes / MB:.0f} MB in {total_seconds:.2f}s, {total_bytes / MB / total_seconds:.2f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bilibili upos upload strategy benchmark")
+    parser.add_argument('--sizes', default='8,32', help="依次上传的文件大小（MB），逗号分隔")
+    parser.add_argument('--strategies', default=','.join(STRATEGIES))
+    parser.add_argument('--chunk-mb', type=float, default=1)
+    parser.add_argument('--max-threads', type=int, default=8)
+    parser.add_argument('--probe-streams', type=int, default=4)
+    parser.add_argument('--probe-kb', type=int, default=256)
+    parser.add_argument('--profile', action='append', default=[], metavar='LINE=LATENCY,STREAM,AGGREGATE')
+    args = parser.parse_args()
+
+    profiles = dict(DEFAULT_PROFILES)
+    for item in args.profile:
+        line, values = item.split('=', 1)
+        profiles[line] = tuple(float(v) for v in values.split(','))
+    print("lines: " + ", ".join(f"{line} {lat * 1000:.0f}ms/{stream}/{agg} MB/s"
+                                for line, (lat, stream, agg) in profiles.items()))
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeUpos({line: LineProfile(*values) for line, values in profiles.items()},
+                     chunk_size=int(args.chunk_mb * MB)) as fake:
+        workdir = Path(tmp)
+        files = []
+        for i, size in enumerate(float(s) for s in args.sizes.split(',')):
+            file = workdir / f'video{i}.mp4'
+            with open(file, 'wb') as f:
+                f.truncate(int(size * MB))
+            files.append(file)
+        for name in args.strategies.split(','):
+            run_strategy(name, fake, files, args, workdir)
+
+
+if __name__ == '__main__':
+    main()
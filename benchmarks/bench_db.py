@@ -0,0 +1,146 @@
+"""
+SQLite 并发读写压测：对比旧写法（每次操作 sqlite3.connect，默认回滚日志）与 myUtils/db.py（连接池 + WAL）。
+
+    python benchmarks/bench_db.py --readers 8 --writers 4 --seconds 5
+
+读线程反复读取账号列表和素材列表，写线程反复更新账号校验状态、新增账号，
+与登录、后台校验、素材列表同时进行的场景类似。输出吞吐、p95 延迟和 database is locked 次数。
+"""
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from myUtils import db  # noqa: E402
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS user_info (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, type INTEGER NOT NULL, filePath TEXT NOT NULL,
+        userName TEXT NOT NULL, status INTEGER DEFAULT 0, last_checked_at REAL, last_result INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS file_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, filesize REAL,
+        upload_time DATETIME DEFAULT CURRENT_TIMESTAMP, file_path TEXT, blob_digest TEXT)''',
+]
+ACCOUNT_COLUMNS = "id, type, filePath, userName, status, last_checked_at, last_result"
+
+
+def prepare(path: Path, accounts: int, files: int) -> None:
+    with sqlite3.connect(path) as conn:
+        for sql in SCHEMA:
+            conn.execute(sql)
+        conn.executemany("INSERT INTO user_info (type, filePath, userName, status) VALUES (?, ?, ?, 1)",
+                         [(i % 5 + 1, f"{i}.json", f"user{i}") for i in range(accounts)])
+        conn.executemany("INSERT INTO file_records (filename, filesize, file_path) VALUES (?, ?, ?)",
+                         [(f"v{i}.mp4", 1.0, f"v{i}.mp4") for i in range(files)])
+
+
+class Legacy:
+    """与迁移前的调用方式一致：每次操作新建连接，写入后 commit。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def read(self, i: int) -> None:
+        with sqlite3.connect(self.path) as conn:
+            if i % 2:
+                conn.execute(f"SELECT {ACCOUNT_COLUMNS} FROM user_info").fetchall()
+            else:
+                conn.row_factory = sqlite3.Row
+                [dict(r) for r in conn.execute("SELECT * FROM file_records")]
+
+    def write(self, i: int) -> None:
+        with sqlite3.connect(self.path) as conn:
+            if i % 10:
+                conn.execute("UPDATE user_info SET status = ?, last_result = ?, last_checked_at = ? WHERE id = ?",
+                             (i % 2, i % 2, time.time(), i % 50 + 1))
+            else:
+                conn.execute("INSERT INTO user_info (type, filePath, userName, status) VALUES (?, ?, ?, ?)",
+                             (3, f"{i}.json", f"new{i}", 1))
+            conn.commit()
+
+
+class Pooled:
+    def __init__(self, path: Path):
+        db.DB_PATH = path
+
+    def read(self, i: int) -> None:
+        if i % 2:
+            db.list_account_rows(ACCOUNT_COLUMNS)
+        else:
+            db.list_file_records()
+
+    def write(self, i: int) -> None:
+        if i % 10:
+            db.update_account_status(i % 50 + 1, i % 2)
+        else:
+            db.save_account(3, f"{i}.json", f"new{i}")
+
+
+def run(backend, readers: int, writers: int, seconds: float) -> dict:
+    stats = {"read": [], "write": [], "locked": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(kind: str, offset: int):
+        op = backend.read if kind == "read" else backend.write
+        latencies, locked, errors, i = [], 0, 0, offset
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                op(i)
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e):
+                    locked += 1
+                else:
+                    errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+            i += 1
+        with lock:
+            stats[kind].extend(latencies)
+            stats["locked"] += locked
+            stats["errors"] += errors
+
+    threads = [threading.Thread(target=worker, args=("read", n)) for n in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", n * 1000)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats
+
+
+def p95(values: list[float]) -> float:
+    if len(values) < 2:
+        return values[0] * 1000 if values else 0.0
+    return statistics.quantiles(values, n=100)[94] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQLite concurrent read/write benchmark")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--files", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'reads/s':>9} {'writes/s':>9} {'read p95':>9} {'write p95':>10} {'locked':>7} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, backend_cls in (("legacy", Legacy), ("pooled", Pooled)):
+            path = Path(tmp) / f"{name}.db"
+            prepare(path, args.accounts, args.files)
+            s = run(backend_cls(path), args.readers, args.writers, args.seconds)
+            print(f"{name:<8} {len(s['read']) / args.seconds:>9.0f} {len(s['write']) / args.seconds:>9.0f} "
+                  f"{p95(s['read']):>7.1f}ms {p95(s['write']):>8.1f}ms {s['locked']:>7} {s['errors']:>7}")
+        db.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
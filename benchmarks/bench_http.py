@@ -0,0 +1,125 @@
+"""
+HTTP 压测：对比 app.run()（WSGI，python main.py）与 ASGI（uvicorn asgi:app）的吞吐和延迟。
+
+    python benchmarks/bench_http.py --mode both --concurrency 32 --requests 2000
+
+每种模式各启动一个服务进程（不启动发布 worker 和账号后台刷新，只读请求），
+用多个线程并发请求指定路径，输出 req/s 与 p50/p95/p99 延迟。
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVER_COMMANDS = {
+    "wsgi": [sys.executable, "-c",
+             "import sys, main; main.startup(); main.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--log-level", "warning", "--port"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, PUBLISH_WORKERS="0", ACCOUNT_REFRESH_ENABLED="0")
+    proc = subprocess.Popen(SERVER_COMMANDS[mode] + [str(port)], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with code {proc.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/getFiles", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def run_load(base_url: str, paths: list[str], concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        local, local_errors = [], 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                if session.get(base_url + paths[i % len(paths)], timeout=30).status_code != 200:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="WSGI vs ASGI HTTP benchmark")
+    parser.add_argument("--mode", choices=["wsgi", "asgi", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--paths", default="/getFiles,/getValidAccounts",
+                        help="逗号分隔的 GET 路径，按顺序轮流请求")
+    args = parser.parse_args()
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    modes = ["wsgi", "asgi"] if args.mode == "both" else [args.mode]
+
+    print(f"{'mode':<6} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode in modes:
+        port = free_port()
+        proc = start_server(mode, port)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            run_load(base_url, paths, args.concurrency, min(args.requests, 100))  # 预热
+            r = run_load(base_url, paths, args.concurrency, args.requests)
+            print(f"{mode:<6} {r['requests']:>8} {r['errors']:>6} {r['rps']:>9.1f} "
+                  f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}")
+        finally:
+            proc.terminate()
+            proc.wait(10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+启动耗时压测：import main 的模块导入耗时（python -X importtime）以及从启动进程到第一个响应的冷启动时间。
+
+    python benchmarks/bench_startup.py --runs 5 --top 15
+
+importtime 部分列出 main 直接导入的各模块的累计耗时，便于发现被提前导入的重量级依赖（Playwright、biliup、xhs 等）；
+冷启动部分每轮启动一个新的服务进程（不启动发布 worker 和账号后台刷新），计时到 /getFiles 返回 200。
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_http import SERVER_COMMANDS, free_port  # noqa: E402
+
+ENV = dict(os.environ, PUBLISH_WORKERS="0", ACCOUNT_REFRESH_ENABLED="0")
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module: str) -> tuple[int, list[tuple[str, int, int]], list[str]]:
+    """
+    返回 (module 的累计耗时 us, [(直接导入的模块, 自身耗时 us, 累计耗时 us)], 全部被导入的模块名)。
+    -X importtime 按导入完成顺序输出，子模块在父模块之前，缩进表示层级。
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=ENV,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3))))
+    end = max(i for i, row in enumerate(rows) if row[0] == module and row[3] == 1)
+    start = end
+    while start > 0 and rows[start - 1][3] > 1:
+        start -= 1
+    children = [(name, own, cumulative) for name, own, cumulative, indent in rows[start:end] if indent == 3]
+    return rows[end][2], children, [row[0] for row in rows[start:end]]
+
+
+def cold_start(mode: str) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(SERVER_COMMANDS[mode] + [str(port)], cwd=ROOT, env=ENV,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{mode} server exited with code {proc.returncode}")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/getFiles", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"{mode} server did not start")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server startup benchmark")
+    parser.add_argument("--module", default="main", help="统计导入耗时的模块")
+    parser.add_argument("--mode", choices=["wsgi", "asgi"], default="wsgi", help="冷启动使用的启动方式")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total, rows, imported = import_times(args.module)
+    print(f"import {args.module}: {total / 1000:.1f} ms, {len(imported)} modules")
+    print(f"{'module':<40} {'cumulative':>11} {'self':>9}")
+    for name, own, cumulative in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>9.1f}ms {own / 1000:>7.1f}ms")
+    heavy = sorted({name.split('.')[0] for name in imported} & {'playwright', 'biliup', 'xhs', 'uploader', 'requests'})
+    print(f"heavy modules imported at startup: {', '.join(heavy) or 'none'}")
+
+    times = [cold_start(args.mode) for _ in range(args.runs)]
+    print(f"\ncold start to first response ({args.mode}, {args.runs} runs): "
+          f"min {min(times) * 1000:.0f} ms, median {statistics.median(times) * 1000:.0f} ms, "
+          f"max {max(times) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Cookie HTTP 快速校验的离线检查：在本地桩服务（fake_cookie_api.py）上对每个平台依次模拟
+已登录、登录过期、无法判断（风控 / 非 JSON / 401）的接口响应，核对 probe_cookie_sync 和各平台 judge 的结论。
+
+    python benchmarks/check_cookie_probe.py
+
+全部符合预期时退出码为 0，否则列出不符合的组合并返回 1。
+"""
+import json
+import socket
+import sys
+import tempfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_cookie_api import RESPONSES, SCENARIOS, FakeCookieApi  # noqa: E402
+from myUtils import cookie_probe  # noqa: E402
+
+# 场景 -> 期望结论：True 有效 / False 失效 / None 回退页面校验
+EXPECTED = {'valid': True, 'expired': False, 'unknown': None, 'html': None, '401': False}
+
+
+def write_storage_state(directory: Path, platform: str, scenario: str) -> Path:
+    """生成只含该平台域名 cookie 的 storage_state，sau_stub 告诉桩服务返回哪种响应。"""
+    domain = '.' + urlsplit(cookie_probe.PROBES[platform].url).hostname
+    state = {
+        "cookies": [
+            {"name": "sau_stub", "value": scenario, "domain": domain, "path": "/", "expires": -1},
+            # 已过期的 cookie 不应被发送
+            {"name": "stale", "value": "1", "domain": domain, "path": "/", "expires": 1},
+        ],
+        "origins": [],
+    }
+    path = directory / f"{platform}-{scenario}.json"
+    path.write_text(json.dumps(state), encoding='utf-8')
+    return path
+
+
+def check_judges() -> list[str]:
+    """直接调用各平台 judge：已登录 / 过期 / 无法判断 / 非 JSON。"""
+    failures = []
+    for platform, spec in cookie_probe.PROBES.items():
+        cases = [(scenario, 200, RESPONSES[platform][scenario], EXPECTED[scenario])
+                 for scenario in ('valid', 'expired', 'unknown')]
+        cases.append(('non-json', 200, None, None))
+        cases.append(('empty', 200, {}, None))
+        for name, status, data, expected in cases:
+            actual = spec.judge(status, data)
+            if actual is not expected:
+                failures.append(f"judge {platform}/{name}: expected {expected}, got {actual}")
+    return failures
+
+
+def check_probes(api: FakeCookieApi, directory: Path) -> list[str]:
+    """经 HTTP 走完整的探测流程（读取 storage_state、挑选 cookie、请求、判断）。"""
+    failures = []
+    print(f"{'platform':<10}" + ''.join(f"{scenario:>9}" for scenario in SCENARIOS))
+    for platform, spec in cookie_probe.PROBES.items():
+        row = []
+        for scenario in SCENARIOS:
+            account_file = write_storage_state(directory, platform, scenario)
+            api.requests.clear()
+            actual = cookie_probe.probe_cookie_sync(platform, account_file)
+            row.append(str(actual))
+            if actual is not EXPECTED[scenario]:
+                failures.append(f"probe {platform}/{scenario}: expected {EXPECTED[scenario]}, got {actual}")
+            if api.requests and api.requests[0][1:] != (spec.method, spec.referer):
+                failures.append(f"probe {platform}/{scenario}: sent {api.requests[0][1:]}")
+        print(f"{platform:<10}" + ''.join(f"{value:>9}" for value in row))
+
+    # 没有该平台域名 cookie 的文件不发请求，直接回退页面校验
+    other = directory / "no-cookies.json"
+    other.write_text(json.dumps({"cookies": [], "origins": []}), encoding='utf-8')
+    api.requests.clear()
+    if cookie_probe.probe_cookie_sync('douyin', other) is not None or api.requests:
+        failures.append("probe without cookies should fall back without a request")
+    return failures
+
+
+def main() -> int:
+    failures = check_judges()
+    with tempfile.TemporaryDirectory() as tmp:
+        with FakeCookieApi() as api:
+            cookie_probe.COOKIE_PROBE_BASE_URL = api.base_url
+            failures += check_probes(api, Path(tmp))
+        # 接口连不上时回退页面校验
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            cookie_probe.COOKIE_PROBE_BASE_URL = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        if cookie_probe.probe_cookie_sync('bilibili', write_storage_state(Path(tmp), 'bilibili', 'valid')) is not None:
+            failures.append("probe with unreachable endpoint should fall back")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+本地模拟的各平台"当前登录用户信息"接口，供 check_cookie_probe.py 离线验证 myUtils/cookie_probe.py。
+
+按 cookie_probe.PROBES 中各平台的接口路径应答（不区分域名，配合 COOKIE_PROBE_BASE_URL 使用），
+响应由请求 Cookie 中的 sau_stub 决定：
+  - valid：已登录的响应
+  - expired：平台的未登录 / 登录过期响应
+  - unknown：结构正常但无法判断的响应（如风控、接口改版），应回退到页面校验
+  - html：返回 HTML 页面（非 JSON）
+  - 401：HTTP 401
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from myUtils.cookie_probe import PROBES
+
+SCENARIOS = ('valid', 'expired', 'unknown', 'html', '401')
+
+# 平台 -> 场景 -> JSON 响应
+RESPONSES = {
+    'douyin': {
+        'valid': {'status_code': 0, 'user': {'uid': '1', 'nickname': 'stub'}},
+        'expired': {'status_code': 8, 'status_msg': '用户未登录'},
+        'unknown': {'status_code': 2154, 'status_msg': '访问频繁'},
+    },
+    'tencent': {
+        'valid': {'errCode': 0, 'data': {'finderUser': {'nickname': 'stub'}}},
+        'expired': {'errCode': 300333, 'errMsg': 'login expired'},
+        'unknown': {'errCode': 300001, 'errMsg': 'system busy'},
+    },
+    'kuaishou': {
+        'valid': {'result': 1, 'data': {'userId': 1, 'userName': 'stub'}},
+        'expired': {'result': 109, 'error_msg': '未登录'},
+        'unknown': {'result': 500, 'error_msg': 'server error'},
+    },
+    'xhs': {
+        'valid': {'success': True, 'code': 0, 'data': {'userId': '1', 'userName': 'stub'}},
+        'expired': {'success': False, 'code': -100, 'msg': '登录已过期'},
+        'unknown': {'success': False, 'code': 300012, 'msg': '网络连接异常'},
+    },
+    'bilibili': {
+        'valid': {'code': 0, 'data': {'isLogin': True, 'uname': 'stub'}},
+        'expired': {'code': -101, 'message': '账号未登录', 'data': {'isLogin': False}},
+        'unknown': {'code': -412, 'message': '请求被拦截'},
+    },
+}
+
+_PATHS = {urlsplit(spec.url).path: platform for platform, spec in PROBES.items()}
+
+
+def _scenario(cookie_header: str) -> str:
+    for pair in cookie_header.split(';'):
+        name, _, value = pair.strip().partition('=')
+        if name == 'sau_stub':
+            return value
+    return 'expired'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: bytes, code: int = 200, content_type: str = 'application/json') -> None:
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        platform = _PATHS.get(urlsplit(self.path).path)
+        if platform is None:
+            return self._reply(b'{}', 404)
+        self.server.requests.append((platform, self.command, self.headers.get('Referer')))
+        scenario = _scenario(self.headers.get('Cookie') or '')
+        if scenario == '401':
+            return self._reply(b'{}', 401)
+        if scenario == 'html':
+            return self._reply(b'<html><body>login</body></html>', content_type='text/html')
+        self._reply(json.dumps(RESPONSES[platform][scenario], ensure_ascii=False).encode())
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeCookieApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.requests: list[tuple] = []
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def __enter__(self) -> "FakeCookieApi":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,135 @@
+"""
+本地模拟的 B站 upos 上传服务，供 bench_bilibili_upload.py 离线评估线路选择和并发分片数。
+
+每条线路是一个独立的 HTTP 服务，按 LineProfile 模拟网络特性：
+  - latency：每个请求额外的往返延迟
+  - stream_mbps：单个连接的速率上限
+  - aggregate_mbps：整条线路的总速率，并发请求按到达顺序排队占用
+另有一个 preupload 服务，按查询参数 upcdn 返回对应线路的上传地址。
+实现了 probe_url（GET / POST /OK）、初始化 upload_id、PUT 分片、合并分片这几个接口，不校验鉴权。
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+MB = 1024 * 1024
+
+
+@dataclass
+class LineProfile:
+    latency: float
+    stream_mbps: float
+    aggregate_mbps: float
+    # 前 fail_first 个分片 PUT 返回 500，用于观察重试和并发回退
+    fail_first: int = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: bytes = b'', code: int = 200) -> None:
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj) -> None:
+        self._reply(json.dumps(obj).encode())
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/preupload':
+            line = parse_qs(url.query).get('upcdn', [''])[0]
+            server = self.server.service.lines.get(line)
+            if server is None:
+                return self._json({'OK': 0, 'message': f'unknown line {line}'})
+            return self._json({'OK': 1, 'auth': 'fake', 'biz_id': 1, 'chunk_size': self.server.service.chunk_size,
+                               'endpoint': f'//127.0.0.1:{server.server_port}', 'upos_uri': 'upos://ugc/fake.mp4'})
+        self.server.transmit(0)
+        self._reply(b'OK')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self._body()
+        self.server.transmit(len(body))
+        if url.path == '/OK':
+            return self._reply(b'OK')
+        if 'uploads' in url.query:
+            return self._json({'upload_id': f'u{time.monotonic_ns()}'})
+        return self._json({'OK': 1})
+
+    def do_PUT(self):
+        body = self._body()
+        server = self.server
+        with server.lock:
+            server.puts += 1
+            fail = server.puts <= server.profile.fail_first
+        server.transmit(len(body))
+        self._reply(code=500 if fail else 200)
+
+
+class _LineServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: "FakeUpos", profile: LineProfile):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.service = service
+        self.profile = profile
+        self.lock = threading.Lock()
+        self.link_free = 0.0
+        self.puts = 0
+
+    def transmit(self, nbytes: int) -> None:
+        """按线路模型阻塞到这段数据“传完”：总速率按请求到达顺序排队，单连接另有速率上限。"""
+        profile = self.profile
+        now = time.monotonic()
+        with self.lock:
+            start = max(now, self.link_free)
+            self.link_free = start + nbytes / (profile.aggregate_mbps * MB)
+            shared_done = self.link_free
+        done = max(shared_done, now + nbytes / (profile.stream_mbps * MB)) + profile.latency
+        time.sleep(max(0.0, done - time.monotonic()))
+
+
+class FakeUpos:
+    def __init__(self, profiles: dict[str, LineProfile], chunk_size: int = MB):
+        self.chunk_size = chunk_size
+        self.lines = {name: _LineServer(self, profile) for name, profile in profiles.items()}
+        self.member = _LineServer(self, LineProfile(0.0, 10 ** 6, 10 ** 6))
+        self._threads = []
+
+    @property
+    def preupload_url(self) -> str:
+        return f'http://127.0.0.1:{self.member.server_port}/preupload'
+
+    def line_table(self) -> dict:
+        """与 upos.LINES 结构相同的线路表。"""
+        return {name: {'query': f'upcdn={name}', 'probe_url': f'//127.0.0.1:{server.server_port}/OK'}
+                for name, server in self.lines.items()}
+
+    def start(self) -> "FakeUpos":
+        for server in [self.member, *self.lines.values()]:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in [self.member, *self.lines.values()]:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self) -> "FakeUpos":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
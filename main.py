@@ -1,29 +1,38 @@
-import asyncio
+import hashlib
+import json
 import os
-import sqlite3
-import threading
 import time
 import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
-from queue import Queue
+from queue import Empty
 from flask_cors import CORS
-from myUtils.auth import check_cookie
-from flask import Flask, request, jsonify, Response, render_template, send_from_directory
+from myUtils.account_status import (ACCOUNT_STATUS_TTL_SECONDS, get_refresher, list_accounts_page,
+                                    refresh_accounts, stale_count, start_refresher)
+from flask import Flask, g, request, jsonify, Response, render_template, send_from_directory
 from conf import BASE_DIR
-from myUtils.login import get_tencent_cookie, douyin_cookie_gen, get_ks_cookie, xiaohongshu_cookie_gen, bilibili_cookie_gen
-from myUtils.postVideo import post_video_tencent, post_video_DouYin, post_video_ks, post_video_xhs
-from myUtils.postVideo import post_video_bilibili
-from utils.base_social_media import launch_chromium_with_codecs, set_init_script
-from playwright.async_api import async_playwright
+from myUtils import db, platforms
+from myUtils.jobs import enqueue_job, get_job, list_jobs, start_workers
+from myUtils.blob_store import delete_record, save_stream
+from myUtils.chunked_upload import (UploadError, abort_session, finalize_session, init_session,
+                                    session_status, write_chunk)
+from myUtils.async_runtime import run_sync, spawn
+from myUtils.login_sessions import StatusQueue, cancel_login, list_login_sessions, run_login_session
+from myUtils.schema import initialize_database
+from utils import metrics
 
 
 active_queues = {}
 _open_browsers = []  # keep references to prevent GC/auto-close
 
-# 全局账号验证缓存时间（秒），默认 3600 秒（1 小时）
-ACCOUNT_STATUS_TTL_SECONDS = int(os.getenv('ACCOUNT_STATUS_TTL_SECONDS', '3600'))
-# 上次完整验证时间戳
-_last_accounts_validation_ts: float = 0.0
+# 服务进程内的发布 worker 数量；设为 0 时仅入队，由独立进程 python -m myUtils.jobs 执行
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', '1'))
+# 登录 SSE 无消息时的心跳间隔（秒）和单次登录流的最长时长（秒）
+LOGIN_SSE_HEARTBEAT_SECONDS = float(os.getenv('LOGIN_SSE_HEARTBEAT_SECONDS', '15'))
+LOGIN_SSE_TIMEOUT_SECONDS = float(os.getenv('LOGIN_SSE_TIMEOUT_SECONDS', '600'))
+LOGIN_TERMINAL_STATUS = ("200", "500")
+# 列表接口单页最大条数
+LIST_MAX_LIMIT = 500
 
 # Detect frontend dist directory for portable serving
 ROOT_DIR = Path(__file__).resolve().parent
@@ -41,34 +50,15 @@ def _find_frontend_dist():
 FRONTEND_DIST = _find_frontend_dist()
 print(f"FRONTEND_DIST: {FRONTEND_DIST}")
 
-def initialize_database() -> None:
-    db_dir = Path(BASE_DIR / "db")
-    db_dir.mkdir(parents=True, exist_ok=True)
-    db_file = db_dir / "database.db"
-    with sqlite3.connect(db_file) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-CREATE TABLE IF NOT EXISTS user_info (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    type INTEGER NOT NULL,
-    filePath TEXT NOT NULL,
-    userName TEXT NOT NULL,
-    status INTEGER DEFAULT 0
-)
-''')
-        cursor.execute('''
-CREATE TABLE IF NOT EXISTS file_records (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    filename TEXT NOT NULL,
-    filesize REAL,
-    upload_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-    file_path TEXT
-)
-''')
-        conn.commit()
-    print("✅ 数据库已初始化")
-
-app = Flask(__name__, static_folder=str(FRONTEND_DIST))
+class SharedLoopFlask(Flask):
+    def async_to_sync(self, func):
+        # async 视图在共享事件循环上执行，而不是每个请求新建一个事件循环
+        def wrapper(*args, **kwargs):
+            return run_sync(func(*args, **kwargs))
+        return wrapper
+
+
+app = SharedLoopFlask(__name__, static_folder=str(FRONTEND_DIST))
 
 #允许所有来源跨域访问
 CORS(app)
@@ -76,6 +66,35 @@ CORS(app)
 # 限制上传文件大小为160MB
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024
 
+OPEN_ACCOUNT_BROWSERS = metrics.gauge('sau_open_account_browsers', 'Browsers opened by /openAccounts and kept alive')
+LOGIN_STREAMS = metrics.gauge('sau_login_streams', 'Active /login SSE streams')
+
+
+def _collect_app_state() -> None:
+    OPEN_ACCOUNT_BROWSERS.set(len([b for b in _open_browsers if b.is_connected()]))
+    LOGIN_STREAMS.set(len(active_queues))
+
+
+metrics.install_default_collectors()
+metrics.add_collector(_collect_app_state)
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # 按路由模板统计（/uploadSession/<upload_id>），避免路径参数撑爆标签
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=request.method)
+        metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+
 @app.route('/')
 def hello_world():
     return app.send_static_file('index.html')
@@ -157,26 +176,10 @@ def upload_save():
         filename = file.filename
 
     try:
-        # 生成 UUID v1
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-
-        # 构造文件名和路径
-        final_filename = f"{uuid_v1}_{filename}"
-        filepath = Path(BASE_DIR / "videoFile" / f"{uuid_v1}_{filename}")
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-
-        # 保存文件
-        file.save(filepath)
-
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                                INSERT INTO file_records (filename, filesize, file_path)
-            VALUES (?, ?, ?)
-                                ''', (filename, round(float(os.path.getsize(filepath)) / (1024 * 1024),2), final_filename))
-            conn.commit()
-            print("✅ 上传文件已记录")
+        # 边写边计算 sha256，内容相同的文件只保存一份
+        saved = save_stream(file.stream, filename)
+        final_filename = saved['filepath']
+        print(f"✅ 上传文件已记录: {final_filename}")
 
         return jsonify({
             "code": 200,
@@ -194,26 +197,131 @@ def upload_save():
             "data": None
         }), 500
 
-@app.route('/getFiles', methods=['GET'])
-def get_all_files():
+@app.route('/uploadSession', methods=['POST'])
+def upload_session_init():
+    # 分片上传：声明文件名、大小(字节)、sha256，可选 chunkSize
+    data = request.get_json(silent=True) or {}
     try:
-        # 使用 with 自动管理数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row  # 允许通过列名访问结果
-            cursor = conn.cursor()
+        session = init_session(data.get('filename'), data.get('size'), data.get('sha256'), data.get('chunkSize'))
+    except UploadError as e:
+        return jsonify({"code": e.status, "msg": str(e), "data": e.data}), e.status
+    return jsonify({"code": 200, "msg": None, "data": session}), 200
 
-            # 查询所有记录
-            cursor.execute("SELECT * FROM file_records")
-            rows = cursor.fetchall()
 
-            # 将结果转为字典列表
-            data = [dict(row) for row in rows]
+@app.route('/uploadSession/<upload_id>', methods=['GET'])
+def upload_session_status(upload_id):
+    # 断线重连后查询已收到的分片，只补传 missing 中的分片
+    try:
+        session = session_status(upload_id)
+    except UploadError as e:
+        return jsonify({"code": e.status, "msg": str(e), "data": e.data}), e.status
+    return jsonify({"code": 200, "msg": None, "data": session}), 200
 
-        return jsonify({
+
+@app.route('/uploadSession/<upload_id>/chunk/<int:index>', methods=['PUT'])
+def upload_session_chunk(upload_id, index):
+    # 请求体为分片原始字节，直接从 request.stream 写入目标文件，不经过内存缓冲
+    try:
+        session = write_chunk(upload_id, index, request.stream, request.content_length,
+                              request.headers.get('X-Chunk-Sha256'))
+    except UploadError as e:
+        return jsonify({"code": e.status, "msg": str(e), "data": e.data}), e.status
+    return jsonify({"code": 200, "msg": None, "data": session}), 200
+
+
+@app.route('/uploadSession/<upload_id>/finalize', methods=['POST'])
+def upload_session_finalize(upload_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        result = finalize_session(upload_id, data.get('filename'))
+    except UploadError as e:
+        return jsonify({"code": e.status, "msg": str(e), "data": e.data}), e.status
+    return jsonify({"code": 200, "msg": "File uploaded and saved successfully", "data": result}), 200
+
+
+@app.route('/uploadSession/<upload_id>', methods=['DELETE'])
+def upload_session_abort(upload_id):
+    try:
+        abort_session(upload_id)
+    except UploadError as e:
+        return jsonify({"code": e.status, "msg": str(e), "data": e.data}), e.status
+    return jsonify({"code": 200, "msg": None, "data": None}), 200
+
+def _page_args() -> dict:
+    """通用分页参数：limit（不传则返回全部）、cursor（上一页返回的 nextCursor）、sort、order。"""
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            raise db.QueryError("invalid limit")
+        limit = min(int(limit), LIST_MAX_LIMIT)
+    return {
+        "limit": limit,
+        "cursor": request.args.get('cursor') or None,
+        "sort": request.args.get('sort', 'id'),
+        "order": request.args.get('order', 'asc').lower(),
+    }
+
+
+def _parse_date(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise db.QueryError(f"invalid date: {value}") from None
+
+
+def _list_etag(*parts) -> str:
+    return hashlib.sha1(json.dumps([request.path, request.query_string.decode()] + list(parts)).encode()).hexdigest()
+
+
+def _not_modified(etag: str) -> Response | None:
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def _list_response(payload: dict, etag: str | None = None):
+    response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+        # 每次使用前都向服务端校验，列表未变化时返回 304 不传输内容
+        response.headers['Cache-Control'] = 'no-cache'
+    return response, 200
+
+
+@app.route('/getFiles', methods=['GET'])
+def get_all_files():
+    """
+    素材列表。不带参数时返回全部（与旧接口一致），可选参数：
+      - limit / cursor: keyset 分页，返回的 meta.nextCursor 作为下一页的 cursor
+      - sort: id / upload_time / filename / filesize，order: asc / desc
+      - name: 文件名包含的文字；from / to: 上传时间范围（YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS）
+    支持 ETag / If-None-Match，列表未变化时返回 304。
+    """
+    try:
+        page = _page_args()
+        date_from, date_to = request.args.get('from'), request.args.get('to')
+        _parse_date(date_from), _parse_date(date_to)
+    except db.QueryError as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
+    try:
+        etag = _list_etag(db.table_version('file_records'))
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        data, next_cursor = db.file_record_page(name=request.args.get('name'), date_from=date_from,
+                                                date_to=date_to, **page)
+        return _list_response({
             "code": 200,
             "msg": "success",
-            "data": data
-        }), 200
+            "data": data,
+            "meta": {"nextCursor": next_cursor, "hasMore": next_cursor is not None}
+        }, etag)
+    except db.QueryError as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
     except Exception as e:
         return jsonify({
             "code": 500,
@@ -225,16 +333,18 @@ def get_all_files():
 @app.route("/getValidAccounts",methods=['GET'])
 async def getValidAccounts():
     """
-    获取账号列表。
+    获取账号列表，始终直接返回数据库中的缓存状态。
     可选参数：
-      - validate: 1/true 表示触发校验；0/false 表示仅返回数据库缓存状态（更快）。默认 0。
-      - force: 1/true 表示忽略 TTL 强制校验。
+      - validate: 1/true 表示请求后台尽快重新校验（不等待结果）。默认 0。
+      - force: 1/true 表示同步校验后再返回（较慢）。
       - ids: 可选，逗号分隔的账号 id 列表。提供时，仅对这些账号执行校验，其余账号保留缓存状态。
+      - limit / cursor / sort（id、userName、type、status、last_checked_at）/ order: 分页和排序，同 /getFiles
+      - type: 平台类型，可逗号分隔多个；status: 0/1；name: 账号名包含的文字；from / to: 上次校验时间范围
     说明：
-      - 为避免频繁打开浏览器验证，增加了 TTL，默认 1 小时内重复请求不会再次校验。
+      - 每个账号单独记录 last_checked_at / last_result，TTL 默认 1 小时，后台线程在过期前自动刷新。
+      - 返回的每行为 [id, type, filePath, userName, status, last_checked_at, last_result, stale]。
+      - 不带 validate/force 时支持 ETag / If-None-Match，列表和过期状态都未变化时返回 304。
     """
-    global _last_accounts_validation_ts
-
     validate = request.args.get('validate', '0').lower() in ('1', 'true', 'yes')
     force = request.args.get('force', '0').lower() in ('1', 'true', 'yes')
     ids_param = request.args.get('ids', '').strip()
@@ -245,66 +355,63 @@ async def getValidAccounts():
         except Exception:
             selected_ids = set()
 
-    now_ts = time.time()
-    should_validate = validate and (force or (now_ts - _last_accounts_validation_ts >= ACCOUNT_STATUS_TTL_SECONDS))
-
-    with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-        SELECT * FROM user_info''')
-        rows = cursor.fetchall()
-        rows_list = [list(row) for row in rows]
-
-        # 快速返回：不需要校验时，直接返回数据库中的缓存状态
-        if not should_validate:
-            return jsonify({
-                "code": 200,
-                "msg": None,
-                "data": rows_list
-            }), 200
-
-        print("\n📋 开始账号有效性校验（可能需数秒）...")
-        any_updated = False
-        for row in rows_list:
-            # row: [id, type, filePath, userName, status]
-            try:
-                # 若指定了 selected_ids，则只校验被选中的账号，其余账号跳过
-                if selected_ids and row[0] not in selected_ids:
-                    continue
-                # 预览模式：当请求带 preview=1 时打开可视化浏览器以便观察
-                preview = request.args.get('preview', '0').lower() in ('1', 'true', 'yes')
-                platform = {1: 'xhs', 2: 'tencent', 3: 'douyin', 4: 'kuaishou'}.get(row[1], 'unknown')
-                print(f"   - 正在校验 [{platform}] 账号: id={row[0]} user={row[3]}")
-                flag = await check_cookie(row[1], row[2], preview=preview)
-                print(f"     → [{platform}] 结果: {'cookie 有效' if flag else 'cookie 失效'}")
-            except Exception as e:
-                # 出错时保守置为无效
-                print(f"check_cookie 出错: platform={row[1]} id={row[0]} user={row[3]} err={e}")
-                flag = False
-
-            new_status = 1 if flag else 0
-            if row[4] != new_status:
-                row[4] = new_status
-                cursor.execute('''
-                UPDATE user_info 
-                SET status = ? 
-                WHERE id = ?
-                ''', (new_status, row[0]))
-                any_updated = True
-
-        if any_updated:
-            conn.commit()
-            print("✅ 用户状态已更新并写入数据库")
-        else:
-            print("ℹ️ 用户状态无变更，保持现状")
-
-        _last_accounts_validation_ts = time.time()
+    try:
+        query = _page_args()
+        types = [x.strip() for x in request.args.get('type', '').split(',') if x.strip()]
+        if not all(x.isdigit() for x in types):
+            raise db.QueryError(f"invalid type: {request.args.get('type')}")
+        query['types'] = [int(x) for x in types] or None
+        status = request.args.get('status', '').strip()
+        if status not in ('', '0', '1'):
+            raise db.QueryError(f"invalid status: {status}")
+        query['status'] = int(status) if status else None
+        query['name'] = request.args.get('name') or None
+        checked_from, checked_to = _parse_date(request.args.get('from')), _parse_date(request.args.get('to'))
+        query['checked_from'] = checked_from.timestamp() if checked_from else None
+        if checked_to and len(request.args.get('to')) == 10:
+            checked_to += timedelta(days=1)
+        query['checked_to'] = checked_to.timestamp() if checked_to else None
+    except (ValueError, db.QueryError) as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
+
+    refresher = get_refresher()
+    etag = None
+    if not force and not validate:
+        etag = _list_etag(db.table_version('user_info'), stale_count(), bool(refresher and refresher.refreshing))
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
 
-        return jsonify({
-            "code": 200,
-            "msg": None,
-            "data": rows_list
-        }), 200
+    try:
+        rows_list, next_cursor = list_accounts_page(**query)
+    except db.QueryError as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
+
+    # 未启动后台刷新时，validate=1 退化为同步校验
+    if force or (validate and refresher is None):
+        # 若指定了 selected_ids，则只校验被选中的账号，其余账号保留缓存状态
+        targets = [row for row in rows_list if not selected_ids or row[0] in selected_ids]
+        # 预览模式：当请求带 preview=1 时打开可视化浏览器以便观察
+        preview = request.args.get('preview', '0').lower() in ('1', 'true', 'yes')
+        print(f"\n📋 开始账号有效性校验，共 {len(targets)} 个账号...")
+        # 每个账号校验完成即写库，并同步更新 rows_list 中对应的行
+        await refresh_accounts(targets, preview=preview)
+        print("✅ 账号状态已更新并写入数据库")
+    elif validate:
+        refresher.request_refresh(selected_ids or None)
+
+    return _list_response({
+        "code": 200,
+        "msg": None,
+        "data": rows_list,
+        "meta": {
+            "ttl": ACCOUNT_STATUS_TTL_SECONDS,
+            "stale": sum(1 for row in rows_list if row[7]),
+            "refreshing": bool(refresher and refresher.refreshing),
+            "nextCursor": next_cursor,
+            "hasMore": next_cursor is not None,
+        }
+    }, etag)
 
 @app.route('/deleteFile', methods=['GET'])
 def delete_file():
@@ -318,27 +425,14 @@ def delete_file():
         }), 400
 
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 查询要删除的记录
-            cursor.execute("SELECT * FROM file_records WHERE id = ?", (file_id,))
-            record = cursor.fetchone()
-
-            if not record:
-                return jsonify({
-                    "code": 404,
-                    "msg": "File not found",
-                    "data": None
-                }), 404
-
-            record = dict(record)
-
-            # 删除数据库记录
-            cursor.execute("DELETE FROM file_records WHERE id = ?", (file_id,))
-            conn.commit()
+        # 删除数据库记录，视频内容没有其他素材引用时一并删除文件
+        record = delete_record(int(file_id))
+        if not record:
+            return jsonify({
+                "code": 404,
+                "msg": "File not found",
+                "data": None
+            }), 404
 
         return jsonify({
             "code": 200,
@@ -361,27 +455,13 @@ def delete_account():
     account_id = int(request.args.get('id'))
 
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 查询要删除的记录
-            cursor.execute("SELECT * FROM user_info WHERE id = ?", (account_id,))
-            record = cursor.fetchone()
-
-            if not record:
-                return jsonify({
-                    "code": 404,
-                    "msg": "account not found",
-                    "data": None
-                }), 404
-
-            record = dict(record)
-
-            # 删除数据库记录
-            cursor.execute("DELETE FROM user_info WHERE id = ?", (account_id,))
-            conn.commit()
+        record = db.delete_account(account_id)
+        if not record:
+            return jsonify({
+                "code": 404,
+                "msg": "account not found",
+                "data": None
+            }), 404
 
         return jsonify({
             "code": 200,
@@ -397,85 +477,157 @@ def delete_account():
         }), 500
 
 
-# SSE 登录接口
-@app.route('/login')
-def login():
-    # 1 小红书 2 视频号 3 抖音 4 快手
-    type = request.args.get('type')
-    # 账号名
-    id = request.args.get('id')
-    # 是否更新已有记录
-    update_mode = request.args.get('update', '0') in ('1', 'true', 'True')
-    record_id = request.args.get('record_id')
-
+def start_login(type, id, update_mode=False, record_id=None):
+    """
+    发起扫码登录：登录流程作为 task 在共享事件循环上执行，所有登录会话共用一个浏览器。
+    返回 (status_queue, session_id, on_close)，SSE 流结束或客户端断开时调用 on_close。
+    """
     # 模拟一个用于异步通信的队列
-    status_queue = Queue()
+    status_queue = StatusQueue()
     active_queues[id] = status_queue
+    # 登录会话 id，可用于 /cancelLogin
+    session_id = uuid.uuid4().hex
 
     def on_close():
         print(f"清理队列: {id}")
-        del active_queues[id]
-    # 启动异步任务线程
-    thread = threading.Thread(target=run_async_function, args=(type,id,status_queue, update_mode, record_id), daemon=True)
-    thread.start()
-    response = Response(sse_stream(status_queue,), mimetype='text/event-stream')
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['X-Accel-Buffering'] = 'no'  # 关键：禁用 Nginx 缓冲
-    response.headers['Content-Type'] = 'text/event-stream'
-    response.headers['Connection'] = 'keep-alive'
+        # 同名账号可能已发起新的登录，只删除本次请求的队列
+        if active_queues.get(id) is status_queue:
+            del active_queues[id]
+        # 客户端在登录完成前断开：取消会话，立即关闭它的浏览器上下文
+        if status_queue.last not in LOGIN_TERMINAL_STATUS:
+            spawn(cancel_login(session_id), name=f"cancel login {session_id}")
+    spawn(run_login(type, id, status_queue, update_mode, record_id, session_id), name=f"login {type}:{id}")
+    return status_queue, session_id, on_close
+
+
+def login_params(args) -> tuple:
+    """/login 的查询参数：(type, id, update_mode, record_id)。"""
+    # 1 小红书 2 视频号 3 抖音 4 快手
+    # update：是否更新已有记录
+    return (args.get('type'), args.get('id'), args.get('update', '0') in ('1', 'true', 'True'),
+            args.get('record_id'))
+
+
+# SSE 登录响应头（ASGI 原生 SSE 使用同一组）
+LOGIN_SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # 关键：禁用 Nginx 缓冲
+    'Content-Type': 'text/event-stream',
+    'Connection': 'keep-alive',
+}
+
+
+# SSE 登录接口（通过 asgi.py 启动时由原生 ASGI 处理，见 asgi.login_sse）
+@app.route('/login')
+def login():
+    status_queue, session_id, on_close = start_login(*login_params(request.args))
+    response = Response(sse_stream(status_queue, on_close, session_id), mimetype='text/event-stream')
+    response.headers['X-Login-Session'] = session_id
+    for name, value in LOGIN_SSE_HEADERS.items():
+        response.headers[name] = value
     return response
 
+@app.route('/cancelLogin', methods=['GET', 'POST'])
+def cancel_login_session():
+    """取消进行中的扫码登录并立即关闭其浏览器上下文：session 为 /login 返回的会话 id，或用 id 指定账号名。"""
+    data = request.get_json(silent=True) or {}
+    session_id = request.args.get('session') or data.get('session')
+    account = request.args.get('id') or data.get('id')
+    if not session_id and not account:
+        return jsonify({"code": 400, "msg": "session or id required", "data": None}), 400
+    cancelled = run_sync(cancel_login(session_id, account))
+    if not cancelled:
+        return jsonify({"code": 404, "msg": "login session not found", "data": None}), 404
+    return jsonify({"code": 200, "msg": None, "data": {"cancelled": cancelled}}), 200
+
+
+@app.route('/getLoginSessions', methods=['GET'])
+def get_login_sessions():
+    return jsonify({"code": 200, "msg": None, "data": run_sync(list_login_sessions())}), 200
+
+
 @app.route('/postVideo', methods=['POST'])
 def postVideo():
-    # 获取JSON数据
+    # 获取JSON数据（fileList、accountList、type、title、tags 等，B站另有 biliDesc/biliType/biliPartition）
     data = request.get_json()
-
-    # 从JSON数据中提取fileList和accountList
-    file_list = data.get('fileList', [])
-    account_list = data.get('accountList', [])
-    type = data.get('type')
-    title = data.get('title')
-    tags = data.get('tags')
-    category = data.get('category')
-    enableTimer = data.get('enableTimer')
-    # B站专用字段
-    bili_desc = data.get('biliDesc')
-    bili_type = data.get('biliType')  # 自制/转载
-    bili_partition = data.get('biliPartition')
-    if category == 0:
-        category = None
-
-    videos_per_day = data.get('videosPerDay')
-    daily_times = data.get('dailyTimes')
-    start_days = data.get('startDays')
     # 打印获取到的数据（仅作为示例）
-    print("File List:", file_list)
-    print("Account List:", account_list)
-    match type:
-        case 1:
-            post_video_xhs(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                               start_days)
-        case 2:
-            post_video_tencent(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                               start_days)
-        case 3:
-            post_video_DouYin(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                      start_days)
-        case 4:
-            post_video_ks(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                      start_days)
-        case 5:
-            post_video_bilibili(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                      start_days, desc=bili_desc, bili_type=bili_type, bili_partition=bili_partition)
-    # 返回响应给客户端
+    print("File List:", data.get('fileList', []))
+    print("Account List:", data.get('accountList', []))
+    if platforms.find(data.get('type')) is None:
+        return jsonify({
+            "code": 400,
+            "msg": f"unsupported platform type: {data.get('type')}",
+            "data": None
+        }), 400
+    # 仅入队，由发布 worker 异步执行
+    job_id = enqueue_job(data.get('type'), data)
     return jsonify(
         {
             "code": 200,
             "msg": None,
-            "data": None
+            "data": {"jobId": job_id}
         }), 200
 
 
+@app.route('/getPlatforms', methods=['GET'])
+def get_platforms():
+    """已注册的平台：type、名称、是否支持网页扫码登录（/login）以及登录后打开的页面。"""
+    return jsonify({
+        "code": 200,
+        "msg": None,
+        "data": [{
+            "type": spec.type,
+            "name": spec.name,
+            "label": spec.label,
+            "login": spec.login is not None,
+            "entryUrl": spec.entry_url,
+        } for spec in platforms.all_platforms()]
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的运行指标，见 utils/metrics.py。"""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"code": 404, "msg": "metrics disabled", "data": None}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/getJob', methods=['GET'])
+def get_publish_job():
+    job_id = request.args.get('id')
+    if not job_id or not job_id.isdigit():
+        return jsonify({
+            "code": 400,
+            "msg": "Invalid or missing job ID",
+            "data": None
+        }), 400
+    job = get_job(int(job_id))
+    if job is None:
+        return jsonify({
+            "code": 404,
+            "msg": "job not found",
+            "data": None
+        }), 404
+    return jsonify({
+        "code": 200,
+        "msg": None,
+        "data": job
+    }), 200
+
+
+@app.route('/getJobs', methods=['GET'])
+def get_publish_jobs():
+    status = request.args.get('status')
+    limit = request.args.get('limit', '50')
+    limit = int(limit) if limit.isdigit() else 50
+    return jsonify({
+        "code": 200,
+        "msg": None,
+        "data": list_jobs(status, min(limit, 500))
+    }), 200
+
+
 @app.route('/openAccounts', methods=['POST'])
 def open_accounts():
     data = request.get_json() or {}
@@ -488,12 +640,8 @@ def open_accounts():
         }), 200
 
     # 查询账号信息
-    with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-        cursor = conn.cursor()
-        # rows: [id, type, filePath, userName, status]
-        placeholders = ",".join(["?"] * len(ids))
-        cursor.execute(f"SELECT id, type, filePath, userName, status FROM user_info WHERE id IN ({placeholders})", tuple(ids))
-        rows = cursor.fetchall()
+    # rows: [id, type, filePath, userName, status]
+    rows = [tuple(row) for row in db.list_account_rows("id, type, filePath, userName, status", ids)]
 
     if not rows:
         return jsonify({
@@ -502,52 +650,35 @@ def open_accounts():
             "data": None
         }), 200
 
-    def run_open_tabs(rows_):
-        async def open_tabs_async():
-            p = await async_playwright().start()
-            browser = await launch_chromium_with_codecs(p, headless=False, executable_path=None)
-            _open_browsers.append(browser)
-            # 平台登录后页面地址
-            url_map = {
-                1: "https://creator.xiaohongshu.com/new/note-manager",
-                2: "https://channels.weixin.qq.com/platform/post/list",
-                3: "https://creator.douyin.com/creator-micro/content/manage",
-                4: "https://cp.kuaishou.com/article/publish/video",
-                5: "https://member.bilibili.com/platform/upload-manager/article",
-            }
-            for (acc_id, acc_type, file_path, user_name, _status) in rows_:
-                try:
-                    context = await browser.new_context(storage_state=str(Path(BASE_DIR / "cookiesFile" / file_path)))
-                    context = await set_init_script(context)
-                    page = await context.new_page()
-                    url = url_map.get(acc_type) or "https://www.baidu.com"
-                    await page.goto(url, wait_until="domcontentloaded")
-                    await page.wait_for_timeout(500)
-                    # 命名标签便于识别
-                    try:
-                        await page.evaluate("document.title = document.title + ' - ' + arguments[0]", user_name)
-                    except Exception:
-                        pass
-                except Exception as e:
-                    print(f"open tab failed id={acc_id} err={e}")
-            # 保持浏览器打开，直到进程退出（避免意外自动关闭）
-            print("[openAccounts] Tabs opened, holding browser open...")
+    async def open_tabs_async(rows_):
+        # Playwright 只在真正打开浏览器时导入，不拖慢服务启动
+        from playwright.async_api import async_playwright
+        from utils.base_social_media import launch_chromium_with_codecs, set_init_script
+
+        p = await async_playwright().start()
+        browser = await launch_chromium_with_codecs(p, headless=False, executable_path=None)
+        _open_browsers.append(browser)
+        for (acc_id, acc_type, file_path, user_name, _status) in rows_:
             try:
-                while True:
-                    await asyncio.sleep(3600)
-            finally:
-                # do not stop playwright/browsers here to allow persistence if loop ends unexpectedly
-                pass
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(open_tabs_async())
-        finally:
-            loop.close()
+                context = await browser.new_context(storage_state=str(Path(BASE_DIR / "cookiesFile" / file_path)))
+                context = await set_init_script(context)
+                page = await context.new_page()
+                # 平台登录后页面地址
+                spec = platforms.find(acc_type)
+                url = spec.entry_url if spec else "https://www.baidu.com"
+                await page.goto(url, wait_until="domcontentloaded")
+                await page.wait_for_timeout(500)
+                # 命名标签便于识别
+                try:
+                    await page.evaluate("document.title = document.title + ' - ' + arguments[0]", user_name)
+                except Exception:
+                    pass
+            except Exception as e:
+                print(f"open tab failed id={acc_id} err={e}")
+        # 共享事件循环常驻，浏览器会一直保持打开直到进程退出（_open_browsers 持有引用）
+        print("[openAccounts] Tabs opened, holding browser open...")
 
-    t = threading.Thread(target=run_open_tabs, args=(rows,), daemon=True)
-    t.start()
+    spawn(open_tabs_async(rows), name="openAccounts")
 
     return jsonify({
         "code": 200,
@@ -566,19 +697,7 @@ def updateUserinfo():
     type = data.get('type')
     userName = data.get('userName')
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 更新数据库记录
-            cursor.execute('''
-                           UPDATE user_info
-                           SET type     = ?,
-                               userName = ?
-                           WHERE id = ?;
-                           ''', (type, userName, user_id))
-            conn.commit()
+        db.update_account(user_id, type, userName)
 
         return jsonify({
             "code": 200,
@@ -599,85 +718,102 @@ def postVideoBatch():
 
     if not isinstance(data_list, list):
         return jsonify({"error": "Expected a JSON array"}), 400
+    unsupported = [data.get('type') for data in data_list if platforms.find(data.get('type')) is None]
+    if unsupported:
+        return jsonify({
+            "code": 400,
+            "msg": f"unsupported platform type: {unsupported[0]}",
+            "data": None
+        }), 400
+    job_ids = []
     for data in data_list:
-        # 从JSON数据中提取fileList和accountList
-        file_list = data.get('fileList', [])
-        account_list = data.get('accountList', [])
-        type = data.get('type')
-        title = data.get('title')
-        tags = data.get('tags')
-        category = data.get('category')
-        enableTimer = data.get('enableTimer')
-        if category == 0:
-            category = None
-
-        videos_per_day = data.get('videosPerDay')
-        daily_times = data.get('dailyTimes')
-        start_days = data.get('startDays')
         # 打印获取到的数据（仅作为示例）
-        print("File List:", file_list)
-        print("Account List:", account_list)
-        match type:
-            case 1:
-                return
-            case 2:
-                post_video_tencent(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                                   start_days)
-            case 3:
-                post_video_DouYin(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days)
-            case 4:
-                post_video_ks(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days)
+        print("File List:", data.get('fileList', []))
+        print("Account List:", data.get('accountList', []))
+        job_ids.append(enqueue_job(data.get('type'), data))
     # 返回响应给客户端
     return jsonify(
         {
             "code": 200,
             "msg": None,
-            "data": None
+            "data": {"jobIds": job_ids}
         }), 200
 
-# 包装函数：在线程中运行异步函数
-def run_async_function(type,id,status_queue, update_mode=False, record_id=None):
+async def run_login(type, id, status_queue, update_mode=False, record_id=None, session_id=None):
     cookiesFile_dir = Path(BASE_DIR / "cookiesFile")
     cookiesFile_dir.mkdir(parents=False, exist_ok=True)
-    match type:
-        case '1':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(xiaohongshu_cookie_gen(id, status_queue, update_mode, record_id))
-            loop.close()
-        case '2':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(get_tencent_cookie(id,status_queue, update_mode, record_id))
-            loop.close()
-        case '3':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(douyin_cookie_gen(id,status_queue, update_mode, record_id))
-            loop.close()
-        case '4':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(get_ks_cookie(id,status_queue, update_mode, record_id))
-            loop.close()
-        case '5':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(bilibili_cookie_gen(id,status_queue, update_mode, record_id))
-            loop.close()
+    # 登录模块（及其依赖的 Playwright、xhs 等）首次登录时才导入
+    try:
+        handler = platforms.login_flow(type)
+    except Exception as e:
+        print(f"登录任务异常: {e}")
+        handler = None
+    if handler is None:
+        status_queue.put("500")
+        return
+    # 超时、取消和异常由登录会话管理器处理，保证 SSE 流能收到最终状态并结束
+    await run_login_session(handler, type, id, status_queue, update_mode, record_id, session_id)
 
 # SSE 流生成器函数
-def sse_stream(status_queue):
-    while True:
-        if not status_queue.empty():
-            msg = status_queue.get()
+def sse_stream(status_queue, on_close=None, session_id=None):
+    """
+    阻塞等待登录线程的消息，不再轮询：
+      - 每 LOGIN_SSE_HEARTBEAT_SECONDS 秒无消息时发送注释行心跳，保持连接并及时发现客户端断开
+      - 收到最终状态 "200"/"500" 后结束流；超过 LOGIN_SSE_TIMEOUT_SECONDS 仍无结果按失败结束
+      - 客户端断开或流结束时调用 on_close 清理
+      - session_id 以具名事件 session 发送（前端 onmessage 只处理默认事件，不受影响），用于 /cancelLogin
+    """
+    deadline = time.monotonic() + LOGIN_SSE_TIMEOUT_SECONDS
+    try:
+        # 流结束后浏览器 EventSource 会自动重连，而重连会重新发起登录；把重连间隔设得足够长，由前端主动关闭
+        yield "retry: 86400000\n\n"
+        if session_id:
+            yield f"event: session\ndata: {session_id}\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield "data: 500\n\n"
+                return
+            try:
+                msg = status_queue.get(timeout=min(LOGIN_SSE_HEARTBEAT_SECONDS, remaining))
+            except Empty:
+                yield ": ping\n\n"
+                continue
             yield f"data: {msg}\n\n"
-        else:
-            # 避免 CPU 占满
-            time.sleep(0.1)
+            if msg in LOGIN_TERMINAL_STATUS:
+                return
+    finally:
+        if on_close is not None:
+            on_close()
 
-if __name__ == '__main__':
+
+async def sse_stream_async(status_queue, session_id=None):
+    """sse_stream 的异步版本（ASGI 原生 SSE）：在事件循环上等待消息，不占用线程；清理由调用方负责。"""
+    deadline = time.monotonic() + LOGIN_SSE_TIMEOUT_SECONDS
+    yield "retry: 86400000\n\n"
+    if session_id:
+        yield f"event: session\ndata: {session_id}\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            yield "data: 500\n\n"
+            return
+        try:
+            msg = await status_queue.get_async(timeout=min(LOGIN_SSE_HEARTBEAT_SECONDS, remaining))
+        except Empty:
+            yield ": ping\n\n"
+            continue
+        yield f"data: {msg}\n\n"
+        if msg in LOGIN_TERMINAL_STATUS:
+            return
+
+
+def startup() -> None:
     initialize_database()
-    app.run(host='0.0.0.0' ,port=5409)
+    start_workers(PUBLISH_WORKERS)
+    start_refresher()
+
+
+if __name__ == '__main__':
+    startup()
+    app.run(host='0.0.0.0' ,port=5409, threaded=True)
@@ -0,0 +1,167 @@
+"""
+账号 Cookie 状态缓存。
+
+每个账号在 user_info 中记录 last_checked_at / last_result，TTL 按账号单独计算；
+后台刷新线程按优先级（从未校验 > 最久未校验）提前重新校验即将过期的账号，
+因此 /getValidAccounts 始终直接返回缓存状态，只有 force=1 时才同步校验。
+"""
+import os
+import threading
+import time
+
+from myUtils import db
+from myUtils.async_runtime import run_sync
+
+# 单个账号校验结果的有效期（秒），默认 1 小时
+ACCOUNT_STATUS_TTL_SECONDS = int(os.getenv('ACCOUNT_STATUS_TTL_SECONDS', '3600'))
+# 距离过期不足该时间（秒）的账号会被后台提前刷新
+ACCOUNT_REFRESH_AHEAD_SECONDS = int(os.getenv('ACCOUNT_REFRESH_AHEAD_SECONDS', '300'))
+# 后台刷新线程的检查间隔（秒）
+ACCOUNT_REFRESH_INTERVAL_SECONDS = float(os.getenv('ACCOUNT_REFRESH_INTERVAL_SECONDS', '60'))
+# 每轮最多刷新的账号数
+ACCOUNT_REFRESH_BATCH = int(os.getenv('ACCOUNT_REFRESH_BATCH', '20'))
+# 是否启动后台刷新
+ACCOUNT_REFRESH_ENABLED = os.getenv('ACCOUNT_REFRESH_ENABLED', '1').lower() in ('1', 'true', 'yes')
+
+ACCOUNT_COLUMNS = "id, type, filePath, userName, status, last_checked_at, last_result"
+
+
+def migrate_user_info(cursor) -> None:
+    """为旧数据库补齐按账号缓存所需的列（追加在末尾，不影响按位置读取的旧字段）。"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(user_info)")}
+    if 'last_checked_at' not in columns:
+        cursor.execute("ALTER TABLE user_info ADD COLUMN last_checked_at REAL")
+    if 'last_result' not in columns:
+        cursor.execute("ALTER TABLE user_info ADD COLUMN last_result INTEGER")
+
+
+def is_stale(last_checked_at, now: float | None = None) -> bool:
+    if last_checked_at is None:
+        return True
+    return (now or time.time()) - last_checked_at >= ACCOUNT_STATUS_TTL_SECONDS
+
+
+def list_accounts(ids=None) -> list[list]:
+    """
+    返回 [id, type, filePath, userName, status, last_checked_at, last_result, stale]。
+    前 5 列与旧接口一致，新增字段追加在末尾。
+    """
+    now = time.time()
+    rows = db.list_account_rows(ACCOUNT_COLUMNS, ids)
+    return [list(row) + [is_stale(row[5], now)] for row in rows]
+
+
+def list_accounts_page(**query) -> tuple[list[list], str | None]:
+    """按筛选条件分页返回账号（行格式同 list_accounts），以及下一页游标。"""
+    now = time.time()
+    rows, next_cursor = db.account_page(ACCOUNT_COLUMNS, **query)
+    return [list(row) + [is_stale(row[5], now)] for row in rows], next_cursor
+
+
+def stale_count(now: float | None = None) -> int:
+    """已过期（或从未校验）的账号数；数据版本不变时该值只会随时间增加，可与版本号一起作为 ETag。"""
+    return db.count_checked_before((now or time.time()) - ACCOUNT_STATUS_TTL_SECONDS)
+
+
+def due_accounts(limit: int = ACCOUNT_REFRESH_BATCH, now: float | None = None) -> list[list]:
+    """即将过期或已过期的账号，从未校验过的排最前，其余按上次校验时间从旧到新。"""
+    deadline = (now or time.time()) - (ACCOUNT_STATUS_TTL_SECONDS - ACCOUNT_REFRESH_AHEAD_SECONDS)
+    with db.connection() as conn:
+        rows = conn.execute(f'''
+            SELECT {ACCOUNT_COLUMNS} FROM user_info
+            WHERE last_checked_at IS NULL OR last_checked_at < ?
+            ORDER BY last_checked_at IS NOT NULL, last_checked_at
+            LIMIT ?
+        ''', (deadline, limit)).fetchall()
+    return [list(row) for row in rows]
+
+
+def save_result(account, flag: bool) -> None:
+    """单个账号校验完成即写库；account 为 list 时同步更新其中的 status / last_checked_at / last_result。"""
+    status = 1 if flag else 0
+    now = db.update_account_status(account[0], status)
+    if isinstance(account, list) and len(account) >= 7:
+        account[4], account[5], account[6] = status, now, status
+        if len(account) >= 8:
+            account[7] = False
+
+
+async def refresh_accounts(accounts, preview: bool = False) -> dict:
+    # 校验模块依赖 Playwright 和各平台 SDK，首次校验时才导入
+    from myUtils.auth import validate_accounts
+
+    return await validate_accounts(accounts, preview=preview, on_result=save_result)
+
+
+class AccountStatusRefresher(threading.Thread):
+    """后台刷新线程：定期挑出即将过期的账号并发校验；request_refresh() 可插队指定账号。"""
+
+    def __init__(self, interval: float = ACCOUNT_REFRESH_INTERVAL_SECONDS):
+        super().__init__(daemon=True, name="account-status-refresher")
+        self.interval = interval
+        self.refreshing = False
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._requested: set[int] = set()
+        self._lock = threading.Lock()
+
+    def request_refresh(self, ids=None) -> None:
+        """尽快刷新指定账号（为空时刷新全部账号），不等待结果。"""
+        with self._lock:
+            if ids:
+                self._requested.update(ids)
+            else:
+                self._requested.update(row[0] for row in list_accounts())
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+
+    def _next_batch(self) -> list[list]:
+        with self._lock:
+            requested = list(self._requested)[:ACCOUNT_REFRESH_BATCH]
+            self._requested.difference_update(requested)
+        batch = list_accounts(requested) if requested else []
+        if len(batch) < ACCOUNT_REFRESH_BATCH:
+            seen = {row[0] for row in batch}
+            batch += [row for row in due_accounts(ACCOUNT_REFRESH_BATCH - len(batch)) if row[0] not in seen]
+        return batch
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            # 本轮满批次说明可能还有待刷新的账号，紧接着进行下一轮
+            pending = False
+            try:
+                batch = self._next_batch()
+                if batch:
+                    print(f"[account_status] 后台刷新 {len(batch)} 个账号")
+                    self.refreshing = True
+                    run_sync(refresh_accounts(batch))
+                    pending = len(batch) >= ACCOUNT_REFRESH_BATCH
+            except Exception as e:
+                print(f"[account_status] 后台刷新失败: {e}")
+            finally:
+                self.refreshing = False
+            with self._lock:
+                pending = pending or bool(self._requested)
+            if not pending:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+
+_refresher: AccountStatusRefresher | None = None
+
+
+def start_refresher() -> AccountStatusRefresher | None:
+    global _refresher
+    if not ACCOUNT_REFRESH_ENABLED:
+        return None
+    if _refresher is None or not _refresher.is_alive():
+        _refresher = AccountStatusRefresher()
+        _refresher.start()
+    return _refresher
+
+
+def get_refresher() -> AccountStatusRefresher | None:
+    return _refresher
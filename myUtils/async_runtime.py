@@ -0,0 +1,122 @@
+"""
+进程内共享的事件循环。
+
+登录、打开账号、账号校验、发布等 Playwright 任务都作为 task 运行在同一个事件循环上，
+不再各自创建线程和 asyncio.new_event_loop()，浏览器池（按事件循环区分）也因此只有一份。
+
+  - 通过 ASGI 启动（asgi.py）时，attach() 绑定服务器自身的事件循环
+  - 通过 app.run() 或独立 worker 启动时，首次使用时在后台线程中创建一个事件循环
+
+同步代码（Flask 视图、发布 worker 线程）用 run_sync() 提交协程并等待结果，
+不等待结果的后台任务用 spawn()。不能在事件循环线程内调用 run_sync()。
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from typing import Any, Coroutine, Optional
+
+
+class AsyncRuntime:
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._tasks: set = set()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._start_thread()
+            return self._loop
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """使用外部已在运行的事件循环（ASGI 服务器的循环）。"""
+        with self._lock:
+            if self._loop is not None and self._loop is not loop and self._thread is not None:
+                raise RuntimeError("async runtime already started with its own loop")
+            self._loop = loop
+
+    def _start_thread(self) -> None:
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="async-runtime", daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+
+    def in_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Coroutine, context: Optional[contextvars.Context] = None) -> concurrent.futures.Future:
+        """把协程提交到共享循环，返回 concurrent.futures.Future；context 为 task 使用的上下文变量。"""
+        loop = self.loop
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def transfer(task: asyncio.Task) -> None:
+            self._tasks.discard(task)
+            if future.cancelled():
+                return
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start() -> None:
+            if not future.set_running_or_notify_cancel():
+                coro.close()
+                return
+            task = loop.create_task(coro)
+            self._tasks.add(task)
+            task.add_done_callback(transfer)
+            future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        # 在调用方的上下文中创建 task，使 Flask 的 request 等上下文变量在协程内可用
+        if context is not None:
+            loop.call_soon_threadsafe(context.run, start)
+        else:
+            loop.call_soon_threadsafe(start)
+        return future
+
+    def run_sync(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("run_sync() called from the event loop thread")
+        return self.submit(coro, contextvars.copy_context()).result(timeout)
+
+    def spawn(self, coro: Coroutine, name: str = "task") -> concurrent.futures.Future:
+        future = self.submit(coro)
+
+        def report(f: concurrent.futures.Future) -> None:
+            if not f.cancelled() and f.exception() is not None:
+                print(f"[runtime] {name} failed: {f.exception()!r}")
+
+        future.add_done_callback(report)
+        return future
+
+
+_runtime = AsyncRuntime()
+
+
+def get_runtime() -> AsyncRuntime:
+    return _runtime
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    return _runtime.run_sync(coro, timeout)
+
+
+def spawn(coro: Coroutine, name: str = "task") -> concurrent.futures.Future:
+    return _runtime.spawn(coro, name)
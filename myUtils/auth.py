@@ -1,12 +1,15 @@
 import asyncio
 import configparser
 import os
+import time
 
-from playwright.async_api import async_playwright
 from xhs import XhsClient
 
 from conf import BASE_DIR
-from utils.base_social_media import set_init_script, launch_chromium_with_codecs
+from myUtils import platforms
+from myUtils.cookie_probe import probe_cookie
+from utils import metrics
+from utils.browser_pool import get_browser_pool, use_browser_pool
 from utils.log import (
     tencent_logger,
     kuaishou_logger,
@@ -16,11 +19,20 @@ from utils.log import (
 from pathlib import Path
 from uploader.xhs_uploader.main import sign_local
 
+# 批量校验时同时进行的账号数
+ACCOUNT_CHECK_CONCURRENCY = int(os.getenv('ACCOUNT_CHECK_CONCURRENCY', '6'))
+# 单平台同时校验的账号数，默认取自平台注册表，可用 ACCOUNT_CHECK_PLATFORM_CONCURRENCY="douyin=4,xhs=1" 覆盖
+ACCOUNT_CHECK_PLATFORM_CONCURRENCY = {spec.name: spec.check_concurrency for spec in platforms.all_platforms()}
+for _item in os.getenv('ACCOUNT_CHECK_PLATFORM_CONCURRENCY', '').split(','):
+    if '=' in _item:
+        _name, _limit = _item.split('=', 1)
+        ACCOUNT_CHECK_PLATFORM_CONCURRENCY[_name.strip()] = int(_limit)
+# 单个账号校验的超时时间（秒），超时按失效处理
+ACCOUNT_CHECK_TIMEOUT = float(os.getenv('ACCOUNT_CHECK_TIMEOUT', '30'))
+
 async def cookie_auth_douyin(account_file, preview: bool = False):
-    async with async_playwright() as playwright:
-        browser = await launch_chromium_with_codecs(playwright, headless=not preview, executable_path=None)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    pool = get_browser_pool(headless=not preview)
+    async with pool.context(storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -29,8 +41,6 @@ async def cookie_auth_douyin(account_file, preview: bool = False):
             await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
         except:
             douyin_logger.warning("[douyin] cookie 失效")
-            await context.close()
-            await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count() or await page.get_by_text('扫码登录').count():
@@ -45,10 +55,8 @@ async def cookie_auth_douyin(account_file, preview: bool = False):
             return True
 
 async def cookie_auth_tencent(account_file, preview: bool = False):
-    async with async_playwright() as playwright:
-        browser = await launch_chromium_with_codecs(playwright, headless=not preview, executable_path=None)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    pool = get_browser_pool(headless=not preview)
+    async with pool.context(storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -66,10 +74,8 @@ async def cookie_auth_tencent(account_file, preview: bool = False):
             return True
 
 async def cookie_auth_ks(account_file, preview: bool = False):
-    async with async_playwright() as playwright:
-        browser = await launch_chromium_with_codecs(playwright, headless=not preview, executable_path=None)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    pool = get_browser_pool(headless=not preview)
+    async with pool.context(storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -88,10 +94,8 @@ async def cookie_auth_ks(account_file, preview: bool = False):
 
 
 async def cookie_auth_xhs(account_file, preview: bool = False):
-    async with async_playwright() as playwright:
-        browser = await launch_chromium_with_codecs(playwright, headless=not preview, executable_path=None)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    pool = get_browser_pool(headless=not preview)
+    async with pool.context(storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -100,8 +104,6 @@ async def cookie_auth_xhs(account_file, preview: bool = False):
             await page.wait_for_url("https://creator.xiaohongshu.com/creator-micro/content/upload", timeout=5000)
         except:
             xiaohongshu_logger.warning("[xhs] cookie 失效")
-            await context.close()
-            await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count() or await page.get_by_text('扫码登录').count():
@@ -117,24 +119,40 @@ async def cookie_auth_xhs(account_file, preview: bool = False):
 
 
 async def check_cookie(type, file_path, preview: bool = False):
-    match type:
-        # 小红书
-        case 1:
-            return await cookie_auth_xhs(Path(BASE_DIR / "cookiesFile" / file_path), preview)
-        # 视频号
-        case 2:
-            return await cookie_auth_tencent(Path(BASE_DIR / "cookiesFile" / file_path), preview)
-        # 抖音
-        case 3:
-            return await cookie_auth_douyin(Path(BASE_DIR / "cookiesFile" / file_path), preview)
-        # 快手
-        case 4:
-            return await cookie_auth_ks(Path(BASE_DIR / "cookiesFile" / file_path), preview)
-        # B站
-        case 5:
-            return await cookie_auth_bilibili(Path(BASE_DIR / "cookiesFile" / file_path), preview)
-        case _:
-            return False
+    # 单独调用时临时持有浏览器池；在 validate_accounts 等批量场景中复用外层已打开的浏览器
+    async with use_browser_pool(headless=not preview):
+        return await _check_cookie(type, file_path, preview)
+
+
+async def _check_cookie(type, file_path, preview: bool = False):
+    spec = platforms.find(type)
+    if spec is None:
+        return False
+    account_file = Path(BASE_DIR / "cookiesFile" / file_path)
+    # 先用 HTTP 接口快速判断登录态，结论不明确时才打开页面校验；预览模式总是打开页面
+    if not preview:
+        started = time.perf_counter()
+        flag = await probe_cookie(spec.name, account_file)
+        if flag is not None:
+            _observe_check(spec.name, 'probe', flag, started)
+            print(f"[cookie_probe] [{spec.name}] {file_path}: {'cookie 有效' if flag else 'cookie 失效'}")
+            return flag
+    validator = platforms.validator(type)
+    if validator is None:
+        return False
+    started = time.perf_counter()
+    flag = None
+    try:
+        flag = await validator(account_file, preview)
+        return flag
+    finally:
+        # 超时（外层 wait_for 取消）和异常都记为 error
+        _observe_check(spec.name, 'browser', flag, started)
+
+
+def _observe_check(platform: str, method: str, flag, started: float) -> None:
+    result = 'error' if flag is None else ('valid' if flag else 'invalid')
+    metrics.COOKIE_CHECKS.observe(time.perf_counter() - started, platform=platform, method=method, result=result)
 
 async def cookie_auth_bilibili(account_file, preview: bool = False):
     """B站cookie验证函数"""
@@ -142,10 +160,8 @@ async def cookie_auth_bilibili(account_file, preview: bool = False):
     
     bilibili_logger.info(f"[bilibili_auth] 开始验证B站cookie: {account_file}")
     
-    async with async_playwright() as playwright:
-        browser = await launch_chromium_with_codecs(playwright, headless=not preview, executable_path=None)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    pool = get_browser_pool(headless=not preview)
+    async with pool.context(storage_state=account_file) as context:
         page = await context.new_page()
         
         try:
@@ -162,8 +178,6 @@ async def cookie_auth_bilibili(account_file, preview: bool = False):
                 bilibili_logger.warning("[bilibili_auth] 页面重定向到登录页，cookie失效")
                 if preview:
                     await page.wait_for_timeout(1500)
-                await context.close()
-                await browser.close()
                 return False
             
             # 检查页面是否有明确的登录表单或按钮（更精确的选择器）
@@ -187,8 +201,6 @@ async def cookie_auth_bilibili(account_file, preview: bool = False):
                 bilibili_logger.warning("[bilibili_auth] 检测到登录表单，cookie失效")
                 if preview:
                     await page.wait_for_timeout(1500)
-                await context.close()
-                await browser.close()
                 return False
             
             # 额外调试：记录页面上的所有"登录"文字
@@ -206,21 +218,60 @@ async def cookie_auth_bilibili(account_file, preview: bool = False):
             bilibili_logger.info("[bilibili_auth] cookie验证成功")
             if preview:
                 await page.wait_for_timeout(1500)
-            await context.close()
-            await browser.close()
             return True
             
         except Exception as e:
             bilibili_logger.error(f"[bilibili_auth] cookie验证失败: {e}")
-            try:
-                await context.close()
-            except Exception:
-                pass
-            try:
-                await browser.close()
-            except Exception:
-                pass
             return False
 
+async def cookie_auth_tiktok(account_file, preview: bool = False):
+    # TikTok / 百家号的校验自行启动无头浏览器，不使用浏览器池
+    from uploader.tk_uploader.main import cookie_auth
+    return await cookie_auth(str(account_file))
+
+
+async def cookie_auth_baijiahao(account_file, preview: bool = False):
+    from uploader.baijiahao_uploader.main import cookie_auth
+    return await cookie_auth(str(account_file))
+
+
+async def validate_accounts(accounts, preview: bool = False, on_result=None) -> dict:
+    """
+    并发校验一批账号，共用同一个浏览器池，每个账号一个独立 context。
+    accounts: [(id, type, filePath, ...)]；on_result(account, flag) 在每个账号完成时于线程中回调（用于即时写库）。
+    返回 {id: bool}，单个账号出错或超时按失效处理。
+    """
+    global_sem = asyncio.Semaphore(max(1, ACCOUNT_CHECK_CONCURRENCY))
+    platform_sems = {
+        name: asyncio.Semaphore(max(1, limit)) for name, limit in ACCOUNT_CHECK_PLATFORM_CONCURRENCY.items()
+    }
+    results = {}
+
+    async def check_one(account):
+        account_id, type, file_path = account[0], account[1], account[2]
+        spec = platforms.find(type)
+        platform = spec.name if spec else 'unknown'
+        platform_sem = platform_sems.setdefault(platform, asyncio.Semaphore(1))
+        async with platform_sem:
+            async with global_sem:
+                try:
+                    flag = await asyncio.wait_for(_check_cookie(type, file_path, preview), ACCOUNT_CHECK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    print(f"check_cookie 超时: platform={platform} id={account_id}")
+                    flag = False
+                except Exception as e:
+                    # 出错时保守置为无效
+                    print(f"check_cookie 出错: platform={platform} id={account_id} err={e}")
+                    flag = False
+        results[account_id] = bool(flag)
+        print(f"     → [{platform}] id={account_id} 结果: {'cookie 有效' if flag else 'cookie 失效'}")
+        if on_result is not None:
+            # 回调会写库（busy_timeout 下可能等待数秒），放到线程中执行，不阻塞事件循环
+            await asyncio.to_thread(on_result, account, bool(flag))
+
+    async with use_browser_pool(headless=not preview):
+        await asyncio.gather(*(check_one(account) for account in accounts))
+    return results
+
 # a = asyncio.run(check_cookie(1,"3a6cfdc0-3d51-11f0-8507-44e51723d63c.json"))
 # print(a)
\ No newline at end of file
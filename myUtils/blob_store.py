@@ -0,0 +1,197 @@
+"""
+按内容寻址的视频存储（去重）。
+
+同一份视频内容只在 videoFile/ 下保存一份，文件名为 <sha256><扩展名>：
+  - blobs 表记录每个内容摘要的大小、文件名和引用计数
+  - file_records.blob_digest 指向 blobs，file_path 即 blob 文件名（仍位于 videoFile/ 根目录，
+    预览、下载和发布的路径拼接方式不变）
+  - 删除素材只减少引用计数，计数归零时才删除文件
+写入和删除都在 BEGIN IMMEDIATE 事务（db.transaction）内完成，避免并发上传同一内容时与删除交错。
+blob 的文件名就是其内容的摘要，因此交给 add_file 的临时文件在算好摘要之后不能再有任何写入者：
+save_stream 自己写完才登记；分片上传由 add_file 的 guard 在登记事务内确认会话仍被 finalize 认领且没有分片在写。
+
+迁移已有的 videoFile/ 目录（一次遍历 file_records，重复内容只保留一份）：
+    python -m myUtils.blob_store --migrate
+排队中和执行中的发布任务（publish_jobs.payload 的 fileList）在同一事务内改用新文件名。
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from conf import BASE_DIR
+from myUtils import db
+
+VIDEO_DIR = Path(BASE_DIR / "videoFile")
+
+# 读写文件时每次处理的字节数
+IO_BLOCK_SIZE = 1024 * 1024
+
+
+def migrate_file_records(cursor) -> None:
+    """为旧数据库的 file_records 补齐 blob_digest 列。"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(file_records)")}
+    if 'blob_digest' not in columns:
+        cursor.execute("ALTER TABLE file_records ADD COLUMN blob_digest TEXT")
+
+
+def blob_name(digest: str, filename: str) -> str:
+    return f"{digest}{Path(filename).suffix.lower()}"
+
+
+def _add_ref(cursor, digest: str, size: int, temp_path: Path, filename: str) -> str:
+    """在事务内为 digest 增加一次引用；内容首次出现时把临时文件改名为 blob，否则丢弃临时文件。"""
+    row = cursor.execute("SELECT path FROM blobs WHERE digest = ?", (digest,)).fetchone()
+    if row is not None and (VIDEO_DIR / row['path']).exists():
+        cursor.execute("UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?", (digest,))
+        temp_path.unlink(missing_ok=True)
+        return row['path']
+    path = row['path'] if row is not None else blob_name(digest, filename)
+    os.replace(temp_path, VIDEO_DIR / path)
+    if row is not None:
+        # 记录还在但文件丢失：用新上传的内容补回
+        cursor.execute("UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?", (digest,))
+    else:
+        cursor.execute('''
+            INSERT INTO blobs (digest, size, path, refcount, created_at) VALUES (?, ?, ?, 1, ?)
+        ''', (digest, size, path, time.time()))
+    return path
+
+
+def _release(cursor, digest: str) -> bool:
+    """在事务内减少一次引用，计数归零时删除 blob 记录和文件；返回是否删除了文件。"""
+    row = cursor.execute("SELECT path, refcount FROM blobs WHERE digest = ?", (digest,)).fetchone()
+    if row is None:
+        return False
+    if row['refcount'] > 1:
+        cursor.execute("UPDATE blobs SET refcount = refcount - 1 WHERE digest = ?", (digest,))
+        return False
+    cursor.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+    (VIDEO_DIR / row['path']).unlink(missing_ok=True)
+    return True
+
+
+def add_file(temp_path: Path, filename: str, digest: str, size: int, guard=None) -> dict:
+    """
+    把已算好摘要的临时文件（须位于 videoFile/ 下）登记为素材，返回 {"filename", "filepath"}。
+    guard(conn) 在登记事务内、改名和增加引用之前执行，抛出异常则不登记（临时文件保持原样）。
+    """
+    with db.transaction() as conn:
+        if guard is not None:
+            guard(conn)
+        path = _add_ref(conn, digest, size, temp_path, filename)
+        db.insert_file_record(conn, filename, size, path, digest)
+    return {"filename": filename, "filepath": path}
+
+
+def save_stream(stream, filename: str) -> dict:
+    """边写临时文件边计算 sha256，写完后登记为素材；重复内容只保留一份。"""
+    VIDEO_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = VIDEO_DIR / f".{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for block in iter(lambda: stream.read(IO_BLOCK_SIZE), b''):
+                f.write(block)
+                digest.update(block)
+                size += len(block)
+        return add_file(temp_path, filename, digest.hexdigest(), size)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def delete_record(file_id: int) -> dict | None:
+    """删除素材记录并释放其引用的内容；记录不存在时返回 None。"""
+    with db.transaction() as conn:
+        record = conn.execute("SELECT * FROM file_records WHERE id = ?", (file_id,)).fetchone()
+        if record is None:
+            return None
+        record = dict(record)
+        conn.execute("DELETE FROM file_records WHERE id = ?", (file_id,))
+        if record.get('blob_digest'):
+            _release(conn, record['blob_digest'])
+    return record
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(IO_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _rename_in_pending_jobs(cursor, old: str, new: str) -> int:
+    """
+    在事务内把未完成发布任务中的 old 改为 new，返回改写的任务数：
+    payload 的 fileList，以及已完成的逐项结果（任务恢复时按 文件×账号 跳过已发布的组合）。
+    """
+    from myUtils.jobs import JOB_QUEUED, JOB_RUNNING
+
+    if old == new or cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'publish_jobs'").fetchone() is None:
+        return 0
+    changed = 0
+    rows = cursor.execute("SELECT id, payload, result FROM publish_jobs WHERE status IN (?, ?)",
+                          (JOB_QUEUED, JOB_RUNNING)).fetchall()
+    for row in rows:
+        payload = json.loads(row['payload'])
+        files = payload.get('fileList') or []
+        if old not in files:
+            continue
+        payload['fileList'] = [new if name == old else name for name in files]
+        results = json.loads(row['result']) if row['result'] else None
+        for result in results or []:
+            if result.get('file') == old:
+                result['file'] = new
+        cursor.execute("UPDATE publish_jobs SET payload = ?, result = ? WHERE id = ?",
+                       (json.dumps(payload, ensure_ascii=False),
+                        json.dumps(results, ensure_ascii=False) if results is not None else None, row['id']))
+        changed += 1
+    return changed
+
+
+def migrate_video_dir() -> dict:
+    """
+    把尚未去重的 file_records 迁移到按内容寻址的存储：逐条计算摘要，
+    首次出现的内容改名为 blob，重复内容直接删除并指向已有 blob。
+    """
+    stats = {"records": 0, "deduped": 0, "missing": 0, "freed_bytes": 0, "jobs": 0}
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, filename, file_path FROM file_records WHERE blob_digest IS NULL").fetchall()
+    for row in rows:
+        source = VIDEO_DIR / row['file_path']
+        if not source.is_file():
+            stats["missing"] += 1
+            print(f"⚠️ 文件不存在，跳过: {row['file_path']}")
+            continue
+        digest = file_sha256(source)
+        size = source.stat().st_size
+        with db.transaction() as conn:
+            existed = conn.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone() is not None
+            path = _add_ref(conn, digest, size, source, row['file_path'])
+            conn.execute("UPDATE file_records SET file_path = ?, blob_digest = ? WHERE id = ?",
+                         (path, digest, row['id']))
+            stats["jobs"] += _rename_in_pending_jobs(conn, row['file_path'], path)
+        stats["records"] += 1
+        if existed:
+            stats["deduped"] += 1
+            stats["freed_bytes"] += size
+    print(f"✅ 迁移完成: {stats['records']} 条记录，去重 {stats['deduped']} 个文件，"
+          f"释放 {stats['freed_bytes'] / (1024 * 1024):.2f} MB，缺失 {stats['missing']} 个，"
+          f"改写未完成的发布任务 {stats['jobs']} 次")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="按内容寻址的视频存储")
+    parser.add_argument('--migrate', action='store_true', help="对已有的 videoFile/ 去重并迁移到 blob 存储")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate_video_dir()
+    else:
+        parser.print_help()
@@ -0,0 +1,331 @@
+"""
+分片/断点续传上传。
+
+  1. init:     声明文件名、大小、sha256，服务端预分配 videoFile/<final>.part 并返回 uploadId
+  2. chunk:    PUT 原始字节到 /uploadSession/<id>/chunk/<index>，直接写入文件中的最终偏移位置
+  3. status:   查询已收到的分片，断线后据此只补传缺失分片
+  4. finalize: 校验所有分片已到齐并核对 sha256，通过后存入内容寻址存储并写入 file_records
+
+请求体按块读取并直接写盘，内存占用与文件大小无关。
+finalize 先在事务内把会话从 uploading 改为 finalizing 再处理文件，并发或重试的 finalize 只有一个生效，
+此后到达的分片被拒绝；sha256 不一致时找出有问题的分片并退回 uploading，客户端补传后可再次 finalize。
+分片写盘期间在 upload_writers 中登记，有登记时 finalize 返回 409：校验和登记为 blob 的文件不会再被写入。
+写入超过 UPLOAD_CHUNK_WRITE_TIMEOUT 的分片请求自行放弃，登记随之失效（进程崩溃留下的登记也不会永久阻塞 finalize）。
+"""
+import hashlib
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+
+from conf import BASE_DIR
+from myUtils import db
+from myUtils.blob_store import add_file
+
+VIDEO_DIR = Path(BASE_DIR / "videoFile")
+
+# 默认分片大小（字节），客户端可在 init 时指定
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# 单个文件大小上限（字节）
+UPLOAD_MAX_FILE_SIZE = int(os.getenv('UPLOAD_MAX_FILE_SIZE', str(20 * 1024 * 1024 * 1024)))
+# 未完成的上传会话保留时长（秒），过期后清理临时文件
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv('UPLOAD_SESSION_TTL_SECONDS', str(24 * 3600)))
+# 单个分片请求写盘的最长时长（秒），超时的请求不再写入文件
+UPLOAD_CHUNK_WRITE_TIMEOUT = int(os.getenv('UPLOAD_CHUNK_WRITE_TIMEOUT', '600'))
+# 读写请求体/文件时每次处理的字节数
+IO_BLOCK_SIZE = 1024 * 1024
+# 超时的分片请求最多还会写入一个块；再等这么久（秒）才把它的登记视为失效
+WRITER_GRACE_SECONDS = 60
+
+SESSION_UPLOADING = 'uploading'
+SESSION_FINALIZING = 'finalizing'
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = 400, data: dict | None = None):
+        super().__init__(message)
+        self.status = status
+        self.data = data
+
+
+def migrate_upload_sessions(cursor) -> None:
+    """为旧数据库补齐会话状态和分片摘要列。"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(upload_sessions)")}
+    if 'state' not in columns:
+        cursor.execute(f"ALTER TABLE upload_sessions ADD COLUMN state TEXT NOT NULL DEFAULT '{SESSION_UPLOADING}'")
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(upload_chunks)")}
+    if 'sha256' not in columns:
+        # 服务端写入时计算的分片摘要；verified 表示客户端提供的 X-Chunk-Sha256 与之一致
+        cursor.execute("ALTER TABLE upload_chunks ADD COLUMN sha256 TEXT")
+        cursor.execute("ALTER TABLE upload_chunks ADD COLUMN verified INTEGER NOT NULL DEFAULT 0")
+
+
+def _part_path(final_filename: str) -> Path:
+    return VIDEO_DIR / f"{final_filename}.part"
+
+
+def _total_chunks(size: int, chunk_size: int) -> int:
+    return max(1, (size + chunk_size - 1) // chunk_size)
+
+
+def _get_session(conn, upload_id: str, status: int = 404) -> sqlite3.Row:
+    row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    if row is None:
+        raise UploadError("upload session not found", status)
+    return row
+
+
+def _check_uploading(session) -> None:
+    if session['state'] != SESSION_UPLOADING:
+        raise UploadError("upload session is being finalized", 409)
+
+
+def _received(conn, upload_id: str) -> list[int]:
+    return [r[0] for r in conn.execute(
+        "SELECT chunk_index FROM upload_chunks WHERE upload_id = ? ORDER BY chunk_index", (upload_id,))]
+
+
+def _status(conn, session) -> dict:
+    received = _received(conn, session['id'])
+    total = _total_chunks(session['size'], session['chunk_size'])
+    return {
+        "uploadId": session['id'],
+        "filename": session['filename'],
+        "size": session['size'],
+        "chunkSize": session['chunk_size'],
+        "totalChunks": total,
+        "state": session['state'],
+        "received": received,
+        "missing": sorted(set(range(total)) - set(received)),
+    }
+
+
+def init_session(filename: str, size: int, sha256: str, chunk_size: int | None = None) -> dict:
+    if not filename or '/' in filename or '\\' in filename or '..' in filename:
+        raise UploadError("invalid filename")
+    # JSON 的 true / false 在 Python 中是 int 的子类，需单独排除
+    if isinstance(size, bool) or not isinstance(size, int) or size <= 0 or size > UPLOAD_MAX_FILE_SIZE:
+        raise UploadError("invalid size")
+    sha256 = (sha256 or '').lower()
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        raise UploadError("invalid sha256")
+    if chunk_size is None:
+        chunk_size = UPLOAD_CHUNK_SIZE
+    if isinstance(chunk_size, bool) or not isinstance(chunk_size, int):
+        raise UploadError("invalid chunkSize")
+    if chunk_size < 64 * 1024:
+        raise UploadError("chunkSize too small")
+
+    cleanup_stale_sessions()
+    upload_id = uuid.uuid4().hex
+    final_filename = f"{uuid.uuid1()}_{filename}"
+    VIDEO_DIR.mkdir(parents=True, exist_ok=True)
+    # 预分配文件，后续分片按偏移写入
+    with open(_part_path(final_filename), 'wb') as f:
+        f.truncate(size)
+    now = time.time()
+    with db.connection() as conn:
+        conn.execute('''
+            INSERT INTO upload_sessions (id, filename, final_filename, size, sha256, chunk_size, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (upload_id, filename, final_filename, size, sha256, chunk_size, now, now))
+        return _status(conn, _get_session(conn, upload_id))
+
+
+def _active_writers(conn, upload_id: str) -> int:
+    deadline = time.time() - UPLOAD_CHUNK_WRITE_TIMEOUT - WRITER_GRACE_SECONDS
+    return conn.execute("SELECT COUNT(*) FROM upload_writers WHERE upload_id = ? AND started_at > ?",
+                        (upload_id, deadline)).fetchone()[0]
+
+
+def write_chunk(upload_id: str, index: int, stream, content_length: int | None, chunk_sha256: str | None = None) -> dict:
+    """把请求体流式写入分片对应的偏移位置；可选 X-Chunk-Sha256 校验分片内容。"""
+    with db.connection() as conn:
+        session = _get_session(conn, upload_id)
+    _check_uploading(session)
+    size, chunk_size = session['size'], session['chunk_size']
+    total = _total_chunks(size, chunk_size)
+    if index < 0 or index >= total:
+        raise UploadError("chunk index out of range")
+    offset = index * chunk_size
+    expected = min(chunk_size, size - offset)
+    if content_length is not None and content_length != expected:
+        raise UploadError(f"chunk {index} must be {expected} bytes")
+
+    # 先登记再写盘：登记与 finalize 的认领在同一把写锁下互斥
+    writer = uuid.uuid4().hex
+    started = time.time()
+    with db.transaction() as conn:
+        _check_uploading(_get_session(conn, upload_id, 410))
+        conn.execute("INSERT INTO upload_writers (id, upload_id, started_at) VALUES (?, ?, ?)",
+                     (writer, upload_id, started))
+    registered = True
+    try:
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            f = open(_part_path(session['final_filename']), 'r+b')
+        except FileNotFoundError:
+            # 会话已被取消或过期清理
+            raise UploadError("upload session aborted or expired", 410) from None
+        with f:
+            f.seek(offset)
+            while written < expected:
+                block = stream.read(min(IO_BLOCK_SIZE, expected - written))
+                if not block:
+                    break
+                if time.time() - started > UPLOAD_CHUNK_WRITE_TIMEOUT:
+                    # 登记即将失效，不能再写入（finalize 可能随后开始校验文件）
+                    raise UploadError(f"chunk {index} upload timed out", 408)
+                f.write(block)
+                digest.update(block)
+                written += len(block)
+        if written != expected:
+            # 连接中断：分片未记为已收到，客户端重传即可覆盖
+            raise UploadError(f"chunk {index} incomplete: {written}/{expected} bytes")
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+            raise UploadError(f"chunk {index} sha256 mismatch")
+
+        with db.transaction() as conn:
+            # 写盘期间会话可能已被取消或清理
+            session = _get_session(conn, upload_id, 410)
+            _check_uploading(session)
+            conn.execute('''
+                INSERT OR REPLACE INTO upload_chunks (upload_id, chunk_index, sha256, verified) VALUES (?, ?, ?, ?)
+            ''', (upload_id, index, digest.hexdigest(), 1 if chunk_sha256 else 0))
+            conn.execute("UPDATE upload_sessions SET updated_at = ? WHERE id = ?", (time.time(), upload_id))
+            conn.execute("DELETE FROM upload_writers WHERE id = ?", (writer,))
+            registered = False
+            return _status(conn, session)
+    finally:
+        if registered:
+            with db.connection() as conn:
+                conn.execute("DELETE FROM upload_writers WHERE id = ?", (writer,))
+
+
+def session_status(upload_id: str) -> dict:
+    with db.connection() as conn:
+        return _status(conn, _get_session(conn, upload_id))
+
+
+def _hash_chunks(path: Path, chunk_size: int) -> tuple[str, list[str]]:
+    """一次读完文件，同时得到整体 sha256 和每个分片的 sha256。"""
+    digest = hashlib.sha256()
+    chunks = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = hashlib.sha256()
+            remaining = chunk_size
+            while remaining:
+                block = f.read(min(IO_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                chunk.update(block)
+                remaining -= len(block)
+            if remaining == chunk_size:
+                break
+            chunks.append(chunk.hexdigest())
+            if remaining:
+                break
+    return digest.hexdigest(), chunks
+
+
+def _set_state(upload_id: str, state: str) -> None:
+    with db.connection() as conn:
+        conn.execute("UPDATE upload_sessions SET state = ?, updated_at = ? WHERE id = ?", (state, time.time(), upload_id))
+
+
+def _reject_bad_chunks(session, chunk_digests: list[str]) -> list[int]:
+    """
+    sha256 不一致：磁盘内容与写入时摘要不同的分片（写入后被改动）为坏分片；
+    都一致时无法定位，未经客户端摘要校验（X-Chunk-Sha256）的分片都需要重传。
+    坏分片从已收到列表中移除，会话退回 uploading。
+    """
+    with db.transaction() as conn:
+        rows = conn.execute("SELECT chunk_index, sha256, verified FROM upload_chunks WHERE upload_id = ?",
+                            (session['id'],)).fetchall()
+        bad = [r['chunk_index'] for r in rows
+               if r['sha256'] is None or r['chunk_index'] >= len(chunk_digests)
+               or chunk_digests[r['chunk_index']] != r['sha256']]
+        if not bad:
+            bad = [r['chunk_index'] for r in rows if not r['verified']]
+        conn.executemany("DELETE FROM upload_chunks WHERE upload_id = ? AND chunk_index = ?",
+                         [(session['id'], index) for index in bad])
+        conn.execute("UPDATE upload_sessions SET state = ?, updated_at = ? WHERE id = ?",
+                     (SESSION_UPLOADING, time.time(), session['id']))
+    return sorted(bad)
+
+
+def finalize_session(upload_id: str, custom_filename: str | None = None) -> dict:
+    """所有分片到齐且 sha256 一致时登记为素材（按内容去重），返回与 /uploadSave 相同的数据。"""
+    with db.transaction() as conn:
+        session = _get_session(conn, upload_id)
+        _check_uploading(session)
+        status = _status(conn, session)
+        if status['missing']:
+            raise UploadError(f"{len(status['missing'])} chunk(s) missing", 409)
+        writing = _active_writers(conn, upload_id)
+        if writing:
+            # 重传的分片仍在写入已收到的位置，等它结束再校验
+            raise UploadError(f"{writing} chunk upload(s) in progress", 409)
+        conn.execute("DELETE FROM upload_writers WHERE upload_id = ?", (upload_id,))
+        # 认领会话：之后的 finalize 和分片请求都会被拒绝
+        conn.execute("UPDATE upload_sessions SET state = ?, updated_at = ? WHERE id = ?",
+                     (SESSION_FINALIZING, time.time(), upload_id))
+
+    part = _part_path(session['final_filename'])
+    try:
+        actual, chunk_digests = _hash_chunks(part, session['chunk_size'])
+    except BaseException:
+        _set_state(upload_id, SESSION_UPLOADING)
+        raise
+    if actual != session['sha256']:
+        bad = _reject_bad_chunks(session, chunk_digests)
+        message = f"sha256 mismatch, {len(bad)} chunk(s) need re-upload" if bad else "sha256 mismatch"
+        raise UploadError(message, 422, {"badChunks": bad})
+
+    filename = session['filename']
+    if custom_filename:
+        filename = custom_filename + "." + filename.split('.')[-1]
+
+    def still_claimed(conn) -> None:
+        # 与分片登记共用同一把写锁：确认校验过的文件此刻没有写入者，再改名为 blob 并增加引用
+        current = _get_session(conn, upload_id, 410)
+        if current['state'] != SESSION_FINALIZING or _active_writers(conn, upload_id):
+            raise UploadError("upload session changed during finalize", 409)
+
+    try:
+        result = add_file(part, filename, actual, session['size'], guard=still_claimed)
+    except BaseException:
+        _set_state(upload_id, SESSION_UPLOADING)
+        raise
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    print(f"✅ 分片上传完成: {result['filepath']}")
+    return result
+
+
+def abort_session(upload_id: str) -> None:
+    with db.transaction() as conn:
+        session = _get_session(conn, upload_id)
+        _check_uploading(session)
+        conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        conn.execute("DELETE FROM upload_writers WHERE upload_id = ?", (upload_id,))
+        conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    _part_path(session['final_filename']).unlink(missing_ok=True)
+
+
+def cleanup_stale_sessions() -> int:
+    deadline = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    with db.transaction() as conn:
+        rows = conn.execute("SELECT id, final_filename FROM upload_sessions WHERE updated_at < ?", (deadline,)).fetchall()
+        for row in rows:
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (row['id'],))
+            conn.execute("DELETE FROM upload_writers WHERE upload_id = ?", (row['id'],))
+            conn.execute("DELETE FROM upload_sessions WHERE id = ?", (row['id'],))
+    for row in rows:
+        _part_path(row['final_filename']).unlink(missing_ok=True)
+    return len(rows)
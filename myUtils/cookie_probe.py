@@ -0,0 +1,216 @@
+"""
+Cookie 有效性的 HTTP 快速校验。
+
+直接读取 storage_state（Playwright 导出的 cookie JSON），带上对应域名的 cookie 请求各平台
+"当前登录用户信息" 接口，根据响应判断登录态，无需渲染创作者中心页面。
+返回 True / False 表示结论明确；返回 None 表示无法判断（网络错误、接口变化、风控等），
+调用方应回退到 Playwright 页面校验。
+
+本地联调：设置 COOKIE_PROBE_BASE_URL=http://127.0.0.1:8000 后，所有探测请求会发往该地址
+（保留原接口路径），可用桩服务模拟各平台接口。
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 是否启用 HTTP 快速校验，设为 0 时总是使用 Playwright 页面校验
+COOKIE_PROBE_ENABLED = os.getenv('COOKIE_PROBE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# 单次探测请求超时（秒）
+COOKIE_PROBE_TIMEOUT = float(os.getenv('COOKIE_PROBE_TIMEOUT', '5'))
+# 连接池大小（每个域名），应不小于账号校验并发数
+COOKIE_PROBE_POOL_SIZE = int(os.getenv('COOKIE_PROBE_POOL_SIZE', '10'))
+# 覆盖探测地址的 scheme://host[:port]，用于本地桩服务
+COOKIE_PROBE_BASE_URL = os.getenv('COOKIE_PROBE_BASE_URL', '').rstrip('/')
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+
+@dataclass(frozen=True)
+class ProbeSpec:
+    url: str
+    referer: str
+    # 根据 (HTTP 状态码, JSON 响应) 给出 True / False / None
+    judge: Callable[[int, Optional[dict]], Optional[bool]]
+    method: str = 'GET'
+    body: Optional[dict] = None
+
+
+def _judge_douyin(status: int, data: Optional[dict]) -> Optional[bool]:
+    if data is None:
+        return None
+    if data.get('status_code') == 0 and data.get('user'):
+        return True
+    # 8: 用户未登录
+    if data.get('status_code') == 8:
+        return False
+    return None
+
+
+def _judge_tencent(status: int, data: Optional[dict]) -> Optional[bool]:
+    if data is None:
+        return None
+    if data.get('errCode') == 0 and (data.get('data') or {}).get('finderUser'):
+        return True
+    # 300333 / 300334: 登录态失效
+    if data.get('errCode') in (300333, 300334):
+        return False
+    return None
+
+
+def _judge_kuaishou(status: int, data: Optional[dict]) -> Optional[bool]:
+    if data is None:
+        return None
+    if data.get('result') == 1 and data.get('data'):
+        return True
+    # 109: 未登录
+    if data.get('result') == 109:
+        return False
+    return None
+
+
+def _judge_xhs(status: int, data: Optional[dict]) -> Optional[bool]:
+    if data is None:
+        return None
+    if data.get('success') and data.get('data'):
+        return True
+    # -100: 登录已过期
+    if data.get('code') == -100:
+        return False
+    return None
+
+
+def _judge_bilibili(status: int, data: Optional[dict]) -> Optional[bool]:
+    if data is None:
+        return None
+    if data.get('code') == 0 and (data.get('data') or {}).get('isLogin'):
+        return True
+    # -101: 账号未登录
+    if data.get('code') == -101:
+        return False
+    return None
+
+
+PROBES = {
+    'douyin': ProbeSpec(
+        url="https://creator.douyin.com/web/api/media/user/info/",
+        referer="https://creator.douyin.com/",
+        judge=_judge_douyin,
+    ),
+    'tencent': ProbeSpec(
+        url="https://channels.weixin.qq.com/cgi-bin/mmfinderassistant-bin/auth/auth_data",
+        referer="https://channels.weixin.qq.com/platform",
+        judge=_judge_tencent,
+        method='POST',
+        body={},
+    ),
+    'kuaishou': ProbeSpec(
+        url="https://cp.kuaishou.com/rest/cp/creator/pc/home/infoV2",
+        referer="https://cp.kuaishou.com/",
+        judge=_judge_kuaishou,
+        method='POST',
+        body={},
+    ),
+    'xhs': ProbeSpec(
+        url="https://creator.xiaohongshu.com/api/galaxy/user/info",
+        referer="https://creator.xiaohongshu.com/",
+        judge=_judge_xhs,
+    ),
+    'bilibili': ProbeSpec(
+        url="https://api.bilibili.com/x/web-interface/nav",
+        referer="https://member.bilibili.com/",
+        judge=_judge_bilibili,
+    ),
+}
+
+_session: Optional[requests.Session] = None
+
+
+def _get_session() -> requests.Session:
+    """共享一个带连接池的 Session；cookie 按请求显式传入，不让响应的 Set-Cookie 在账号之间串用。"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=len(PROBES), pool_maxsize=COOKIE_PROBE_POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['User-Agent'] = USER_AGENT
+        _session = session
+    return _session
+
+
+def cookie_header(storage_state: dict, url: str) -> str:
+    """按域名、路径和过期时间挑选 storage_state 中适用于 url 的 cookie，拼成 Cookie 请求头。"""
+    parts = urlsplit(url)
+    host = parts.hostname or ''
+    path = parts.path or '/'
+    now = time.time()
+    pairs = []
+    for cookie in storage_state.get('cookies', []):
+        domain = (cookie.get('domain') or '').lstrip('.')
+        if not domain or not (host == domain or host.endswith('.' + domain)):
+            continue
+        if not path.startswith(cookie.get('path') or '/'):
+            continue
+        expires = cookie.get('expires', -1)
+        if expires not in (None, -1) and 0 < expires < now:
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return '; '.join(pairs)
+
+
+def _target_url(url: str) -> str:
+    if not COOKIE_PROBE_BASE_URL:
+        return url
+    base = urlsplit(COOKIE_PROBE_BASE_URL)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ''))
+
+
+def probe_cookie_sync(platform: str, account_file) -> Optional[bool]:
+    spec = PROBES.get(platform)
+    if spec is None:
+        return None
+    try:
+        with open(account_file, 'r', encoding='utf-8') as f:
+            storage_state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[cookie_probe] 读取 {account_file} 失败: {e}")
+        return None
+
+    cookies = cookie_header(storage_state, spec.url)
+    if not cookies:
+        # 文件中没有该平台域名的 cookie（可能是其他格式的 cookie 文件），交给页面校验
+        return None
+    headers = {'Cookie': cookies, 'Referer': spec.referer, 'Accept': 'application/json, text/plain, */*'}
+    try:
+        response = _get_session().request(spec.method, _target_url(spec.url), headers=headers,
+                                          json=spec.body, timeout=COOKIE_PROBE_TIMEOUT, allow_redirects=False)
+    except requests.RequestException as e:
+        print(f"[cookie_probe] [{platform}] 请求失败: {e}")
+        return None
+    if response.status_code == 401:
+        return False
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        data = None
+    return spec.judge(response.status_code, data)
+
+
+async def probe_cookie(platform: str, account_file) -> Optional[bool]:
+    """在线程池中执行 HTTP 探测，不阻塞事件循环。"""
+    if not COOKIE_PROBE_ENABLED:
+        return None
+    return await asyncio.to_thread(probe_cookie_sync, platform, account_file)
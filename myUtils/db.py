@@ -0,0 +1,346 @@
+"""
+SQLite 访问层。
+
+所有模块通过这里取得数据库连接，不再各自 sqlite3.connect()：
+  - 线程安全的连接池（SQLITE_POOL_SIZE），连接复用，每个连接同一时刻只被一个线程借用
+  - WAL 日志模式：读不阻塞写、写不阻塞读；busy_timeout 让并发写入排队等待而不是立即报 database is locked
+  - isolation_level=None，需要原子性的地方用 transaction()（BEGIN IMMEDIATE）显式开启事务
+  - SQL 使用固定文本 + 参数绑定，命中每个连接的预编译语句缓存（SQLITE_STATEMENT_CACHE）
+
+user_info / file_records 的常用读写也集中在本模块（仓储函数），路由和登录流程直接调用；
+列表接口使用 keyset 分页（keyset_page），table_versions 记录各表的数据版本用于 ETag。
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from conf import BASE_DIR
+from utils import metrics
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+
+# 连接池大小（最多同时借出的连接数）
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+# 等待数据库写锁的时长（毫秒）
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+# 每个连接缓存的预编译语句数量
+SQLITE_STATEMENT_CACHE = int(os.getenv('SQLITE_STATEMENT_CACHE', '128'))
+
+
+class ConnectionPool:
+    """按先来先得的顺序借出连接，避免高频读请求反复抢占连接导致写请求饿死。"""
+
+    def __init__(self, path: Path, size: int = SQLITE_POOL_SIZE):
+        self.path = Path(path)
+        self.size = max(1, size)
+        self._idle: list[sqlite3.Connection] = []
+        self._waiters: deque = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def _open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self, timeout: float | None = None) -> sqlite3.Connection:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._idle and not self._waiters:
+                return self._idle.pop()
+            if not self._idle and self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+                ticket = object()
+                self._waiters.append(ticket)
+                try:
+                    while not (self._idle and self._waiters[0] is ticket):
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError(f"no sqlite connection available within {timeout}s")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiters.remove(ticket)
+                    # 队首变化后唤醒下一个等待者
+                    self._cond.notify_all()
+                return self._idle.pop()
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify_all()
+                raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            # 借用方异常退出时未结束的事务，归还前回滚
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+
+_pools: dict[tuple[int, str], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    # 按进程和路径区分，子进程不复用父进程的连接
+    key = (os.getpid(), str(DB_PATH))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(DB_PATH))
+    return pool
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """借用一个连接（自动提交模式），用完归还连接池；等待和占用连接的时长计入 /metrics。"""
+    pool = get_pool()
+    started = time.perf_counter()
+    conn = pool.acquire(timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    acquired = time.perf_counter()
+    metrics.DB_POOL_WAIT.observe(acquired - started)
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+        metrics.DB_QUERY.observe(time.perf_counter() - acquired)
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """BEGIN IMMEDIATE 事务：立即取得写锁，正常退出时提交，异常时回滚。"""
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+# ---------------------------------------------------------------- user_info
+
+def get_account(account_id: int) -> dict | None:
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM user_info WHERE id = ?", (account_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_account_rows(columns: str, ids=None) -> list[sqlite3.Row]:
+    with connection() as conn:
+        if ids:
+            placeholders = ','.join('?' * len(ids))
+            return conn.execute(f"SELECT {columns} FROM user_info WHERE id IN ({placeholders})",
+                                tuple(ids)).fetchall()
+        return conn.execute(f"SELECT {columns} FROM user_info").fetchall()
+
+
+def save_account(type: int, file_path: str, user_name: str, record_id=None) -> int:
+    """登录成功后保存账号：record_id 不为空时更新已有记录，否则新增；返回记录 id。"""
+    with connection() as conn:
+        if record_id:
+            conn.execute('''
+                UPDATE user_info SET type = ?, filePath = ?, userName = ?, status = ? WHERE id = ?
+            ''', (type, file_path, user_name, 1, int(record_id)))
+            return int(record_id)
+        cursor = conn.execute('''
+            INSERT INTO user_info (type, filePath, userName, status) VALUES (?, ?, ?, ?)
+        ''', (type, file_path, user_name, 1))
+        return cursor.lastrowid
+
+
+def update_account(account_id: int, type: int, user_name: str) -> None:
+    with connection() as conn:
+        conn.execute("UPDATE user_info SET type = ?, userName = ? WHERE id = ?", (type, user_name, account_id))
+
+
+def update_account_status(account_id: int, status: int, checked_at: float | None = None) -> float:
+    checked_at = checked_at or time.time()
+    with connection() as conn:
+        conn.execute('''
+            UPDATE user_info SET status = ?, last_result = ?, last_checked_at = ? WHERE id = ?
+        ''', (status, status, checked_at, account_id))
+    return checked_at
+
+
+def delete_account(account_id: int) -> dict | None:
+    with transaction() as conn:
+        row = conn.execute("SELECT * FROM user_info WHERE id = ?", (account_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM user_info WHERE id = ?", (account_id,))
+    return dict(row)
+
+
+# ------------------------------------------------------------- file_records
+
+def list_file_records() -> list[dict]:
+    with connection() as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM file_records")]
+
+
+def insert_file_record(conn: sqlite3.Connection, filename: str, size: int, path: str, digest: str | None) -> int:
+    """在调用方的事务内新增素材记录，filesize 以 MB 保存。"""
+    cursor = conn.execute('''
+        INSERT INTO file_records (filename, filesize, file_path, blob_digest) VALUES (?, ?, ?, ?)
+    ''', (filename, round(float(size) / (1024 * 1024), 2), path, digest))
+    return cursor.lastrowid
+
+
+# ------------------------------------------------------------ 分页 / 版本号
+
+class QueryError(ValueError):
+    """分页、筛选参数不合法。"""
+
+
+# 可排序字段 -> (SQL 表达式, 空值替代)；排序表达式与 id 组成游标，保证翻页稳定。
+# 表达式要与 initialize_database 中 (表达式, id) 索引的写法完全一致，否则排序和翻页用不上索引
+FILE_SORTS = {
+    'id': ('id', None),
+    'upload_time': ('upload_time', None),
+    'filename': ('filename', None),
+    'filesize': ('COALESCE(filesize, 0)', 0),
+}
+ACCOUNT_SORTS = {
+    'id': ('id', None),
+    'userName': ('userName', None),
+    'type': ('type', None),
+    'status': ('COALESCE(status, 0)', 0),
+    'last_checked_at': ('COALESCE(last_checked_at, 0)', 0),
+}
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise QueryError("invalid cursor") from None
+    if not isinstance(values, list) or len(values) != 2:
+        raise QueryError("invalid cursor")
+    return values
+
+
+def like_pattern(text: str) -> str:
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def keyset_page(table: str, columns: str, sorts: dict, where: list[str], params: list, sort: str = 'id',
+                order: str = 'asc', limit: int | None = None, cursor: str | None = None) -> tuple[list, str | None]:
+    """
+    按 (排序字段, id) 做 keyset 分页，返回 (rows, next_cursor)；limit 为空时返回全部。
+    columns 必须包含 id 和排序字段本身。
+    """
+    if sort not in sorts:
+        raise QueryError(f"unsupported sort: {sort}")
+    if order not in ('asc', 'desc'):
+        raise QueryError(f"unsupported order: {order}")
+    expr, null_value = sorts[sort]
+    op, direction = ('<', 'DESC') if order == 'desc' else ('>', 'ASC')
+    where, params = list(where), list(params)
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        # 行值比较用不上表达式索引定位，先加一个单字段的范围条件让 SQLite 从游标处开始扫描
+        where.append(f"{expr} {op}= ? AND ({expr}, id) {op} (?, ?)")
+        params += [value, value, last_id]
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {expr} {direction}, id {direction}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = last[sort] if last[sort] is not None else null_value
+        next_cursor = encode_cursor([value, last['id']])
+    return rows, next_cursor
+
+
+def table_version(name: str) -> int:
+    """表的数据版本号，由 initialize_database 中的触发器在每次增删改时递增，用于生成 ETag。"""
+    with connection() as conn:
+        row = conn.execute("SELECT version FROM table_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def file_record_page(name: str | None = None, date_from: str | None = None, date_to: str | None = None,
+                     sort: str = 'id', order: str = 'asc', limit: int | None = None,
+                     cursor: str | None = None) -> tuple[list[dict], str | None]:
+    where, params = [], []
+    if name:
+        where.append("filename LIKE ? ESCAPE '\\'")
+        params.append(like_pattern(name))
+    if date_from:
+        where.append("upload_time >= ?")
+        params.append(date_from)
+    if date_to:
+        # 只给日期时包含当天
+        where.append("upload_time < date(?, '+1 day')" if len(date_to) == 10 else "upload_time <= ?")
+        params.append(date_to)
+    rows, next_cursor = keyset_page("file_records", "*", FILE_SORTS, where, params, sort, order, limit, cursor)
+    return [dict(row) for row in rows], next_cursor
+
+
+def account_page(columns: str, types=None, status: int | None = None, name: str | None = None,
+                 checked_from: float | None = None, checked_to: float | None = None, sort: str = 'id',
+                 order: str = 'asc', limit: int | None = None, cursor: str | None = None) -> tuple[list, str | None]:
+    where, params = [], []
+    if types:
+        where.append(f"type IN ({','.join('?' * len(types))})")
+        params += list(types)
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    if name:
+        where.append("userName LIKE ? ESCAPE '\\'")
+        params.append(like_pattern(name))
+    if checked_from is not None:
+        where.append("last_checked_at >= ?")
+        params.append(checked_from)
+    if checked_to is not None:
+        where.append("last_checked_at < ?")
+        params.append(checked_to)
+    return keyset_page("user_info", columns, ACCOUNT_SORTS, where, params, sort, order, limit, cursor)
+
+
+def count_checked_before(deadline: float) -> int:
+    """从未校验或上次校验时间不晚于 deadline 的账号数。"""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT COUNT(*) FROM user_info WHERE last_checked_at IS NULL OR last_checked_at <= ?
+        ''', (deadline,)).fetchone()[0]
@@ -0,0 +1,318 @@
+"""
+发布任务队列（SQLite 持久化）。
+
+/postVideo、/postVideoBatch 只负责写入 publish_jobs 并返回任务 id，由 worker 领取执行：
+  queued -> running -> succeeded / partial / failed
+running 状态带租约（lease_owner / lease_expires_at），worker 执行期间定期续约；
+进程退出或崩溃后租约过期，任务会被任意 worker 重新领取，并跳过已完成的 文件×账号 组合。
+多个 worker 进程可共用同一个数据库：领取通过 BEGIN IMMEDIATE 事务（myUtils/db.transaction）串行化。
+worker 失去租约（已被其他 worker 重新领取）后停止写入进度，批次中尚未开始的发布项不再执行。
+不同任务中的同一账号通过 account_leases 表互斥（postVideo.account_lease），跨进程也不会同时上传。
+
+独立运行 worker：python -m myUtils.jobs --workers 2
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from myUtils import db
+from utils import log, timing
+
+# 租约时长（秒），worker 每 1/3 租约续约一次
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '120'))
+# 同一任务最多被领取的次数（含崩溃后重新领取）
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# 队列为空时的轮询间隔（秒）
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '2'))
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_PARTIAL = 'partial'
+JOB_FAILED = 'failed'
+
+
+def _job_to_dict(row) -> dict:
+    job = dict(row)
+    for key in ('payload', 'result'):
+        if job.get(key):
+            job[key] = json.loads(job[key])
+    return job
+
+
+def _log_event(cursor, job_id: int, status: str, message: str | None = None) -> None:
+    cursor.execute('''
+        INSERT INTO publish_job_events (job_id, status, message) VALUES (?, ?, ?)
+    ''', (job_id, status, message))
+
+
+def enqueue_job(type: int, payload: dict) -> int:
+    with db.transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO publish_jobs (type, payload, status) VALUES (?, ?, ?)
+        ''', (type, json.dumps(payload, ensure_ascii=False), JOB_QUEUED))
+        job_id = cursor.lastrowid
+        _log_event(conn, job_id, JOB_QUEUED)
+    return job_id
+
+
+def claim_job(owner: str, lease_seconds: int = JOB_LEASE_SECONDS) -> dict | None:
+    """原子地领取一个排队中或租约已过期的任务；没有可领取的任务时返回 None。"""
+    now = time.time()
+    with db.transaction() as conn:
+        # 租约过期且重试次数用尽的任务直接判定失败，避免反复崩溃的任务占住队列
+        expired = conn.execute('''
+            SELECT id FROM publish_jobs
+            WHERE status = ? AND lease_expires_at < ? AND attempts >= ?
+        ''', (JOB_RUNNING, now, JOB_MAX_ATTEMPTS)).fetchall()
+        for (job_id,) in expired:
+            conn.execute('''
+                UPDATE publish_jobs
+                SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (JOB_FAILED, 'lease expired too many times', job_id))
+            _log_event(conn, job_id, JOB_FAILED, 'lease expired too many times')
+
+        row = conn.execute('''
+            SELECT * FROM publish_jobs
+            WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+            ORDER BY id
+            LIMIT 1
+        ''', (JOB_QUEUED, JOB_RUNNING, now)).fetchone()
+        if row is None:
+            return None
+        resumed = row['status'] == JOB_RUNNING
+        conn.execute('''
+            UPDATE publish_jobs
+            SET status = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1,
+                started_at = COALESCE(started_at, CURRENT_TIMESTAMP), updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (JOB_RUNNING, owner, now + lease_seconds, row['id']))
+        _log_event(conn, row['id'], JOB_RUNNING, f"{'resumed' if resumed else 'claimed'} by {owner}")
+        return _job_to_dict(conn.execute('SELECT * FROM publish_jobs WHERE id = ?', (row['id'],)).fetchone())
+
+
+def renew_lease(job_id: int, owner: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    with db.connection() as conn:
+        cursor = conn.execute('''
+            UPDATE publish_jobs SET lease_expires_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_owner = ? AND status = ?
+        ''', (time.time() + lease_seconds, job_id, owner, JOB_RUNNING))
+        return cursor.rowcount == 1
+
+
+def record_progress(job_id: int, owner: str, results: list[dict]) -> bool:
+    """保存已完成的逐项结果，任务恢复时据此跳过已发布的 文件×账号 组合；租约已不属于 owner 时不写入并返回 False。"""
+    with db.connection() as conn:
+        cursor = conn.execute('''
+            UPDATE publish_jobs SET result = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_owner = ? AND status = ?
+        ''', (json.dumps(results, ensure_ascii=False), job_id, owner, JOB_RUNNING))
+        return cursor.rowcount == 1
+
+
+def finish_job(job_id: int, owner: str, status: str, results: list[dict] | None = None, error: str | None = None) -> None:
+    with db.transaction() as conn:
+        cursor = conn.execute('''
+            UPDATE publish_jobs
+            SET status = ?, result = COALESCE(?, result), error = ?, lease_owner = NULL, lease_expires_at = NULL,
+                finished_at = CASE WHEN ? = ? THEN NULL ELSE CURRENT_TIMESTAMP END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_owner = ?
+        ''', (status, json.dumps(results, ensure_ascii=False) if results is not None else None, error,
+              status, JOB_QUEUED, job_id, owner))
+        if cursor.rowcount:
+            _log_event(conn, job_id, status, error)
+
+
+def acquire_account_lease(account: str, owner: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """获取或续约账号租约：账号空闲、租约已过期或本来就属于 owner 时成功。"""
+    now = time.time()
+    with db.transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO account_leases (account, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (account) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE account_leases.owner = excluded.owner OR account_leases.expires_at < ?
+        ''', (account, owner, now + lease_seconds, now))
+        return cursor.rowcount == 1
+
+
+def release_account_lease(account: str, owner: str) -> None:
+    with db.connection() as conn:
+        conn.execute('DELETE FROM account_leases WHERE account = ? AND owner = ?', (account, owner))
+
+
+def get_job(job_id: int) -> dict | None:
+    with db.connection() as conn:
+        row = conn.execute('SELECT * FROM publish_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = _job_to_dict(row)
+        job['events'] = [dict(r) for r in conn.execute('''
+            SELECT status, message, created_at FROM publish_job_events WHERE job_id = ? ORDER BY id
+        ''', (job_id,))]
+        return job
+
+
+def list_jobs(status: str | None = None, limit: int = 50) -> list[dict]:
+    with db.connection() as conn:
+        if status:
+            rows = conn.execute('SELECT * FROM publish_jobs WHERE status = ? ORDER BY id DESC LIMIT ?', (status, limit))
+        else:
+            rows = conn.execute('SELECT * FROM publish_jobs ORDER BY id DESC LIMIT ?', (limit,))
+        return [_job_to_dict(row) for row in rows]
+
+
+def count_active_jobs() -> dict[str, int]:
+    """排队中和执行中的任务数（队列深度），走 idx_publish_jobs_status 索引。"""
+    counts = {JOB_QUEUED: 0, JOB_RUNNING: 0}
+    with db.connection() as conn:
+        for status, count in conn.execute(
+                'SELECT status, COUNT(*) FROM publish_jobs WHERE status IN (?, ?) GROUP BY status',
+                (JOB_QUEUED, JOB_RUNNING)):
+            counts[status] = count
+    return counts
+
+
+def run_job(job: dict, owner: str) -> None:
+    """执行一个已领取的任务：续约、调用平台上传器、记录逐项进度和最终状态。"""
+    from myUtils.postVideo import (bind_cancel_event, bind_in_flight, dispatch_publish, item_overdue,
+                                   publish_item_key, unbind_cancel_event, unbind_in_flight)
+
+    job_id = job['id']
+    results = [r for r in (job.get('result') or []) if r.get('status') == 'success']
+    done = {publish_item_key(r['file'], r['account']) for r in results}
+    progress_lock = threading.Lock()
+    stop = threading.Event()
+    # 租约丢失：其他 worker 可能已重新领取，本 worker 不再开始新的发布项、不再写入任务
+    lease_lost = threading.Event()
+    # 进行中的发布项 -> 开始时间，由 run_publish_batch 维护
+    in_flight = {}
+
+    def heartbeat():
+        deadline = time.time() + JOB_LEASE_SECONDS
+        while not stop.wait(max(1, JOB_LEASE_SECONDS // 3)):
+            stuck = [key for key, started in list(in_flight.items()) if item_overdue(started)]
+            if stuck:
+                # 发布项超时后仍未结束（卡死）：不再续约，租约过期后任务由其他 worker 重新领取
+                log.publish_logger.error(f"[jobs] job {job_id} stuck on {', '.join(stuck)}, releasing its lease")
+                lease_lost.set()
+                return
+            try:
+                renewed = renew_lease(job_id, owner)
+            except sqlite3.Error as e:
+                # 数据库暂时不可用：租约到期前继续重试
+                log.publish_logger.warning(f"[jobs] job {job_id} renew failed: {e}")
+                renewed = None
+                if time.time() < deadline:
+                    continue
+            if renewed:
+                deadline = time.time() + JOB_LEASE_SECONDS
+                continue
+            log.publish_logger.warning(f"[jobs] job {job_id} lease lost, cancelling remaining items")
+            lease_lost.set()
+            return
+
+    def on_result(result: dict):
+        with progress_lock:
+            results.append(result)
+            if lease_lost.is_set():
+                return
+            if not record_progress(job_id, owner, results):
+                log.publish_logger.warning(f"[jobs] job {job_id} no longer owned by {owner}, cancelling remaining items")
+                lease_lost.set()
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    try:
+        if done:
+            log.publish_logger.info(f"[jobs] job {job_id} resumed, skipping {len(done)} finished item(s)")
+        # run_sync 会把当前上下文复制到异步运行时，任务内所有上传的步骤耗时记录都带上 job id
+        token = timing.bind(job=job_id)
+        cancel_token = bind_cancel_event(lease_lost)
+        in_flight_token = bind_in_flight(in_flight)
+        try:
+            dispatch_publish(job['payload'], skip=done, on_result=on_result)
+        finally:
+            unbind_in_flight(in_flight_token)
+            unbind_cancel_event(cancel_token)
+            timing.unbind(token)
+        if lease_lost.is_set():
+            log.publish_logger.warning(f"[jobs] job {job_id} abandoned after losing its lease")
+            return
+        failed = [r for r in results if r['status'] != 'success']
+        if not failed:
+            status = JOB_SUCCEEDED
+        elif len(failed) == len(results):
+            status = JOB_FAILED
+        else:
+            status = JOB_PARTIAL
+        finish_job(job_id, owner, status, results, f"{len(failed)}/{len(results)} item(s) failed" if failed else None)
+        log.publish_logger.info(f"[jobs] job {job_id} {status}")
+    except Exception as e:
+        if lease_lost.is_set():
+            log.publish_logger.warning(f"[jobs] job {job_id} error after losing its lease: {e}")
+            return
+        # 整体异常：未用尽重试次数则放回队列，否则判定失败
+        status = JOB_QUEUED if job['attempts'] < JOB_MAX_ATTEMPTS else JOB_FAILED
+        finish_job(job_id, owner, status, results, str(e) or e.__class__.__name__)
+        log.publish_logger.error(f"[jobs] job {job_id} error: {e} -> {status}")
+    finally:
+        stop.set()
+
+
+class PublishWorker(threading.Thread):
+    def __init__(self, name: str | None = None):
+        super().__init__(daemon=True)
+        self.owner = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        log.publish_logger.info(f"[jobs] worker {self.owner} started")
+        while not self._stop_event.is_set():
+            try:
+                job = claim_job(self.owner)
+            except sqlite3.Error as e:
+                log.publish_logger.warning(f"[jobs] claim failed: {e}")
+                job = None
+            if job is None:
+                self._stop_event.wait(JOB_POLL_SECONDS)
+                continue
+            run_job(job, self.owner)
+
+
+def start_workers(count: int) -> list[PublishWorker]:
+    workers = [PublishWorker() for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="publish job worker")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--metrics-port', type=int, default=0, help="单独暴露 /metrics 的端口，0 为不暴露")
+    args = parser.parse_args()
+    # 与服务进程相同的建表和迁移，worker 可以先于服务启动
+    from myUtils.schema import initialize_database
+    initialize_database()
+    if args.metrics_port:
+        from utils import metrics
+        metrics.install_default_collectors()
+        metrics.serve(args.metrics_port)
+    running = start_workers(args.workers)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for w in running:
+            w.stop()
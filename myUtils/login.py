@@ -1,434 +1,179 @@
 import asyncio
-import sqlite3
-
-from playwright.async_api import async_playwright
-
-from myUtils.auth import check_cookie
-from utils.base_social_media import set_init_script
+import base64
+import os
 import uuid
 from pathlib import Path
-from conf import BASE_DIR
 
-# 抖音登录
-async def douyin_cookie_gen(id,status_queue, update_mode=False, record_id=None):
-    url_changed_event = asyncio.Event()
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
-    async with async_playwright() as playwright:
-        options = {
-            'headless': False
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(
-            **options,
-            executable_path=str(BASE_DIR / "third_party" / "playwright" / "ms-playwright" / "chromium-1169" / "chrome-win" / "chrome.exe")
-        )
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        context = await set_init_script(context)
-        # Pause the page, and start recording manually.
-        page = await context.new_page()
-        await page.goto("https://creator.douyin.com/")
-        original_url = page.url
-        img_locator = page.get_by_role("img", name="二维码")
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
+from conf import BASE_DIR
+from myUtils import db
+from myUtils.auth import check_cookie
+from myUtils.login_sessions import login_context
+
+# 二维码推送方式：src（img 的地址）、screenshot（元素截图，data URL）、auto（src 不可直接使用时截图）
+LOGIN_QR_MODE = os.getenv('LOGIN_QR_MODE', 'auto').lower()
+# 检查登录 cookie 的间隔（秒），以及 cookie 出现后等待页面跳转（写入 localStorage 等）的时长（秒）
+LOGIN_COOKIE_POLL_SECONDS = float(os.getenv('LOGIN_COOKIE_POLL_SECONDS', '1'))
+LOGIN_SETTLE_SECONDS = float(os.getenv('LOGIN_SETTLE_SECONDS', '5'))
+
+# 登录成功后出现的 cookie；为空的平台只按页面跳转判断
+LOGIN_COOKIES = {
+    1: ('galaxy_creator_session_id', 'access-token-creator.xiaohongshu.com'),
+    2: (),
+    3: ('sessionid', 'sessionid_ss'),
+    4: ('kuaishou.web.cp.api_ph', 'userId'),
+    5: ('SESSDATA',),
+}
+
+
+async def qr_image(locator) -> str | None:
+    """
+    二维码图片。img 的 src 可以直接在前端显示（data: / http(s)）时返回 src；
+    blob:、相对地址、canvas 等无法直接使用时对元素截图，返回 data:image/png;base64 地址。无界面浏览器同样适用。
+    """
+    if LOGIN_QR_MODE != 'screenshot':
+        src = await locator.get_attribute("src")
+        if src and src.startswith('//'):
+            src = 'https:' + src
+        if LOGIN_QR_MODE == 'src' or (src and src.startswith(('data:', 'http://', 'https://'))):
+            return src
+    await locator.scroll_into_view_if_needed()
+    png = await locator.screenshot(type='png')
+    return 'data:image/png;base64,' + base64.b64encode(png).decode()
+
+
+async def wait_for_login(context, url_changed_event: asyncio.Event, login_cookies=()) -> str:
+    """
+    等待扫码登录完成：页面跳转，或者登录 cookie 出现（与打开二维码时相比新出现或值发生变化），先到为准。
+    cookie 先出现时再等待页面跳转最多 LOGIN_SETTLE_SECONDS 秒，让页面写完登录状态。返回检测方式。
+    """
+    if not login_cookies:
+        await url_changed_event.wait()
+        return "navigation"
+    baseline = {(c['name'], c['value']) for c in await context.cookies() if c['name'] in login_cookies}
+    while not url_changed_event.is_set():
+        cookies = await context.cookies()
+        if any(c['name'] in login_cookies and c['value'] and (c['name'], c['value']) not in baseline for c in cookies):
+            try:
+                await asyncio.wait_for(url_changed_event.wait(), LOGIN_SETTLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            return "cookie"
         try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
+            await asyncio.wait_for(url_changed_event.wait(), LOGIN_COOKIE_POLL_SECONDS)
         except asyncio.TimeoutError:
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            status_queue.put("500")
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        await context.storage_state(path=Path(BASE_DIR / "cookiesFile" / f"{uuid_v1}.json"))
-        result = await check_cookie(3, f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            if update_mode and record_id:
-                cursor.execute('''
-                    UPDATE user_info SET type = ?, filePath = ?, userName = ?, status = ? WHERE id = ?
-                ''', (3, f"{uuid_v1}.json", id, 1, int(record_id)))
-            else:
-                cursor.execute('''
-                                    INSERT INTO user_info (type, filePath, userName, status)
-                                    VALUES (?, ?, ?, ?)
-                                    ''', (3, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
+            pass
+    return "navigation"
+
+
+# 扫码登录的公共流程：在登录会话的上下文中打开页面、推送二维码、等待登录完成后保存 cookie。
+# 超时和取消由 LoginSessionManager 控制（LOGIN_SESSION_TIMEOUT_SECONDS、/cancelLogin）。
+async def qr_login(type, id, status_queue, update_mode, record_id, open_qr, log=print):
+    """
+    open_qr(page) -> (original_url, qr)：打开登录页并定位二维码元素（找不到时为 None），
+    original_url 为等待扫码时的页面地址。
+    登录成功推送 "200" 并返回 True；cookie 校验失败推送 "500" 并返回 False。
+    """
+    async with login_context() as context:
+        page = await context.new_page()
+        original_url, qr = await open_qr(page)
+        src = await qr_image(qr) if qr is not None else None
+        if src:
+            log(f"✅ 图片地址: {src[:80]}")
+            status_queue.put(src)
+        url_changed_event = asyncio.Event()
+
+        def on_navigated(frame):
+            # 只关注主框架的变化
+            if frame == page.main_frame and page.url != original_url:
+                url_changed_event.set()
+
+        page.on('framenavigated', on_navigated)
+        detected = await wait_for_login(context, url_changed_event, LOGIN_COOKIES.get(type, ()))
+        log(f"检测到登录（{'页面跳转' if detected == 'navigation' else '登录 cookie'}）")
+        cookie_file = f"{uuid.uuid1()}.json"
+        await context.storage_state(path=Path(BASE_DIR / "cookiesFile" / cookie_file))
+        log(f"登录状态已保存到: {cookie_file}")
+    # 上下文已关闭，校验期间不再占用登录浏览器
+    if not await check_cookie(type, cookie_file):
+        log("cookie 校验失败，登录失败")
+        status_queue.put("500")
+        return False
+    await asyncio.to_thread(db.save_account, type, cookie_file, id, record_id if update_mode else None)
+    log("✅ 用户状态已记录")
+    status_queue.put("200")
+    return True
 
 
-# 视频号登录
-async def get_tencent_cookie(id,status_queue, update_mode=False, record_id=None):
-    url_changed_event = asyncio.Event()
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
-
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': False,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(
-            **options,
-            executable_path=str(BASE_DIR / "third_party" / "playwright" / "ms-playwright" / "chromium-1169" / "chrome-win" / "chrome.exe")
-        )
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        # Pause the page, and start recording manually.
-        context = await set_init_script(context)
-        page = await context.new_page()
-        await page.goto("https://channels.weixin.qq.com")
-        original_url = page.url
+async def _douyin_qr(page):
+    await page.goto("https://creator.douyin.com/")
+    return page.url, page.get_by_role("img", name="二维码")
 
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
 
-        # 等待 iframe 出现（最多等 60 秒）
-        iframe_locator = page.frame_locator("iframe").first
+async def _tencent_qr(page):
+    await page.goto("https://channels.weixin.qq.com")
+    original_url = page.url
+    # 二维码在 iframe 中的第一个 img 元素
+    return original_url, page.frame_locator("iframe").first.get_by_role("img").first
 
-        # 获取 iframe 中的第一个 img 元素
-        img_locator = iframe_locator.get_by_role("img").first
 
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
+async def _ks_qr(page):
+    await page.goto("https://cp.kuaishou.com")
+    # 定位并点击“立即登录”按钮（类型为 link）
+    await page.get_by_role("link", name="立即登录").click()
+    await page.get_by_text("扫码登录").click()
+    return page.url, page.get_by_role("img", name="qrcode")
+
+
+async def _xhs_qr(page):
+    await page.goto("https://creator.xiaohongshu.com/")
+    await page.locator('img.css-wemwzq').click()
+    return page.url, page.get_by_role("img").nth(2)
+
+
+async def _bilibili_qr(page):
+    from utils.log import bilibili_logger
+
+    bilibili_logger.info("[bilibili_login] 导航到B站上传页面...")
+    await page.goto("https://member.bilibili.com/platform/upload/video/frame")
+    original_url = page.url
+    bilibili_logger.info(f"[bilibili_login] 初始页面URL: {original_url}")
+    try:
+        img_locator = page.locator('img[src*="qrcode"]').first
+        if await img_locator.count() == 0:
+            bilibili_logger.info("[bilibili_login] 未找到qrcode图片，尝试查找其他img元素")
+            img_locator = page.locator('img').first
+        if await img_locator.count() > 0:
+            return original_url, img_locator
+        bilibili_logger.warning("[bilibili_login] 未找到任何img元素")
+    except Exception as e:
+        bilibili_logger.error(f"[bilibili_login] 查找二维码时出错: {e}")
+    return original_url, None
+
+
+# 抖音登录
+async def douyin_cookie_gen(id, status_queue, update_mode=False, record_id=None):
+    return await qr_login(3, id, status_queue, update_mode, record_id, _douyin_qr)
+
+
+# 视频号登录
+async def get_tencent_cookie(id, status_queue, update_mode=False, record_id=None):
+    return await qr_login(2, id, status_queue, update_mode, record_id, _tencent_qr)
 
-        try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
-        except asyncio.TimeoutError:
-            status_queue.put("500")
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        await context.storage_state(path=Path(BASE_DIR / "cookiesFile" / f"{uuid_v1}.json"))
-        result = await check_cookie(2,f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
-
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            if update_mode and record_id:
-                cursor.execute('''
-                    UPDATE user_info SET type = ?, filePath = ?, userName = ?, status = ? WHERE id = ?
-                ''', (2, f"{uuid_v1}.json", id, 1, int(record_id)))
-            else:
-                cursor.execute('''
-                                INSERT INTO user_info (type, filePath, userName, status)
-                                VALUES (?, ?, ?, ?)
-                                ''', (2, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
 
 # 快手登录
-async def get_ks_cookie(id,status_queue, update_mode=False, record_id=None):
-    url_changed_event = asyncio.Event()
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': False,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(
-            **options,
-            executable_path=str(BASE_DIR / "third_party" / "playwright" / "ms-playwright" / "chromium-1169" / "chrome-win" / "chrome.exe")
-        )
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        context = await set_init_script(context)
-        # Pause the page, and start recording manually.
-        page = await context.new_page()
-        await page.goto("https://cp.kuaishou.com")
-
-        # 定位并点击“立即登录”按钮（类型为 link）
-        await page.get_by_role("link", name="立即登录").click()
-        await page.get_by_text("扫码登录").click()
-        img_locator = page.get_by_role("img", name="qrcode")
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        original_url = page.url
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
+async def get_ks_cookie(id, status_queue, update_mode=False, record_id=None):
+    return await qr_login(4, id, status_queue, update_mode, record_id, _ks_qr)
 
-        try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
-        except asyncio.TimeoutError:
-            status_queue.put("500")
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        await context.storage_state(path=Path(BASE_DIR / "cookiesFile" / f"{uuid_v1}.json"))
-        result = await check_cookie(4, f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
-
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            if update_mode and record_id:
-                cursor.execute('''
-                    UPDATE user_info SET type = ?, filePath = ?, userName = ?, status = ? WHERE id = ?
-                ''', (4, f"{uuid_v1}.json", id, 1, int(record_id)))
-            else:
-                cursor.execute('''
-                                        INSERT INTO user_info (type, filePath, userName, status)
-                                        VALUES (?, ?, ?, ?)
-                                        ''', (4, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
 
 # 小红书登录
-async def xiaohongshu_cookie_gen(id,status_queue, update_mode=False, record_id=None):
-    url_changed_event = asyncio.Event()
-
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
-
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': False,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(
-            **options,
-            executable_path=str(BASE_DIR / "third_party" / "playwright" / "ms-playwright" / "chromium-1169" / "chrome-win" / "chrome.exe")
-        )
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        context = await set_init_script(context)
-        # Pause the page, and start recording manually.
-        page = await context.new_page()
-        await page.goto("https://creator.xiaohongshu.com/")
-        await page.locator('img.css-wemwzq').click()
-
-        img_locator = page.get_by_role("img").nth(2)
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        original_url = page.url
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
+async def xiaohongshu_cookie_gen(id, status_queue, update_mode=False, record_id=None):
+    return await qr_login(1, id, status_queue, update_mode, record_id, _xhs_qr)
 
-        try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
-        except asyncio.TimeoutError:
-            status_queue.put("500")
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        await context.storage_state(path=Path(BASE_DIR / "cookiesFile" / f"{uuid_v1}.json"))
-        result = await check_cookie(1, f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
-
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            if update_mode and record_id:
-                cursor.execute('''
-                    UPDATE user_info SET type = ?, filePath = ?, userName = ?, status = ? WHERE id = ?
-                ''', (1, f"{uuid_v1}.json", id, 1, int(record_id)))
-            else:
-                cursor.execute('''
-                           INSERT INTO user_info (type, filePath, userName, status)
-                           VALUES (?, ?, ?, ?)
-                           ''', (1, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
-
-# a = asyncio.run(xiaohongshu_cookie_gen(4,None))
-# print(a)
 
 # B站登录
 async def bilibili_cookie_gen(id, status_queue, update_mode=False, record_id=None):
     from utils.log import bilibili_logger
-    
+
     bilibili_logger.info(f"[bilibili_login] 开始B站登录流程，用户ID: {id}")
-    
-    url_changed_event = asyncio.Event()
-
-    async def on_url_change():
-        bilibili_logger.info(f"[bilibili_login] 页面URL变化: {page.url}")
-        if page.url != original_url:
-            bilibili_logger.info(f"[bilibili_login] 检测到URL变化，原始URL: {original_url}, 新URL: {page.url}")
-            url_changed_event.set()
-
-    async with async_playwright() as playwright:
-        options = {
-            'headless': False
-        }
-        bilibili_logger.info("[bilibili_login] 启动浏览器...")
-        browser = await playwright.chromium.launch(
-            **options,
-            executable_path=str(BASE_DIR / "third_party" / "playwright" / "ms-playwright" / "chromium-1169" / "chrome-win" / "chrome.exe")
-        )
-        context = await browser.new_context()
-        context = await set_init_script(context)
-        page = await context.new_page()
-        
-        bilibili_logger.info("[bilibili_login] 导航到B站上传页面...")
-        await page.goto("https://member.bilibili.com/platform/upload/video/frame")
-        original_url = page.url
-        bilibili_logger.info(f"[bilibili_login] 初始页面URL: {original_url}")
-
-        # 尝试抓取二维码
-        bilibili_logger.info("[bilibili_login] 尝试查找二维码...")
-        try:
-            img_locator = page.locator('img[src*="qrcode"]').first
-            if await img_locator.count() == 0:
-                bilibili_logger.info("[bilibili_login] 未找到qrcode图片，尝试查找其他img元素")
-                img_locator = page.locator('img').first
-                
-            if await img_locator.count() > 0:
-                src = await img_locator.get_attribute("src")
-                if src:
-                    bilibili_logger.info(f"[bilibili_login] 找到二维码图片: {src[:50]}...")
-                    status_queue.put(src)
-                else:
-                    bilibili_logger.warning("[bilibili_login] 找到img元素但无src属性")
-            else:
-                bilibili_logger.warning("[bilibili_login] 未找到任何img元素")
-        except Exception as e:
-            bilibili_logger.error(f"[bilibili_login] 查找二维码时出错: {e}")
-
-        bilibili_logger.info("[bilibili_login] 等待用户扫码登录...")
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
-        try:
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)
-            bilibili_logger.info("[bilibili_login] 检测到页面跳转，登录可能成功")
-        except asyncio.TimeoutError:
-            bilibili_logger.error("[bilibili_login] 登录超时（200秒）")
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-
-        bilibili_logger.info("[bilibili_login] 保存登录状态...")
-        uuid_v1 = uuid.uuid1()
-        cookie_file = f"{uuid_v1}.json"
-        await context.storage_state(path=Path(BASE_DIR / "cookiesFile" / cookie_file))
-        bilibili_logger.info(f"[bilibili_login] 登录状态已保存到: {cookie_file}")
-        
-        bilibili_logger.info("[bilibili_login] 验证cookie有效性...")
-        result = await check_cookie(5, cookie_file)
-        bilibili_logger.info(f"[bilibili_login] cookie验证结果: {result}")
-        
-        if not result:
-            bilibili_logger.error("[bilibili_login] cookie验证失败，登录失败")
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-
-        bilibili_logger.info("[bilibili_login] 关闭浏览器...")
-        await page.close()
-        await context.close()
-        await browser.close()
-
-        bilibili_logger.info("[bilibili_login] 保存用户信息到数据库...")
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            if update_mode and record_id:
-                bilibili_logger.info(f"[bilibili_login] 更新现有记录ID: {record_id}")
-                cursor.execute('''
-                    UPDATE user_info SET type = ?, filePath = ?, userName = ?, status = ? WHERE id = ?
-                ''', (5, cookie_file, id, 1, int(record_id)))
-            else:
-                bilibili_logger.info("[bilibili_login] 插入新用户记录")
-                cursor.execute('''
-                                    INSERT INTO user_info (type, filePath, userName, status)
-                                    VALUES (?, ?, ?, ?)
-                                    ''', (5, cookie_file, id, 1))
-            conn.commit()
-            bilibili_logger.info("✅ [bilibili_login] 用户状态已记录到数据库")
-        
-        bilibili_logger.info("[bilibili_login] B站登录流程完成，返回成功状态")
-        status_queue.put("200")
\ No newline at end of file
+    return await qr_login(5, id, status_queue, update_mode, record_id, _bilibili_qr,
+                          log=lambda message: bilibili_logger.info(f"[bilibili_login] {message}"))
@@ -0,0 +1,291 @@
+"""
+扫码登录会话。
+
+以前每个 /login 请求各自启动一个有界面的 Chromium 并等待 200 秒，同时添加 20 个账号就是 20 个浏览器。
+现在每个登录是一个 LoginSession，所有会话共用登录专用的 BrowserPool（只有一个浏览器，与上传器一样经
+launch_chromium_with_codecs 按 LOCAL_CHROME_PATH / 内置浏览器解析启动路径），每个会话一个独立的上下文：
+  - 会话超过 LOGIN_SESSION_TIMEOUT_SECONDS 未完成时取消，关闭上下文并推送 "500"
+  - /cancelLogin 或登录 SSE 客户端断开时取消会话，立即关闭它的上下文
+  - 同时进行的会话数达到 LOGIN_MAX_SESSIONS 时新的登录直接失败
+  - 最后一个会话结束后浏览器保留 LOGIN_BROWSER_IDLE_SECONDS 秒，供接下来的登录复用
+  - 二维码以图片地址或元素截图推送，登录按页面跳转或登录 cookie 出现判断，因此可以在没有图形界面的
+    服务器上以无界面浏览器（LOGIN_HEADLESS）运行，内存占用远小于有界面的浏览器
+
+登录流程（myUtils/login.py）通过 login_context() 取得当前会话的上下文。
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from queue import Empty, Queue
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils import log, metrics
+
+# 单个登录会话的最长时长（秒），包含等待扫码和校验 cookie
+LOGIN_SESSION_TIMEOUT_SECONDS = float(os.getenv('LOGIN_SESSION_TIMEOUT_SECONDS', '200'))
+# 同时进行的登录会话数上限
+LOGIN_MAX_SESSIONS = int(os.getenv('LOGIN_MAX_SESSIONS', '30'))
+# 没有登录会话后保留登录浏览器的时长（秒）
+LOGIN_BROWSER_IDLE_SECONDS = float(os.getenv('LOGIN_BROWSER_IDLE_SECONDS', '300'))
+# 登录浏览器累计打开多少个上下文后回收重启
+LOGIN_BROWSER_MAX_CONTEXTS = int(os.getenv('LOGIN_BROWSER_MAX_CONTEXTS', '100'))
+# 是否以无界面方式运行登录浏览器（二维码通过 SSE 推送给前端，不需要窗口）；
+# auto 表示没有图形界面的 Linux 服务器上使用无界面浏览器，其他环境保持有界面
+_login_headless = os.getenv('LOGIN_HEADLESS', 'auto').lower()
+if _login_headless == 'auto':
+    LOGIN_HEADLESS = sys.platform.startswith('linux') and not (os.getenv('DISPLAY') or os.getenv('WAYLAND_DISPLAY'))
+else:
+    LOGIN_HEADLESS = _login_headless in ('1', 'true', 'yes')
+
+LOGIN_SESSIONS = metrics.gauge('sau_login_sessions', 'QR login sessions in progress')
+LOGIN_RESULTS = metrics.counter('sau_login_sessions_total', 'Finished QR login sessions', ['platform', 'result'])
+
+
+class StatusQueue(Queue):
+    """
+    登录 SSE 使用的队列，记录最后推送的状态（SSE 线程可能已经取走）。
+    同步 SSE（Flask）用 get(timeout=...) 阻塞等待，ASGI 原生 SSE 用 get_async() 在事件循环上等待。
+    """
+
+    last: Optional[str] = None
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._waiters: set = set()
+
+    def put(self, item, block=True, timeout=None):
+        self.last = item
+        super().put(item, block, timeout)
+        for loop, waiter in list(self._waiters):
+            loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+
+    async def get_async(self, timeout: Optional[float] = None):
+        """不占用线程地等待下一条消息；超时抛出 queue.Empty（与 get 相同）。"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            try:
+                return self.get_nowait()
+            except Empty:
+                pass
+            waiter = (loop, loop.create_future())
+            self._waiters.add(waiter)
+            try:
+                # 登记之后再检查一次，避免错过登记前刚放入的消息
+                if not self.empty():
+                    continue
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                try:
+                    await asyncio.wait_for(waiter[1], remaining)
+                except asyncio.TimeoutError:
+                    raise Empty from None
+            finally:
+                self._waiters.discard(waiter)
+
+
+@dataclass(eq=False)
+class LoginSession:
+    id: str
+    type: int
+    account: str
+    status_queue: Queue
+    created_at: float = field(default_factory=time.time)
+    # pending / succeeded / failed / expired / cancelled
+    state: str = 'pending'
+    task: Optional[asyncio.Task] = None
+    context: object = None
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "type": self.type, "account": self.account, "state": self.state,
+                "createdAt": self.created_at, "hasContext": self.context is not None}
+
+
+_current: contextvars.ContextVar[Optional[LoginSession]] = contextvars.ContextVar('login_session', default=None)
+
+
+class LoginSessionManager:
+    def __init__(self, timeout: float = LOGIN_SESSION_TIMEOUT_SECONDS, max_sessions: int = LOGIN_MAX_SESSIONS,
+                 headless: bool = LOGIN_HEADLESS, idle_seconds: float = LOGIN_BROWSER_IDLE_SECONDS,
+                 pool_factory: Optional[Callable] = None):
+        self.timeout = timeout
+        self.max_sessions = max(1, max_sessions)
+        self.headless = headless
+        self.idle_seconds = idle_seconds
+        self.sessions: Dict[str, LoginSession] = {}
+        self._pool_factory = pool_factory or self._default_pool
+        self._pool = None
+        self._idle_task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------ 公共接口
+
+    async def run(self, flow: Callable[..., Awaitable], type, account: str, status_queue: Queue,
+                  update_mode: bool = False, record_id=None, session_id: Optional[str] = None) -> LoginSession:
+        """
+        在当前 task 中执行登录流程 flow(account, status_queue, update_mode, record_id)。
+        超时、取消或异常时推送 "500"，结束时关闭会话的上下文。
+        """
+        session = LoginSession(session_id or uuid.uuid4().hex, int(type), account, status_queue,
+                               task=asyncio.current_task())
+        if len(self.sessions) >= self.max_sessions:
+            log.login_logger.warning(f"[login] 进行中的登录已达上限 {self.max_sessions}，拒绝 {account}")
+            session.state = 'failed'
+            status_queue.put("500")
+            self._record(session)
+            return session
+        self.sessions[session.id] = session
+        self._cancel_idle_close()
+        self._publish_stats()
+        token = _current.set(session)
+        try:
+            await asyncio.wait_for(flow(account, status_queue, update_mode, record_id), timeout=self.timeout)
+            session.state = 'succeeded' if getattr(status_queue, 'last', None) == "200" else 'failed'
+        except asyncio.TimeoutError:
+            log.login_logger.warning(f"[login] 登录会话超时（{self.timeout:.0f}秒）: {account}")
+            session.state = 'expired'
+            status_queue.put("500")
+        except asyncio.CancelledError:
+            if session.state != 'cancelled':
+                raise
+            log.login_logger.info(f"[login] 登录会话已取消: {account}")
+            status_queue.put("500")
+        except Exception as e:
+            # 取消时先关闭了上下文，流程可能因页面已关闭而报错
+            if session.state != 'cancelled':
+                log.login_logger.error(f"[login] 登录任务异常: {account}: {e}")
+                session.state = 'failed'
+            # 保证 SSE 流能收到最终状态并结束
+            status_queue.put("500")
+        finally:
+            _current.reset(token)
+            await self._close_context(session)
+            self.sessions.pop(session.id, None)
+            self._record(session)
+            self._publish_stats()
+            if not self.sessions:
+                self._schedule_idle_close()
+        return session
+
+    @asynccontextmanager
+    async def context(self):
+        """为当前会话打开上下文（会话结束或取消时关闭）；不在会话中调用时只在 with 块内有效。"""
+        session = _current.get()
+        pool = await self._get_pool()
+        context = await pool.new_context()
+        if session is not None:
+            session.context = context
+        try:
+            yield context
+        finally:
+            if session is None or session.context is context:
+                if session is not None:
+                    session.context = None
+                await pool.release(context)
+
+    async def cancel(self, session_id: Optional[str] = None, account: Optional[str] = None) -> List[str]:
+        """按会话 id 或账号名取消会话，立即关闭上下文；返回被取消的会话 id。"""
+        targets = [s for s in list(self.sessions.values())
+                   if (session_id and s.id == session_id) or (account and not session_id and s.account == account)]
+        for session in targets:
+            session.state = 'cancelled'
+            if session.task is not None and session.task is not asyncio.current_task():
+                session.task.cancel()
+            await self._close_context(session)
+        return [session.id for session in targets]
+
+    def list(self) -> List[dict]:
+        return [session.to_dict() for session in self.sessions.values()]
+
+    async def close(self) -> None:
+        await self.cancel_all()
+        self._cancel_idle_close()
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    async def cancel_all(self) -> None:
+        for session_id in list(self.sessions):
+            await self.cancel(session_id)
+
+    # ------------------------------------------------------------ 内部实现
+
+    def _default_pool(self):
+        from utils.browser_pool import BrowserPool
+
+        # 只用一个浏览器：所有会话的上下文都开在同一个浏览器里
+        return BrowserPool(headless=self.headless, size=1, max_contexts_per_browser=LOGIN_BROWSER_MAX_CONTEXTS,
+                           max_open_contexts=self.max_sessions)
+
+    async def _get_pool(self):
+        if self._pool is None or self._pool.closed:
+            self._pool = self._pool_factory()
+        return self._pool
+
+    async def _close_context(self, session: LoginSession) -> None:
+        context, session.context = session.context, None
+        if context is not None and self._pool is not None:
+            await self._pool.release(context)
+
+    def _schedule_idle_close(self) -> None:
+        if self._pool is None:
+            return
+        self._cancel_idle_close()
+        self._idle_task = asyncio.get_running_loop().create_task(self._idle_close())
+
+    def _cancel_idle_close(self) -> None:
+        if self._idle_task is not None and not self._idle_task.done():
+            self._idle_task.cancel()
+        self._idle_task = None
+
+    async def _idle_close(self) -> None:
+        await asyncio.sleep(self.idle_seconds)
+        if not self.sessions and self._pool is not None:
+            pool, self._pool = self._pool, None
+            log.login_logger.info("[login] 登录浏览器空闲，关闭")
+            await pool.close()
+
+    def _publish_stats(self) -> None:
+        LOGIN_SESSIONS.set(len(self.sessions))
+
+    @staticmethod
+    def _record(session: LoginSession) -> None:
+        from myUtils import platforms
+
+        spec = platforms.find(session.type)
+        LOGIN_RESULTS.inc(platform=spec.name if spec else str(session.type), result=session.state)
+
+
+# 上下文和浏览器绑定在事件循环上，因此按循环维护管理器（与浏览器池相同）
+_managers: Dict[asyncio.AbstractEventLoop, LoginSessionManager] = {}
+
+
+def get_login_manager() -> LoginSessionManager:
+    loop = asyncio.get_running_loop()
+    manager = _managers.get(loop)
+    if manager is None:
+        manager = _managers[loop] = LoginSessionManager()
+    return manager
+
+
+def login_context():
+    """登录流程中使用：async with login_context() as context。"""
+    return get_login_manager().context()
+
+
+async def run_login_session(flow, type, account, status_queue, update_mode=False, record_id=None,
+                            session_id=None) -> LoginSession:
+    return await get_login_manager().run(flow, type, account, status_queue, update_mode, record_id, session_id)
+
+
+async def cancel_login(session_id: Optional[str] = None, account: Optional[str] = None) -> List[str]:
+    return await get_login_manager().cancel(session_id, account)
+
+
+async def list_login_sessions() -> List[dict]:
+    return get_login_manager().list()
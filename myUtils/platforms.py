@@ -0,0 +1,185 @@
+"""
+平台注册表。
+
+每个平台用一个 PlatformSpec 描述：上传器、发布函数、扫码登录流程、cookie 校验、登录后打开的页面以及并发上限。
+路由、发布任务、账号校验、打开账号都只查注册表，新增平台只需 register() 一个 PlatformSpec，不用改路由。
+
+上传器和登录模块会连带导入 Playwright、biliup、xhs、requests 以及 utils/log.py（创建日志文件），
+因此注册表中只保存 "模块:属性" 字符串，某个平台的发布任务或登录请求第一次执行时才导入对应模块，之后复用缓存。
+
+第三方平台可放在独立模块中调用 register()，并通过环境变量 PLATFORM_PLUGINS="pkg.module,..." 在启动时加载。
+"""
+import importlib
+import os
+import threading
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class PlatformSpec:
+    # user_info.type 以及发布请求中的 type
+    type: int
+    # 内部名称，用于并发配置（PUBLISH_PLATFORM_CONCURRENCY 等）、cookie 探测和日志
+    name: str
+    label: str
+    # 上传器类，构造参数为 (title, file_path, tags, publish_date, account_file, ...)
+    uploader: str
+    # 发布函数，签名同 postVideo.post_video_xhs，返回逐项结果报告
+    publisher: str
+    # 登录后打开的创作者后台页面（/openAccounts）
+    entry_url: str
+    # 扫码登录流程 async (id, status_queue, update_mode, record_id)；None 表示不支持网页扫码登录
+    login: str | None = None
+    # cookie 校验 async (account_file, preview) -> bool；None 表示一律按失效处理
+    validator: str | None = None
+    # 上传器实例上执行一次发布的协程方法名
+    publish_method: str = 'upload'
+    # 发布请求中的平台专用字段 -> 发布函数的关键字参数
+    publish_fields: dict = field(default_factory=dict)
+    # 单平台同时进行的上传数 / 账号校验数（可被环境变量覆盖）
+    publish_concurrency: int = 2
+    check_concurrency: int = 3
+
+
+_specs: dict[int, PlatformSpec] = {}
+_loaded: dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def register(spec: PlatformSpec, replace: bool = False) -> PlatformSpec:
+    """注册平台；type 或 name 与已注册的平台重复时报错，replace=True 时覆盖同 type 的平台。"""
+    with _lock:
+        existing = _specs.get(spec.type)
+        if existing is not None and not replace:
+            raise ValueError(f"platform type {spec.type} already registered as {existing.name}")
+        for other in _specs.values():
+            if other.name == spec.name and other.type != spec.type:
+                raise ValueError(f"platform name {spec.name} already registered as type {other.type}")
+        _specs[spec.type] = spec
+    return spec
+
+
+def find(type) -> PlatformSpec | None:
+    try:
+        return _specs.get(int(type))
+    except (TypeError, ValueError):
+        return None
+
+
+def get(type) -> PlatformSpec:
+    spec = find(type)
+    if spec is None:
+        raise ValueError(f"unsupported platform type: {type}")
+    return spec
+
+
+def by_name(name: str) -> PlatformSpec | None:
+    return next((spec for spec in _specs.values() if spec.name == name), None)
+
+
+def all_platforms() -> list[PlatformSpec]:
+    return [_specs[type] for type in sorted(_specs)]
+
+
+def load(target: str):
+    """导入 "模块:属性" 并返回该属性，结果缓存；并发调用时同一目标只导入一次。"""
+    obj = _loaded.get(target)
+    if obj is None:
+        with _lock:
+            obj = _loaded.get(target)
+            if obj is None:
+                module_name, _, attr = target.partition(':')
+                obj = getattr(importlib.import_module(module_name), attr)
+                _loaded[target] = obj
+    return obj
+
+
+def uploader(name: str):
+    spec = by_name(name)
+    if spec is None:
+        raise ValueError(f"unsupported platform: {name}")
+    return load(spec.uploader)
+
+
+def login_flow(type):
+    """返回账号类型对应的登录协程函数；未知类型或不支持扫码登录时返回 None。"""
+    spec = find(type)
+    return load(spec.login) if spec and spec.login else None
+
+
+def validator(type):
+    spec = find(type)
+    return load(spec.validator) if spec and spec.validator else None
+
+
+def loaded_targets() -> list[str]:
+    return sorted(_loaded)
+
+
+register(PlatformSpec(
+    type=1, name='xhs', label='小红书',
+    uploader='uploader.xiaohongshu_uploader.main:XiaoHongShuVideo',
+    publisher='myUtils.postVideo:post_video_xhs',
+    entry_url='https://creator.xiaohongshu.com/new/note-manager',
+    login='myUtils.login:xiaohongshu_cookie_gen',
+    validator='myUtils.auth:cookie_auth_xhs',
+))
+register(PlatformSpec(
+    type=2, name='tencent', label='视频号',
+    uploader='uploader.tencent_uploader.main:TencentVideo',
+    publisher='myUtils.postVideo:post_video_tencent',
+    entry_url='https://channels.weixin.qq.com/platform/post/list',
+    login='myUtils.login:get_tencent_cookie',
+    validator='myUtils.auth:cookie_auth_tencent',
+))
+register(PlatformSpec(
+    type=3, name='douyin', label='抖音',
+    uploader='uploader.douyin_uploader.main:DouYinVideo',
+    publisher='myUtils.postVideo:post_video_DouYin',
+    entry_url='https://creator.douyin.com/creator-micro/content/manage',
+    login='myUtils.login:douyin_cookie_gen',
+    validator='myUtils.auth:cookie_auth_douyin',
+))
+register(PlatformSpec(
+    type=4, name='kuaishou', label='快手',
+    uploader='uploader.ks_uploader.main:KSVideo',
+    publisher='myUtils.postVideo:post_video_ks',
+    entry_url='https://cp.kuaishou.com/article/publish/video',
+    login='myUtils.login:get_ks_cookie',
+    validator='myUtils.auth:cookie_auth_ks',
+))
+register(PlatformSpec(
+    type=5, name='bilibili', label='B站',
+    # HTTP 分片上传优先，失败或不支持时回退到页面上传
+    uploader='uploader.bilibili_uploader.publisher:BilibiliPublisher',
+    publisher='myUtils.postVideo:post_video_bilibili',
+    entry_url='https://member.bilibili.com/platform/upload-manager/article',
+    login='myUtils.login:bilibili_cookie_gen',
+    validator='myUtils.auth:cookie_auth_bilibili',
+    publish_fields={'biliDesc': 'desc', 'biliType': 'bili_type', 'biliPartition': 'bili_partition'},
+))
+# 以下平台的上传器自行启动浏览器（main() 内 async_playwright），登录需在本地运行各自的 setup 脚本生成 cookie
+register(PlatformSpec(
+    type=6, name='tiktok', label='TikTok',
+    uploader='uploader.tk_uploader.main:TiktokVideo',
+    publisher='myUtils.postVideo:post_video_tiktok',
+    entry_url='https://www.tiktok.com/tiktokstudio/upload?lang=en',
+    validator='myUtils.auth:cookie_auth_tiktok',
+    publish_method='main',
+    publish_concurrency=1,
+    check_concurrency=1,
+))
+register(PlatformSpec(
+    type=7, name='baijiahao', label='百家号',
+    uploader='uploader.baijiahao_uploader.main:BaiJiaHaoVideo',
+    publisher='myUtils.postVideo:post_video_baijiahao',
+    entry_url='https://baijiahao.baidu.com/builder/rc/home',
+    validator='myUtils.auth:cookie_auth_baijiahao',
+    publish_method='main',
+    publish_concurrency=1,
+    check_concurrency=1,
+))
+
+for _module in os.getenv('PLATFORM_PLUGINS', '').split(','):
+    if _module.strip():
+        importlib.import_module(_module.strip())
@@ -1,24 +1,286 @@
 import asyncio
+import contextvars
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 
 from conf import BASE_DIR
-from uploader.douyin_uploader.main import DouYinVideo
-from uploader.ks_uploader.main import KSVideo
-from uploader.tencent_uploader.main import TencentVideo
-from uploader.xiaohongshu_uploader.main import XiaoHongShuVideo
-from uploader.bilibili_uploader.playwright_main import BilibiliVideo
+from myUtils import platforms
+from myUtils.async_runtime import run_sync
+from utils.browser_pool import use_browser_pool
 from utils.constant import TencentZoneTypes
+from utils import bandwidth, log, metrics, timing
 from utils.files_times import generate_schedule_time_next_day
+from utils.waiters import UploadWaitTimeout
 
+# 本进程同时进行的上传总数（所有 worker、所有批次共用）
+PUBLISH_MAX_CONCURRENCY = int(os.getenv('PUBLISH_MAX_CONCURRENCY', '4'))
+# 单个平台同时进行的上传数，默认取自平台注册表，可用 PUBLISH_PLATFORM_CONCURRENCY="douyin=3,xhs=1" 覆盖
+PLATFORM_CONCURRENCY = {spec.name: spec.publish_concurrency for spec in platforms.all_platforms()}
+for _item in os.getenv('PUBLISH_PLATFORM_CONCURRENCY', '').split(','):
+    if '=' in _item:
+        _name, _limit = _item.split('=', 1)
+        PLATFORM_CONCURRENCY[_name.strip()] = int(_limit)
+# 账号租约的时长（秒，持有期间每 1/3 续约一次）和被其他进程占用时的重试间隔（秒）
+ACCOUNT_LEASE_SECONDS = int(os.getenv('ACCOUNT_LEASE_SECONDS', '120'))
+ACCOUNT_LEASE_POLL_SECONDS = float(os.getenv('ACCOUNT_LEASE_POLL_SECONDS', '2'))
+# 单个发布项（上传器调用，不含排队）的最长时长（秒），超时后取消并按失败处理
+PUBLISH_ITEM_TIMEOUT = float(os.getenv('PUBLISH_ITEM_TIMEOUT', '3600'))
+# 超时取消后留给上传器清理（关闭上下文等）的时间（秒）；仍未结束的发布项视为卡死，
+# 不再续约账号租约和任务租约，由其他进程接管
+PUBLISH_CANCEL_GRACE_SECONDS = 60
 
-def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
+# 本进程在 account_leases 表中的身份；进程内的互斥由 PublishLimiter 的账号锁保证
+PROCESS_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# 任务失去租约时由 jobs.run_job 置位；run_sync 会复制上下文，批次内的每个发布项开始前检查
+_cancel_event: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar('publish_cancel', default=None)
+
+
+def bind_cancel_event(event: threading.Event) -> contextvars.Token:
+    return _cancel_event.set(event)
+
+
+def unbind_cancel_event(token: contextvars.Token) -> None:
+    _cancel_event.reset(token)
+
+
+# 进行中的发布项 -> 开始时间（time.monotonic）；由 jobs.run_job 绑定，续约线程据此发现卡死的发布项
+_in_flight: contextvars.ContextVar[dict | None] = contextvars.ContextVar('publish_in_flight', default=None)
+
+
+def bind_in_flight(items: dict) -> contextvars.Token:
+    return _in_flight.set(items)
+
+
+def unbind_in_flight(token: contextvars.Token) -> None:
+    _in_flight.reset(token)
+
+
+def item_overdue(started: float, now: float | None = None) -> bool:
+    """发布项已超过 PUBLISH_ITEM_TIMEOUT 加清理时间仍未结束。"""
+    return (now or time.monotonic()) - started > PUBLISH_ITEM_TIMEOUT + PUBLISH_CANCEL_GRACE_SECONDS
+
+
+@dataclass
+class AccountLease:
+    account: str
+    # 发布项开始时间（time.monotonic）；超时未结束后停止续约，让租约过期
+    started: float | None = None
+
+
+@asynccontextmanager
+async def account_lease(account: str):
+    """
+    跨进程的账号互斥：在 account_leases 表中占有账号行，被其他进程（独立 worker）占用时等待。
+    持有期间后台续约，退出时释放；进程崩溃后租约过期即可被其他进程获取。
+    发布项卡死（item_overdue）后停止续约，租约过期后账号可被其他进程使用。
+    """
+    from myUtils.jobs import acquire_account_lease, release_account_lease
+
+    while not await asyncio.to_thread(acquire_account_lease, account, PROCESS_OWNER, ACCOUNT_LEASE_SECONDS):
+        await asyncio.sleep(ACCOUNT_LEASE_POLL_SECONDS)
+    lease = AccountLease(account)
+
+    async def renew():
+        while True:
+            await asyncio.sleep(max(1, ACCOUNT_LEASE_SECONDS // 3))
+            if lease.started is not None and item_overdue(lease.started):
+                log.publish_logger.error(f"[publish] 账号 {account} 的发布项超时未结束，停止续约")
+                return
+            try:
+                await asyncio.to_thread(acquire_account_lease, account, PROCESS_OWNER, ACCOUNT_LEASE_SECONDS)
+            except sqlite3.Error as e:
+                log.publish_logger.warning(f"[publish] 账号 {account} 续约失败: {e}")
+
+    renewer = asyncio.get_running_loop().create_task(renew())
+    try:
+        yield lease
+    finally:
+        renewer.cancel()
+        try:
+            await asyncio.to_thread(release_account_lease, account, PROCESS_OWNER)
+        except sqlite3.Error as e:
+            # 释放失败时等租约自然过期
+            log.publish_logger.warning(f"[publish] 账号 {account} 释放租约失败: {e}")
+
+
+class PublishLimiter:
+    """
+    三级并发控制：进程总数 / 单平台 / 单账号。
+    同一账号同一时刻最多只有一个上传：进程内用账号锁，跨进程用账号租约（account_lease）；
+    先拿账号锁和租约（account）再占平台和全局名额（capacity），避免排队中的账号占用名额。
+    run_publish_batch 在两者之间等待带宽准入，所有账号空闲的发布项都参与按发布时间的排序。
+    """
+
+    def __init__(self, max_concurrency: int = PUBLISH_MAX_CONCURRENCY, platform_limits: dict | None = None):
+        self.platform_limits = dict(PLATFORM_CONCURRENCY, **(platform_limits or {}))
+        self._global = asyncio.Semaphore(max(1, max_concurrency))
+        self._platforms: dict[str, asyncio.Semaphore] = {}
+        self._accounts: dict[str, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def account(self, account_file):
+        account_lock = self._accounts.setdefault(str(account_file), asyncio.Lock())
+        async with account_lock:
+            async with account_lease(Path(account_file).name) as lease:
+                yield lease
+
+    @asynccontextmanager
+    async def capacity(self, platform: str):
+        platform_sem = self._platforms.setdefault(
+            platform, asyncio.Semaphore(max(1, self.platform_limits.get(platform, 1))))
+        async with platform_sem:
+            async with self._global:
+                yield
+
+    @asynccontextmanager
+    async def slot(self, platform: str, account_file):
+        async with self.account(account_file) as lease:
+            async with self.capacity(platform):
+                yield lease
+
+
+# 信号量绑定在事件循环上，因此按循环维护限流器（与浏览器池相同）；同一进程的所有批次共用
+_limiters: dict[asyncio.AbstractEventLoop, PublishLimiter] = {}
+
+
+def get_publish_limiter() -> PublishLimiter:
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = PublishLimiter()
+    return limiter
+
+
+def publish_item_key(file, account_file) -> str:
+    return f"{Path(file).name}|{Path(account_file).name}"
+
+
+async def run_publish_batch(platform: str, items, limiter: PublishLimiter | None = None,
+                            skip=None, on_result=None) -> list[dict]:
+    """
+    在同一个事件循环中并发执行一批上传，共用浏览器池。
+    items: [(file, account_file, make_uploader)]，单个失败不会中断其余上传，返回逐项结果报告。
+    skip: 已完成的 publish_item_key 集合（任务恢复时跳过）；on_result: 每项完成后在线程中执行的回调。
+    limiter 默认使用进程共用的限流器；绑定的取消事件（bind_cancel_event）置位后尚未开始的发布项不再执行。
+    单个发布项超过 PUBLISH_ITEM_TIMEOUT 时取消并记为失败。
+    """
+    limiter = limiter or get_publish_limiter()
+    cancel_event = _cancel_event.get()
+    in_flight = _in_flight.get()
+    if in_flight is None:
+        in_flight = {}
+    spec = platforms.by_name(platform)
+    publish_method = spec.publish_method if spec else 'upload'
+    skip = skip or set()
+    items = [item for item in items if publish_item_key(item[0], item[1]) not in skip]
+
+    async def publish_one(uploader, lease: AccountLease, key: str, result: dict) -> None:
+        started = time.perf_counter()
+        lease.started = in_flight[key] = time.monotonic()
+        # 每个 run_one 在独立的 task 中执行（上下文是副本），绑定的标签只作用于本发布项的步骤耗时记录
+        token = timing.bind(file=result["file"], account=result["account"])
+        try:
+            try:
+                published = await asyncio.wait_for(getattr(uploader, publish_method)(), PUBLISH_ITEM_TIMEOUT)
+            except UploadWaitTimeout:
+                raise
+            except asyncio.TimeoutError:
+                raise UploadWaitTimeout(platform, "publish item", PUBLISH_ITEM_TIMEOUT,
+                                        time.perf_counter() - started, [publish_method]) from None
+            if published is False:
+                result["status"] = "failed"
+                result["error"] = "publish not confirmed"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e) or e.__class__.__name__
+        finally:
+            in_flight.pop(key, None)
+            timing.unbind(token)
+        result["elapsed"] = round(time.perf_counter() - started, 2)
+
+    async def run_one(file, account_file, make_uploader) -> dict:
+        result = {
+            "platform": platform,
+            "file": Path(file).name,
+            "account": Path(account_file).name,
+            "status": "success",
+            "error": None,
+            "elapsed": 0.0,
+        }
+        uploader = None
+        key = publish_item_key(file, account_file)
+        try:
+            async with limiter.account(account_file) as lease:
+                try:
+                    uploader = make_uploader()
+                except Exception as e:
+                    result["status"] = "failed"
+                    result["error"] = str(e) or e.__class__.__name__
+                    uploader = None
+                if uploader is not None:
+                    # 按上行带宽和定时发布时间排队，越早发布的越先传输；排在并发名额之前，
+                    # 否则堆中最多只有 PUBLISH_MAX_CONCURRENCY 个已按提交顺序放行的发布项，排序不起作用
+                    async with bandwidth.admit(platform, file, getattr(uploader, 'publish_date', 0)):
+                        async with limiter.capacity(platform):
+                            if cancel_event is not None and cancel_event.is_set():
+                                result["status"] = "cancelled"
+                                result["error"] = "job lease lost"
+                                return result
+                            await publish_one(uploader, lease, key, result)
+        except sqlite3.Error as e:
+            # 账号租约读写失败，发布项没有开始
+            result["status"] = "failed"
+            result["error"] = f"account lease: {e}"
+        metrics.UPLOADS.inc(platform=platform, outcome=result["status"])
+        metrics.UPLOAD_LATENCY.observe(result["elapsed"], platform=platform, outcome=result["status"])
+        # 上传器在等待发布结果时截取的诊断截图只在失败时落盘
+        recorder = getattr(uploader, 'diagnostics', None)
+        if recorder is not None:
+            if result["status"] == "failed":
+                path = await asyncio.to_thread(recorder.flush, result["error"])
+                if path is not None:
+                    result["diagnostics"] = str(path)
+            else:
+                recorder.clear()
+        log.publish_logger.info(f"[{platform}] {result['file']} -> {result['account']}: {result['status']}"
+                                f" ({result['elapsed']}s){' ' + result['error'] if result['error'] else ''}")
+        if on_result is not None:
+            # 回调会写库（任务进度），放到线程中执行，不阻塞事件循环
+            await asyncio.to_thread(on_result, result)
+        return result
+
+    async with use_browser_pool(headless=False):
+        report = await asyncio.gather(*(run_one(*item) for item in items))
+    succeeded = len([r for r in report if r["status"] == "success"])
+    failed = len([r for r in report if r["status"] == "failed"])
+    cancelled = len(report) - succeeded - failed
+    log.publish_logger.info(f"[{platform}] 批量发布完成: 成功 {succeeded} / 失败 {failed}{f' / 取消 {cancelled}' if cancelled else ''}")
+    return list(report)
+
+
+def _schedule(files, enableTimer, videos_per_day, daily_times, start_days):
+    if enableTimer:
+        return generate_schedule_time_next_day(len(files), videos_per_day, daily_times, start_days=start_days)
+    return [0 for _ in range(len(files))]
+
+
+def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, skip=None, on_result=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = [0 for i in range(len(files))]
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    # 上传器模块在该平台的任务首次执行时才导入
+    video_cls = platforms.uploader('tencent')
+    items = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
@@ -26,18 +288,17 @@ def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.L
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = TencentVideo(title, str(file), tags, publish_datetimes[index], cookie, category)
-            asyncio.run(app.main(), debug=False)
+            items.append((file, cookie, partial(video_cls, title, str(file), tags, publish_datetimes[index], cookie, category)))
+    return run_sync(run_publish_batch('tencent', items, skip=skip, on_result=on_result))
 
 
-def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
+def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, skip=None, on_result=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = [0 for i in range(len(files))]
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    video_cls = platforms.uploader('douyin')
+    items = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
@@ -45,18 +306,17 @@ def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LI
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = DouYinVideo(title, str(file), tags, publish_datetimes[index], cookie, category)
-            asyncio.run(app.main(), debug=False)
+            items.append((file, cookie, partial(video_cls, title, str(file), tags, publish_datetimes[index], cookie, category)))
+    return run_sync(run_publish_batch('douyin', items, skip=skip, on_result=on_result))
 
 
-def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
+def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, skip=None, on_result=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = [0 for i in range(len(files))]
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    video_cls = platforms.uploader('kuaishou')
+    items = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
@@ -64,46 +324,86 @@ def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFEST
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = KSVideo(title, str(file), tags, publish_datetimes[index], cookie)
-            asyncio.run(app.main(), debug=False)
+            items.append((file, cookie, partial(video_cls, title, str(file), tags, publish_datetimes[index], cookie)))
+    return run_sync(run_publish_batch('kuaishou', items, skip=skip, on_result=on_result))
 
-def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
+def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, skip=None, on_result=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    file_num = len(files)
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(file_num, videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = 0
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    video_cls = platforms.uploader('xhs')
+    items = []
     for index, file in enumerate(files):
         for cookie in account_file:
             # 打印视频文件名、标题和 hashtag
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = XiaoHongShuVideo(title, file, tags, publish_datetimes, cookie)
-            asyncio.run(app.main(), debug=False)
+            items.append((file, cookie, partial(video_cls, title, file, tags, publish_datetimes[index], cookie)))
+    return run_sync(run_publish_batch('xhs', items, skip=skip, on_result=on_result))
 
 
 def post_video_bilibili(title, files, tags, account_file, category=None, enableTimer=False, videos_per_day=1, daily_times=None, start_days=0,
-                        desc: str | None = None, bili_type: str | None = None, bili_partition: str | None = None):
+                        desc: str | None = None, bili_type: str | None = None, bili_partition: str | None = None,
+                        skip=None, on_result=None):
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times, start_days)
-    else:
-        publish_datetimes = [0 for _ in range(len(files))]
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    video_cls = platforms.uploader('bilibili')
+    items = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = BilibiliVideo(title, str(file), tags, publish_datetimes[index], cookie,
-                                desc=desc, bili_type=bili_type, partition=bili_partition)
-            asyncio.run(app.main(), debug=False)
+            items.append((file, cookie, partial(video_cls, title, str(file), tags, publish_datetimes[index], cookie,
+                                                desc=desc, bili_type=bili_type, partition=bili_partition)))
+    return run_sync(run_publish_batch('bilibili', items, skip=skip, on_result=on_result))
+
+
+
+def post_video_tiktok(title, files, tags, account_file, category=None, enableTimer=False, videos_per_day=1, daily_times=None,
+                      start_days=0, skip=None, on_result=None):
+    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
+    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    video_cls = platforms.uploader('tiktok')
+    items = []
+    for index, file in enumerate(files):
+        for cookie in account_file:
+            print(f"视频文件名：{file}")
+            print(f"标题：{title}")
+            print(f"Hashtag：{tags}")
+            items.append((file, cookie, partial(video_cls, title, str(file), tags, publish_datetimes[index], str(cookie))))
+    return run_sync(run_publish_batch('tiktok', items, skip=skip, on_result=on_result))
 
 
+def post_video_baijiahao(title, files, tags, account_file, category=None, enableTimer=False, videos_per_day=1,
+                         daily_times=None, start_days=0, skip=None, on_result=None):
+    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
+    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
+    publish_datetimes = _schedule(files, enableTimer, videos_per_day, daily_times, start_days)
+    video_cls = platforms.uploader('baijiahao')
+    items = []
+    for index, file in enumerate(files):
+        for cookie in account_file:
+            print(f"视频文件名：{file}")
+            print(f"标题：{title}")
+            print(f"Hashtag：{tags}")
+            items.append((file, cookie, partial(video_cls, title, str(file), tags, publish_datetimes[index], str(cookie))))
+    return run_sync(run_publish_batch('baijiahao', items, skip=skip, on_result=on_result))
+
 
-# post_video("333",["demo.mp4"],"d","d")
-# post_video_DouYin("333",["demo.mp4"],"d","d")
\ No newline at end of file
+def dispatch_publish(data: dict, skip=None, on_result=None) -> list[dict]:
+    """按前端提交的发布参数（/postVideo 的 JSON）找到注册表中的平台并调用其发布函数，返回逐项结果报告。"""
+    spec = platforms.get(data.get('type'))
+    category = data.get('category')
+    if category == 0:
+        category = None
+    # 平台专用字段，如 B站的 biliDesc/biliType/biliPartition
+    extra = {kwarg: data.get(key) for key, kwarg in spec.publish_fields.items()}
+    publish = platforms.load(spec.publisher)
+    return publish(data.get('title'), data.get('fileList', []), data.get('tags'), data.get('accountList', []), category,
+                   data.get('enableTimer'), data.get('videosPerDay'), data.get('dailyTimes'), data.get('startDays'),
+                   skip=skip, on_result=on_result, **extra)
@@ -0,0 +1,150 @@
+"""
+数据库表结构初始化与迁移。
+
+服务进程（main.startup）和独立的发布 worker 进程（python -m myUtils.jobs）启动时都先调用
+initialize_database()，保证两边使用同一份表结构；可重复执行。
+"""
+from pathlib import Path
+
+from conf import BASE_DIR
+from myUtils import db
+from myUtils.account_status import migrate_user_info
+from myUtils.blob_store import migrate_file_records
+from myUtils.chunked_upload import migrate_upload_sessions
+
+
+def initialize_database() -> None:
+    db_dir = Path(BASE_DIR / "db")
+    db_dir.mkdir(parents=True, exist_ok=True)
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS user_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type INTEGER NOT NULL,
+    filePath TEXT NOT NULL,
+    userName TEXT NOT NULL,
+    status INTEGER DEFAULT 0
+)
+''')
+        migrate_user_info(cursor)
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS file_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    filesize REAL,
+    upload_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+    file_path TEXT
+)
+''')
+        migrate_file_records(cursor)
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+)
+''')
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS publish_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    finished_at DATETIME
+)
+''')
+        cursor.execute('''
+CREATE INDEX IF NOT EXISTS idx_publish_jobs_status ON publish_jobs (status, id)
+''')
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS publish_job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+''')
+        cursor.execute('''
+CREATE INDEX IF NOT EXISTS idx_publish_job_events_job ON publish_job_events (job_id)
+''')
+        # 账号租约：同一账号跨进程（服务内 worker 与独立 worker）同一时刻只有一个上传
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS account_leases (
+    account TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+''')
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    final_filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+''')
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS upload_chunks (
+    upload_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    PRIMARY KEY (upload_id, chunk_index)
+)
+''')
+        # 正在写入 .part 文件的分片请求；存在时 finalize 返回 409，不会在写入过程中校验和登记文件
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS upload_writers (
+    id TEXT PRIMARY KEY,
+    upload_id TEXT NOT NULL,
+    started_at REAL NOT NULL
+)
+''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_writers_upload ON upload_writers (upload_id)")
+        migrate_upload_sessions(cursor)
+        # 列表接口的筛选 / 排序索引（keyset 分页按 排序字段, id 取数）
+        for index_sql in (
+            "CREATE INDEX IF NOT EXISTS idx_file_records_upload_time ON file_records (upload_time, id)",
+            "CREATE INDEX IF NOT EXISTS idx_file_records_filename ON file_records (filename, id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_info_type_status ON user_info (type, status)",
+            "CREATE INDEX IF NOT EXISTS idx_user_info_type ON user_info (type, id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_info_username ON user_info (userName, id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_info_last_checked ON user_info (last_checked_at, id)",
+            # 可为空的排序字段按 COALESCE 表达式排序（db.FILE_SORTS / ACCOUNT_SORTS），索引必须是同一表达式
+            "DROP INDEX IF EXISTS idx_file_records_filesize",
+            "CREATE INDEX IF NOT EXISTS idx_file_records_filesize_sort ON file_records (COALESCE(filesize, 0), id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_info_status_sort ON user_info (COALESCE(status, 0), id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_info_last_checked_sort ON user_info (COALESCE(last_checked_at, 0), id)",
+        ):
+            cursor.execute(index_sql)
+        # 表数据版本号：每次增删改由触发器递增，列表接口据此生成 ETag
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+)
+''')
+        for table in ('file_records', 'user_info'):
+            cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version AFTER {event} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+END
+''')
+    print("✅ 数据库已初始化")
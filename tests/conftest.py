@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 直接运行 pytest 时仓库根目录不在 sys.path 上
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,137 @@
+"""
+utils/bandwidth.py 的 BandwidthScheduler：等待中的发布项按定时发布时间放行，
+同时准入的传输数和单平台在传字节数不超过预算。
+"""
+import argparse
+import asyncio
+
+import pytest
+
+from benchmarks.bench_bandwidth import MB, inversions, make_items, simulate
+from utils.bandwidth import BandwidthScheduler, publish_priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def simulation_args(**overrides) -> argparse.Namespace:
+    args = dict(items=24, concurrency=8, uplink_mbps=32, per_transfer_mbps=24, timeout=300, prep=5, publish=5,
+                min_rate_kbps=1024, initial_slots=2, platform_max_mb=1024, seed=7, known_uplink=True)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+async def drain(scheduler: BandwidthScheduler, tasks: list, check) -> None:
+    """依次释放已准入的名额，直到所有等待者都被放行；每一步之后调用 check()。"""
+    while not all(task.done() for task in tasks):
+        await asyncio.sleep(0)
+        check()
+        done = [task for task in tasks if task.done()]
+        oldest = min((task.result() for task in done if not task.result().released),
+                     key=lambda ticket: ticket.admitted_at, default=None)
+        if oldest is not None:
+            scheduler.clock.now += 1
+            scheduler.release(oldest, measured=False)
+    check()
+
+
+def test_waiting_items_admitted_by_publish_time():
+    async def scenario():
+        scheduler = BandwidthScheduler(capacity=4 * MB, min_rate=MB, platform_limit=1024 * MB,
+                                       platform_limits={}, clock=FakeClock())
+        budget = 4
+        # 先占满链路，之后提交的发布项全部进入等待队列
+        blockers = [await scheduler.acquire('douyin', MB) for _ in range(budget)]
+        priorities = [300.0, 100.0, 0.0, 200.0, 50.0, 400.0, 150.0, 250.0]
+        admitted = []
+
+        async def wait(priority):
+            ticket = await scheduler.acquire('douyin', MB, priority)
+            admitted.append(priority)
+            return ticket
+
+        tasks = [asyncio.ensure_future(wait(priority)) for priority in priorities]
+        await asyncio.sleep(0)
+        assert scheduler.stats()['waiting'] == len(priorities)
+        assert admitted == []
+
+        for ticket in blockers:
+            scheduler.release(ticket, measured=False)
+
+        def check():
+            assert scheduler.stats()['admitted'] <= budget
+
+        await drain(scheduler, tasks, check)
+        assert admitted == sorted(priorities)
+
+    asyncio.run(scenario())
+
+
+def test_platform_bytes_never_exceed_limit():
+    async def scenario():
+        limit = 300 * MB
+        scheduler = BandwidthScheduler(capacity=100 * MB, min_rate=MB, platform_limit=limit,
+                                       platform_limits={'xhs': 100 * MB}, clock=FakeClock())
+        sizes = [('douyin', 200), ('douyin', 150), ('xhs', 80), ('douyin', 100), ('xhs', 60), ('douyin', 120)]
+        tasks = [asyncio.ensure_future(scheduler.acquire(platform, size * MB, float(index)))
+                 for index, (platform, size) in enumerate(sizes)]
+
+        def check():
+            in_flight = scheduler.stats()['bytes_in_flight']
+            assert in_flight.get('douyin', 0) <= limit
+            assert in_flight.get('xhs', 0) <= 100 * MB
+
+        await drain(scheduler, tasks, check)
+
+    asyncio.run(scenario())
+
+
+def test_publish_priority():
+    assert publish_priority(0) == 0
+    assert publish_priority(None) == 0
+    assert publish_priority(1700000000) < publish_priority(1700003600)
+
+
+@pytest.mark.parametrize("concurrency", [2, 8, 24])
+def test_simulation_admits_by_publish_time_within_budget(concurrency):
+    # 只看放行顺序和预算：不限平台字节数，超时足够长
+    args = simulation_args(concurrency=concurrency, platform_max_mb=1024 * 1024, timeout=3600)
+    budget = int(args.uplink_mbps * MB / 8 // (args.min_rate_kbps * 1024))
+    peak = []
+
+    def on_tick(scheduler):
+        admitted = scheduler.stats()['admitted']
+        assert admitted <= budget
+        peak.append(admitted)
+
+    items = make_items(args.items, args.seed)
+    asyncio.run(simulate(items, args, True, on_tick=on_tick))
+
+    assert all(item.ok for item in items)
+    assert max(peak) == budget
+    # 并发名额先到先得，开始传输的顺序就是准入顺序；前 budget 个在队列形成前按提交顺序放行，
+    # 之后的发布项按发布时间先后
+    started = sorted(items, key=lambda item: (item.started_at, item.priority))
+    later = [item.priority for item in started[budget:]]
+    assert later == sorted(later)
+
+
+def test_simulation_measured_uplink_starts_with_initial_slots():
+    args = simulation_args(known_uplink=False)
+
+    def on_tick(scheduler):
+        if scheduler.samples == 0:
+            assert scheduler.stats()['admitted'] <= args.initial_slots
+
+    scheduled = make_items(args.items, args.seed)
+    asyncio.run(simulate(scheduled, args, True, on_tick=on_tick))
+    unscheduled = make_items(args.items, args.seed)
+    asyncio.run(simulate(unscheduled, args, False))
+
+    assert sum(item.ok for item in scheduled) > sum(item.ok for item in unscheduled)
+    assert inversions(scheduled) < inversions(unscheduled)
@@ -0,0 +1,70 @@
+"""
+myUtils/cookie_probe.py 的各平台探测结论：在本地桩服务（benchmarks/fake_cookie_api.py）上
+模拟已登录、登录过期和无法判断的接口响应。
+"""
+import json
+import socket
+
+import pytest
+
+from benchmarks.check_cookie_probe import EXPECTED, write_storage_state
+from benchmarks.fake_cookie_api import RESPONSES, SCENARIOS, FakeCookieApi
+from myUtils import cookie_probe
+
+PLATFORMS = sorted(cookie_probe.PROBES)
+
+
+@pytest.fixture(scope="module")
+def cookie_api():
+    with FakeCookieApi() as api:
+        yield api
+
+
+@pytest.fixture
+def probe_api(cookie_api, monkeypatch):
+    monkeypatch.setattr(cookie_probe, "COOKIE_PROBE_ENABLED", True)
+    monkeypatch.setattr(cookie_probe, "COOKIE_PROBE_BASE_URL", cookie_api.base_url)
+    cookie_api.requests.clear()
+    return cookie_api
+
+
+@pytest.mark.parametrize("scenario", ["valid", "expired", "unknown"])
+@pytest.mark.parametrize("platform", PLATFORMS)
+def test_judge(platform, scenario):
+    verdict = cookie_probe.PROBES[platform].judge(200, RESPONSES[platform][scenario])
+    assert verdict is EXPECTED[scenario]
+
+
+@pytest.mark.parametrize("data", [None, {}], ids=["non-json", "empty"])
+@pytest.mark.parametrize("platform", PLATFORMS)
+def test_judge_undecidable(platform, data):
+    assert cookie_probe.PROBES[platform].judge(200, data) is None
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("platform", PLATFORMS)
+def test_probe(probe_api, tmp_path, platform, scenario):
+    spec = cookie_probe.PROBES[platform]
+    account_file = write_storage_state(tmp_path, platform, scenario)
+
+    assert cookie_probe.probe_cookie_sync(platform, account_file) is EXPECTED[scenario]
+    assert probe_api.requests == [(platform, spec.method, spec.referer)]
+
+
+def test_probe_without_platform_cookies(probe_api, tmp_path):
+    account_file = tmp_path / "no-cookies.json"
+    account_file.write_text(json.dumps({"cookies": [], "origins": []}), encoding="utf-8")
+
+    assert cookie_probe.probe_cookie_sync("douyin", account_file) is None
+    assert probe_api.requests == []
+
+
+def test_probe_unreachable(monkeypatch, tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    monkeypatch.setattr(cookie_probe, "COOKIE_PROBE_ENABLED", True)
+    monkeypatch.setattr(cookie_probe, "COOKIE_PROBE_BASE_URL", base_url)
+    account_file = write_storage_state(tmp_path, "bilibili", "valid")
+
+    assert cookie_probe.probe_cookie_sync("bilibili", account_file) is None
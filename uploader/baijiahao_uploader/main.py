@@ -10,6 +10,7 @@ import asyncio
 from conf import LOCAL_CHROME_PATH
 from utils.base_social_media import set_init_script
 from utils.log import baijiahao_logger
+from utils.timing import StepTimer
 from utils.network import async_retry
 
 
@@ -77,6 +78,7 @@ class BaiJiaHaoVideo(object):
         self.date_format = '%Y年%m月%d日 %H:%M'
         self.local_executable_path = LOCAL_CHROME_PATH
         self.proxy_setting = proxy_setting
+        self.timer = StepTimer('baijiahao', baijiahao_logger)
 
     async def set_schedule_time(self, page, publish_date):
         """
@@ -143,14 +145,16 @@ class BaiJiaHaoVideo(object):
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
-        await page.goto("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
-        baijiahao_logger.info(f"正在上传-------{self.title}.mp4")
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        baijiahao_logger.info('正在打开主页...')
-        await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
+        with self.timer.step("goto"):
+            await page.goto("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
+            baijiahao_logger.info(f"正在上传-------{self.title}.mp4")
+            # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
+            baijiahao_logger.info('正在打开主页...')
+            await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
 
         # 点击 "上传视频" 按钮
-        await page.locator("div[class^='video-main-container'] input").set_input_files(self.file_path)
+        with self.timer.step("select_file"):
+            await page.locator("div[class^='video-main-container'] input").set_input_files(self.file_path)
 
         # 等待页面跳转到指定的 URL
         while True:
@@ -166,9 +170,11 @@ class BaiJiaHaoVideo(object):
         # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
         await asyncio.sleep(1)
         baijiahao_logger.info("正在填充标题和话题...")
-        await self.add_title_tags(page)
+        with self.timer.step("form"):
+            await self.add_title_tags(page)
 
-        upload_status = await self.uploading_video(page)
+        with self.timer.step("transfer"):
+            upload_status = await self.uploading_video(page)
         if not upload_status:
             baijiahao_logger.error(f"发现上传出错了... 文件:{self.file_path}")
             raise
@@ -183,12 +189,13 @@ class BaiJiaHaoVideo(object):
                 baijiahao_logger.info("等待封面生成...")
                 await asyncio.sleep(3)
 
-        await self.publish_video(page, self.publish_date)
-        await page.wait_for_timeout(2000)
-        if await page.locator('div.passMod_dialog-container >> text=百度安全验证:visible').count():
-            baijiahao_logger.error("出现验证，退出")
-            raise Exception("出现验证，退出")
-        await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/clue**", timeout=5000)
+        with self.timer.step("publish"):
+            await self.publish_video(page, self.publish_date)
+            await page.wait_for_timeout(2000)
+            if await page.locator('div.passMod_dialog-container >> text=百度安全验证:visible').count():
+                baijiahao_logger.error("出现验证，退出")
+                raise Exception("出现验证，退出")
+            await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/clue**", timeout=5000)
         baijiahao_logger.success("视频发布成功")
 
         await context.storage_state(path=self.account_file)  # 保存cookie
@@ -259,8 +266,13 @@ class BaiJiaHaoVideo(object):
         await title_container.fill(self.title[:30])
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        outcome = "failed"
+        try:
+            async with async_playwright() as playwright:
+                await self.upload(playwright)
+            outcome = "success"
+        finally:
+            self.timer.log_report(outcome)
 
 
 
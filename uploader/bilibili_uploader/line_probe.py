@@ -0,0 +1,236 @@
+"""
+B站上传线路探测与并发分片数估算。
+
+BILIBILI_UPLOAD_LINE=auto 时，UposUploader 申请上传地址前通过 LineProbe.choose() 选择线路：
+  - 依次测量每条候选线路：往返延迟（GET probe_url 若干次取最小值）、单连接速率（单独 POST 探测数据）
+    和总速率（多个连接同时 POST）
+  - 按分片大小和并发上限估算每条线路可达到的速率，最高的胜出，相差不到 10% 时取延迟低的
+  - 测量结果按网络（本机出口地址）缓存在 db/bilibili_lines.json，BILIBILI_LINE_CACHE_TTL_HOURS 内不再探测；
+    某条线路上传失败时清除它的结果，下次重新探测
+BILIBILI_UPLOAD_THREADS=0 时由 tune_threads() 根据探测结果和文件大小估算初始并发分片数，
+上传过程中仍由 upos.AdaptiveConcurrency 调整。
+
+benchmarks/bench_bilibili_upload.py 用本地模拟的 upos 服务离线对比固定线路/并发与自动选择的耗时。
+"""
+import json
+import math
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+from conf import BASE_DIR
+from uploader.bilibili_uploader.upos import BILIBILI_UPLOAD_MAX_THREADS, LINES
+from utils import log
+
+LINE_CACHE_FILE = Path(BASE_DIR / "db" / "bilibili_lines.json")
+
+# 线路探测结果的缓存时间（小时）
+BILIBILI_LINE_CACHE_TTL_HOURS = float(os.getenv('BILIBILI_LINE_CACHE_TTL_HOURS', '6'))
+# 每条线路并发 POST 的探测连接数和每个连接的数据量（KB）
+BILIBILI_PROBE_STREAMS = int(os.getenv('BILIBILI_PROBE_STREAMS', '4'))
+BILIBILI_PROBE_KB = int(os.getenv('BILIBILI_PROBE_KB', '512'))
+# 无法估算时的初始并发分片数
+DEFAULT_THREADS = 3
+# 选择线路时（申请上传地址之前）假定的分片大小
+DEFAULT_CHUNK_SIZE = 10 * 1024 * 1024
+
+# 同一进程内的多个上传共用一次探测
+_probe_lock = threading.Lock()
+
+
+@dataclass
+class LineSample:
+    line: str
+    latency: float = 0.0          # 秒
+    stream_rate: float = 0.0      # 单连接速率（字节/秒）
+    aggregate_rate: float = 0.0   # 多连接并发时的总速率（字节/秒）
+    streams: int = 1
+    probed_at: float = 0.0
+    failed: bool = False
+
+    def fresh(self, ttl: float) -> bool:
+        return time.time() - self.probed_at < ttl
+
+    @property
+    def capacity(self) -> float:
+        """
+        线路总带宽。并发探测的总速率明显低于 单连接速率 × 连接数 时说明已经测到了线路上限；
+        否则瓶颈在单连接，更多并发还能更快，视为不受限。
+        """
+        if self.aggregate_rate < 0.8 * self.streams * self.stream_rate:
+            return self.aggregate_rate
+        return math.inf
+
+    def chunk_rate(self, chunk_size: int) -> float:
+        """单个连接连续上传分片的有效速率：每个分片耗时 = 延迟 + 分片大小 / 单连接速率。"""
+        return chunk_size / (self.latency + chunk_size / self.stream_rate)
+
+    def expected_rate(self, chunk_size: int, max_threads: int) -> float:
+        return min(self.capacity, max_threads * self.chunk_rate(chunk_size))
+
+
+def tune_threads(size: int, chunk_size: int, sample: LineSample | None, minimum: int = 1,
+                 maximum: int = BILIBILI_UPLOAD_MAX_THREADS) -> int:
+    """
+    估算填满线路需要的并发分片数：线路总带宽 / 单个连接的有效分片速率，
+    不超过分片总数和 maximum（总带宽未测出上限时直接取 maximum）。
+    """
+    chunks = max(1, math.ceil(size / max(chunk_size, 1)))
+    if sample is None or sample.failed or sample.stream_rate <= 0 or sample.aggregate_rate <= 0:
+        threads = DEFAULT_THREADS
+    elif math.isinf(sample.capacity):
+        threads = maximum
+    else:
+        threads = math.ceil(sample.capacity / sample.chunk_rate(chunk_size))
+    return max(minimum, min(threads, maximum, chunks))
+
+
+class LineProbe:
+    def __init__(self, lines: dict = LINES, scheme: str = 'https', cache_file: Path | None = LINE_CACHE_FILE,
+                 ttl_hours: float = BILIBILI_LINE_CACHE_TTL_HOURS, streams: int = BILIBILI_PROBE_STREAMS,
+                 payload_kb: int = BILIBILI_PROBE_KB, pings: int = 3, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_threads: int = BILIBILI_UPLOAD_MAX_THREADS, logger=None):
+        self.lines = lines
+        self.scheme = scheme
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.ttl = ttl_hours * 3600
+        self.streams = max(1, streams)
+        self.payload = bytes(payload_kb * 1024)
+        self.pings = max(1, pings)
+        self.chunk_size = chunk_size
+        self.max_threads = max_threads
+        self.logger = logger
+        self.session = requests.Session()
+
+    # ------------------------------------------------------------ 公共接口
+
+    def choose(self) -> LineSample | None:
+        """返回当前网络下最快的线路；全部线路都探测失败时返回 None（使用默认线路）。"""
+        with _probe_lock:
+            samples = self._samples(list(self.lines))
+        usable = [sample for sample in samples if not sample.failed]
+        if not usable:
+            return None
+        rates = {sample.line: sample.expected_rate(self.chunk_size, self.max_threads) for sample in usable}
+        best_rate = max(rates.values())
+        candidates = [sample for sample in usable if rates[sample.line] >= best_rate * 0.9]
+        return min(candidates, key=lambda sample: sample.latency)
+
+    def sample(self, line: str) -> LineSample | None:
+        """单条线路的测量结果（缓存过期时只探测这一条），用于固定线路时估算并发数。"""
+        with _probe_lock:
+            sample = self._samples([line])[0]
+        return None if sample.failed else sample
+
+    def forget(self, line: str) -> None:
+        """线路上传失败：清除它在当前网络下的结果。"""
+        with _probe_lock:
+            cache = self._read_cache()
+            entry = cache.get(self.network_key(), {})
+            if entry.pop(line, None) is not None:
+                self._write_cache(cache)
+
+    def network_key(self) -> str:
+        """
+        本机访问探测地址时使用的出口地址，用来区分网络（切换 Wi-Fi / 有线 / 代理后重新探测）。
+        UDP connect 只做路由选择，不会发出数据包。
+        """
+        first = next(iter(self.lines.values()))
+        host = urlsplit(f"{self.scheme}:{first['probe_url']}").hostname
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect((host, 80))
+                return s.getsockname()[0]
+        except OSError:
+            return 'default'
+
+    def probe_line(self, line: str) -> LineSample:
+        url = f"{self.scheme}:{self.lines[line]['probe_url']}"
+        try:
+            latency = float('inf')
+            for _ in range(self.pings):
+                started = time.perf_counter()
+                self.session.get(url, timeout=5).raise_for_status()
+                latency = min(latency, time.perf_counter() - started)
+            # 单连接速率：单独 POST 一次，扣除一次往返延迟
+            started = time.perf_counter()
+            self.session.post(url, data=self.payload, timeout=30).raise_for_status()
+            stream_rate = len(self.payload) / max(time.perf_counter() - started - latency, 1e-3)
+
+            barrier = threading.Barrier(self.streams)
+
+            def post() -> tuple[float, float]:
+                # 每个连接先用 GET 建好连接（TCP / TLS 握手不计入），再同时开始 POST
+                with requests.Session() as session:
+                    try:
+                        session.get(url, timeout=5).raise_for_status()
+                    except requests.RequestException:
+                        barrier.abort()
+                        raise
+                    barrier.wait(timeout=30)
+                    started = time.perf_counter()
+                    session.post(url, data=self.payload, timeout=30).raise_for_status()
+                    return started, time.perf_counter()
+
+            with ThreadPoolExecutor(max_workers=self.streams, thread_name_prefix='line-probe') as executor:
+                spans = list(executor.map(lambda _: post(), range(self.streams)))
+        except (requests.RequestException, threading.BrokenBarrierError) as e:
+            self._log(f"[upos] 线路 {line} 探测失败: {e}")
+            return LineSample(line, probed_at=time.time(), failed=True)
+        size = len(self.payload)
+        # 总速率：所有连接同时 POST 的整体耗时，同样扣除一次往返延迟
+        wall = max(end for _, end in spans) - min(start for start, _ in spans)
+        aggregate_rate = min(size * self.streams / max(wall - latency, 1e-3), stream_rate * self.streams)
+        sample = LineSample(line, latency, stream_rate, aggregate_rate, self.streams, time.time())
+        self._log(f"[upos] 线路 {line}: 延迟 {latency * 1000:.0f}ms, 单连接 {stream_rate / 1024 / 1024:.2f}MB/s, "
+                  f"{self.streams} 连接 {sample.aggregate_rate / 1024 / 1024:.2f}MB/s")
+        return sample
+
+    # ------------------------------------------------------------ 内部实现
+
+    def _samples(self, lines: list[str]) -> list[LineSample]:
+        """读取缓存，过期或缺少的线路逐条探测（不并行，避免互相抢占带宽）后写回。"""
+        cache = self._read_cache()
+        key = self.network_key()
+        entry = cache.setdefault(key, {})
+        samples, changed = [], False
+        for line in lines:
+            try:
+                sample = LineSample(**entry[line])
+            except (KeyError, TypeError):
+                sample = None
+            if sample is None or not sample.fresh(self.ttl):
+                sample = self.probe_line(line)
+                entry[line] = asdict(sample)
+                changed = True
+            samples.append(sample)
+        if changed:
+            self._write_cache(cache)
+        return samples
+
+    def _read_cache(self) -> dict:
+        if self.cache_file is None:
+            return self.__dict__.setdefault('_memory', {})
+        try:
+            return json.loads(self.cache_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache: dict) -> None:
+        if self.cache_file is None:
+            self._memory = cache
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp, self.cache_file)
+
+    def _log(self, message: str) -> None:
+        (self.logger or log.bilibili_logger).info(message)
@@ -3,21 +3,23 @@ import pathlib
 import random
 from biliup.plugins.bili_webup import BiliBili, Data
 
+from uploader.bilibili_uploader.upos import BILIBILI_UPLOAD_LINE, BILIBILI_UPLOAD_THREADS, UposUploader
 from utils.log import bilibili_logger
 
 
 def extract_keys_from_json(data):
-    """Extract specified keys from the provided JSON data."""
+    """Extract specified keys from biliup's cookie JSON or a Playwright storage_state file."""
     keys_to_extract = ["SESSDATA", "bili_jct", "DedeUserID__ckMd5", "DedeUserID", "access_token"]
     extracted_data = {}
 
-    # Extracting cookie data
-    for cookie in data['cookie_info']['cookies']:
+    # Extracting cookie data（storage_state 的 cookies 在顶层）
+    cookies = data['cookie_info']['cookies'] if 'cookie_info' in data else data.get('cookies', [])
+    for cookie in cookies:
         if cookie['name'] in keys_to_extract:
             extracted_data[cookie['name']] = cookie['value']
 
-    # Extracting access_token
-    if "access_token" in data['token_info']:
+    # Extracting access_token（只有 biliup 登录生成的文件才有）
+    if "access_token" in data.get('token_info', {}):
         extracted_data['access_token'] = data['token_info']['access_token']
 
     return extracted_data
@@ -41,9 +43,10 @@ def random_emoji():
 
 class BilibiliUploader(object):
     def __init__(self, cookie_data, file: pathlib.Path, title, desc, tid, tags, dtime):
-        self.upload_thread_num = 3
+        # 初始并发分片数和上传线路（0 / auto 时由 line_probe 探测决定），并发数在上传过程中按吞吐自适应
+        self.upload_thread_num = BILIBILI_UPLOAD_THREADS
         self.copyright = 1
-        self.lines = 'AUTO'
+        self.lines = BILIBILI_UPLOAD_LINE
         self.cookie_data = cookie_data
         self.file = file
         self.title = title
@@ -52,6 +55,7 @@ class BilibiliUploader(object):
         self.tags = tags
         self.dtime = dtime
         self._init_data()
+        self.upos = UposUploader(cookie_data, line=self.lines, threads=self.upload_thread_num, logger=bilibili_logger)
 
     def _init_data(self):
         self.data = Data()
@@ -62,18 +66,29 @@ class BilibiliUploader(object):
         self.data.set_tag(self.tags)
         self.data.dtime = self.dtime
 
-    def upload(self):
+    def upload_video(self) -> dict:
+        """分片上传视频文件（支持断点续传），返回分P信息。"""
+        return self.upos.upload(self.file)
+
+    def submit(self, video_part: dict) -> bool:
         with BiliBili(self.data) as bili:
             bili.login_by_cookies(self.cookie_data)
             bili.access_token = self.cookie_data.get('access_token')
-            video_part = bili.upload_file(str(self.file), lines=self.lines,
-                                          tasks=self.upload_thread_num)  # 上传视频，默认线路AUTO自动选择，线程数量3。
             video_part['title'] = self.title
             self.data.append(video_part)
-            ret = bili.submit()  # 提交视频
+            # 没有 access_token（由网页登录的 storage_state 转换而来）时只能走网页端投稿接口
+            try:
+                ret = bili.submit(submit_api='client' if bili.access_token else 'web')  # 提交视频
+            except Exception as e:
+                # 新版 biliup 投稿失败时直接抛出异常
+                bilibili_logger.error(f'[-] {self.file.name}上传 失败, error messge: {e}')
+                return False
             if ret.get('code') == 0:
                 bilibili_logger.success(f'[+] {self.file.name}上传 成功')
                 return True
             else:
                 bilibili_logger.error(f'[-] {self.file.name}上传 失败, error messge: {ret.get("message")}')
                 return False
+
+    def upload(self):
+        return self.submit(self.upload_video())
@@ -4,15 +4,27 @@ from datetime import datetime
 from pathlib import Path
 import time
 
-from playwright.async_api import Playwright
-
 from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script, launch_chromium_with_codecs
+from utils.browser_pool import get_browser_pool, use_browser_pool
 from utils.log import bilibili_logger
+from utils.timing import StepTimer
+from utils.upload_pipeline import UploadPipeline
+from utils.waiters import DOM_POLL_INTERVAL_MS, ResponseSignal, wait_for_upload
 
 
 OPEN_DEBUG_BROWSERS: list = []
 
+# upos 分片传完后的合并请求（带 uploadId 和 biz_id），返回 {"OK": 1}
+UPLOAD_DONE_RESPONSES = [ResponseSignal(r"upos.*\.bilivideo\.com/.*[?&]uploadId=.*[?&]biz_id=", method="POST",
+                                        check=lambda body: isinstance(body, dict) and body.get("OK") == 1)]
+# 状态文本显示"上传完成"且不再有上传中/速度/剩余时间等文案
+UPLOAD_DONE_FUNCTION = """() => {
+    const el = document.querySelector('#video-up-app .file-item-content-status-text');
+    if (!el) return false;
+    const text = el.textContent || '';
+    return text.includes('上传完成') && !/上传中|当前速度|剩余时间/.test(text);
+}"""
+
 
 class BilibiliVideo:
     def __init__(
@@ -75,20 +87,24 @@ class BilibiliVideo:
                         bilibili_logger.info(f"[bilibili] 标签输入框已滚动到可见位置: {selector}")
                     except Exception:
                         pass
-                    # 聚焦输入框并先清空已有内容（长按删除 + 选择删除 双保险）
+                    tag_input = page.locator(selector).first
+                    # 聚焦输入框并先清空已有内容（删除已有标签）
                     try:
-                        await page.locator(selector).first.click()
-                        await asyncio.sleep(0.2)
+                        await tag_input.click()
                         for _ in range(10):
                             await page.keyboard.press('Backspace')
-                            await asyncio.sleep(0.02)
                         bilibili_logger.info("[bilibili] 已清空标签输入框")
                     except Exception as e:
                         bilibili_logger.warning(f"[bilibili] 清空标签输入框失败: {e}")
                     for tag in self.tags:
-                        await page.locator(selector).first.type(tag)
+                        await tag_input.type(tag)
                         await page.keyboard.press("Enter")
-                        await asyncio.sleep(0.5)
+                        # 回车后标签创建成功，输入框会被清空
+                        try:
+                            await page.wait_for_function("el => el.value === ''", arg=await tag_input.element_handle(),
+                                                         polling=DOM_POLL_INTERVAL_MS, timeout=3000)
+                        except Exception:
+                            bilibili_logger.warning(f"[bilibili] 标签 {tag} 未确认创建")
                         bilibili_logger.info(f"[bilibili] 标签已填写: {tag}")
                     return
                 bilibili_logger.warning(f"[bilibili] 未能找到标签输入框: {selector}")
@@ -187,7 +203,10 @@ class BilibiliVideo:
                 return
             
             # 等待下拉菜单展开
-            await page.wait_for_timeout(500)
+            try:
+                await container.locator('.select-dropdown').first.wait_for(state='visible', timeout=3000)
+            except Exception:
+                bilibili_logger.warning("[bilibili] 分区下拉菜单未在 3 秒内展开")
             
             # 2. 选择指定的分区选项
             # 使用多种选择器尝试匹配分区
@@ -243,7 +262,6 @@ class BilibiliVideo:
                     if await page.locator(selector).count():
                         await page.locator(selector).first.click()
                         bilibili_logger.info(f"[bilibili] 定时发布开关已点击: {selector}")
-                        await page.wait_for_timeout(500)  # 等待界面展开
                         switch_clicked = True
                         break
                 except Exception as e:
@@ -252,6 +270,11 @@ class BilibiliVideo:
             if not switch_clicked:
                 bilibili_logger.warning("[bilibili] 未能点击定时发布开关")
                 return
+            # 等待时间选择器展开
+            try:
+                await page.locator('.date-picker-date .date-show, .date-picker-timer').first.wait_for(state='visible', timeout=3000)
+            except Exception:
+                bilibili_logger.warning("[bilibili] 定时发布时间选择器未在 3 秒内展开")
             
             # 2. 处理发布时间
             from datetime import datetime as _dt
@@ -281,13 +304,15 @@ class BilibiliVideo:
                 tz_opener = container.locator('.date-picker-timezone-wrp .bcc-select-input-wrap').first
                 if await tz_opener.count():
                     await tz_opener.click()
-                    await asyncio.sleep(0.2)
                     # 选择含 Beijing 的项
                     tz_option = container.locator('.bcc-select-list-wrap .bcc-option:has-text("Beijing")').first
-                    if await tz_option.count():
-                        await tz_option.click()
-                        bilibili_logger.info('[bilibili] 已设置时区为 Beijing')
-                        await asyncio.sleep(0.2)
+                    await tz_option.wait_for(state='visible', timeout=3000)
+                    await tz_option.click()
+                    bilibili_logger.info('[bilibili] 已设置时区为 Beijing')
+                    try:
+                        await tz_option.wait_for(state='hidden', timeout=3000)
+                    except Exception:
+                        pass
             except Exception as e:
                 bilibili_logger.warning(f"[bilibili] 设置时区失败: {e}")
 
@@ -303,7 +328,6 @@ class BilibiliVideo:
                 for selector in date_selectors:
                     if await page.locator(selector).count():
                         await page.locator(selector).first.click()
-                        await page.wait_for_timeout(300)
                         # 这里可能需要进一步的日期选择逻辑，但B站通常有默认的日期
                         bilibili_logger.info(f"[bilibili] 日期选择器已点击: {selector}")
                         break
@@ -322,7 +346,6 @@ class BilibiliVideo:
                 for selector in time_selectors:
                     if await page.locator(selector).count():
                         await page.locator(selector).first.click()
-                        await page.wait_for_timeout(300)
                         # 这里可能需要进一步的时间选择逻辑
                         bilibili_logger.info(f"[bilibili] 时间选择器已点击: {selector}")
                         break
@@ -357,97 +380,41 @@ class BilibiliVideo:
             bilibili_logger.warning(f"[bilibili] 定时发布设置失败: {e}")
 
     async def _dismiss_unsubmitted_prompt(self, page) -> None:
-        """轮询几次，如果存在“未提交的视频”提示则点击“不用了”。避免瞬时出现被错过。"""
+        """如果出现“未提交的视频”提示则点击“不用了”。提示可能在页面加载后稍晚出现，最多等待 3 秒。"""
+        tip = page.locator('.upload-wrp .entrance-tip').first
         try:
-            # 最长轮询 ~3 秒（10 次，每次 300ms）
-            for _ in range(10):
-                try:
-                    tip = page.locator('.upload-wrp .entrance-tip').first
-                    if await tip.count():
-                        bilibili_logger.info('[bilibili] 检测到未提交视频提示，尝试关闭')
-                        candidates = [
-                            '.upload-wrp .entrance-tip .entrance-tip-btn[data-reporter-id="32"]',
-                            '.upload-wrp .entrance-tip .entrance-tip-btn:has-text("不用了")',
-                            'text=不用了',
-                        ]
-                        clicked = False
-                        for sel in candidates:
-                            try:
-                                btn = page.locator(sel).first
-                                if await btn.count():
-                                    await btn.scroll_into_view_if_needed()
-                                    await btn.click()
-                                    bilibili_logger.info(f"[bilibili] 已点击‘不用了’: {sel}")
-                                    clicked = True
-                                    break
-                            except Exception:
-                                continue
-                        if clicked:
-                            # 给页面一点时间收起提示
-                            await asyncio.sleep(0.3)
-                            return
-                except Exception:
-                    pass
-                await asyncio.sleep(0.3)
-        except Exception as e:
-            bilibili_logger.warning(f"[bilibili] 关闭未提交提示失败: {e}")
+            await tip.wait_for(state='visible', timeout=3000)
+        except Exception:
+            return
+        bilibili_logger.info('[bilibili] 检测到未提交视频提示，尝试关闭')
+        candidates = [
+            '.upload-wrp .entrance-tip .entrance-tip-btn[data-reporter-id="32"]',
+            '.upload-wrp .entrance-tip .entrance-tip-btn:has-text("不用了")',
+            'text=不用了',
+        ]
+        for sel in candidates:
+            try:
+                btn = page.locator(sel).first
+                if await btn.count():
+                    await btn.click()
+                    bilibili_logger.info(f"[bilibili] 已点击‘不用了’: {sel}")
+                    # 等待提示收起
+                    await tip.wait_for(state='hidden', timeout=3000)
+                    return
+            except Exception as e:
+                bilibili_logger.warning(f"[bilibili] 关闭未提交提示失败 {sel}: {e}")
 
     async def _wait_upload_complete(self, page) -> None:
         bilibili_logger.info("[bilibili] 等待视频上传完成...")
-        
-        # 轮询检测上传完成状态（要求完成状态稳定出现多次，避免误判）
-        success_stable_ticks = 0
-        container = page.locator('#video-up-app').first
-        
-        for i in range(180):  # 最多轮询 ~3 分钟
-            try:
-                # 读取状态容器文本（若有）
-                status_text = None
-                try:
-                    if await container.locator('.file-item-content-status-text').first.count():
-                        status_text = (await container.locator('.file-item-content-status-text').first.inner_text() or '').strip()
-                except Exception:
-                    status_text = None
-
-                # 1) 判断是否仍在上传中
-                in_progress = False
-                # 文案信号
-                if status_text and any(key in status_text for key in ("上传中", "当前速度", "剩余时间")):
-                    in_progress = True
-
-                # 2) 判断是否上传完成（结合容器文本/图标/百分比）
-                success_found = False
-                # 图标/文本标识
-                if await container.locator('.file-item-content-status-text .success:has-text("上传完成")').count():
-                    success_found = True
-                elif status_text and ("上传完成" in status_text):
-                    success_found = True
-
-                # 稳定判定：需非上传中且连续3次检测到完成
-                bilibili_logger.info(f"[bilibili] success_found: {success_found}, in_progress: {in_progress}")
-                if success_found and not in_progress:
-                    success_stable_ticks += 1
-                    if success_stable_ticks >= 3:
-                        bilibili_logger.info("[bilibili] 上传完成状态稳定，继续后续流程")
-                        return
-                else:
-                    success_stable_ticks = 0
-
-                # 每3秒打印一次当前状态
-                if i % 3 == 0:
-                    if status_text:
-                        bilibili_logger.info(f"[bilibili] 上传状态: {status_text}")
-                    else:
-                        # 回退打印部分结构存在性
-                        exists = await container.locator('.upload-audit-progress').count()
-                        bilibili_logger.info(f"[bilibili] 仍在等待上传完成... ({i}秒) progress_container={exists>0}")
-
-            except Exception as e:
-                bilibili_logger.warning(f"[bilibili] 检测上传状态时出错: {e}")
-            
-            await asyncio.sleep(1)
-        
-        bilibili_logger.warning("[bilibili] 上传完成检测超时（3分钟）")
+        # upos 合并请求成功，或状态文本变为"上传完成"，任一先到即继续后续流程
+        await wait_for_upload(
+            page,
+            platform="bilibili",
+            responses=UPLOAD_DONE_RESPONSES,
+            function=UPLOAD_DONE_FUNCTION,
+            failure_selectors=['#video-up-app .file-item-content-status-text:has-text("上传失败")'],
+            logger=bilibili_logger,
+        )
 
     async def _click_publish(self, page) -> None:
         # 基于实际B站页面的发布按钮选择器
@@ -462,13 +429,9 @@ class BilibiliVideo:
             try:
                 if await page.locator(selector).count():
                     bilibili_logger.info(f"[bilibili] 找到发布按钮: {selector}")
-                    await page.locator(selector).scroll_into_view_if_needed()
-                    await page.wait_for_timeout(1000)  # 等待元素稳定
+                    # click 会自动等待元素可见、稳定、可点击
                     await page.locator(selector).click()
                     bilibili_logger.info(f"[bilibili] 成功点击发布按钮: {selector}")
-                    
-                    # 等待一下看是否有提交反应
-                    await page.wait_for_timeout(1000)
                     return
             except Exception as e:
                 bilibili_logger.warning(f"[bilibili] 发布按钮选择器失败 {selector}: {e}")
@@ -545,88 +508,86 @@ class BilibiliVideo:
         bilibili_logger.warning("[bilibili] 发布结果检测超时（60秒）")
         return False
 
-    async def upload(self, playwright: Playwright) -> None:
-        browser = await launch_chromium_with_codecs(
-            playwright,
-            headless=False,
-            executable_path=self.local_executable_path,
-        )
-        context = await browser.new_context(
+    async def upload(self) -> bool:
+        pool = get_browser_pool(headless=False)
+        async with pool.context(
+            trace="bilibili",
             storage_state=str(self.account_file),
             permissions=[],
             geolocation=None,
             locale='zh-CN',
             timezone_id='Asia/Shanghai',
-        )
-        context = await set_init_script(context)
-        page = await context.new_page()
+        ) as context:
+            page = await context.new_page()
+            timer = StepTimer("bilibili", bilibili_logger)
 
-        bilibili_logger.info("[bilibili] goto upload page")
-        # 打开B站创作中心上传页（优先带 page_from 参数）
-        try:
-            await page.goto(
-                "https://member.bilibili.com/platform/upload/video/frame?page_from=creative_home_top_upload",
-                timeout=15000,
-            )
-        except Exception:
-            try:
-                await page.goto("https://member.bilibili.com/platform/upload/video/frame", timeout=15000)
-            except Exception:
-                # 回退到旧地址
-                await page.goto("https://member.bilibili.com/platform/upload/video", timeout=20000)
+            bilibili_logger.info("[bilibili] goto upload page")
+            # 打开B站创作中心上传页（优先带 page_from 参数）
+            with timer.step("goto"):
+                try:
+                    await page.goto(
+                        "https://member.bilibili.com/platform/upload/video/frame?page_from=creative_home_top_upload",
+                        timeout=15000,
+                    )
+                except Exception:
+                    try:
+                        await page.goto("https://member.bilibili.com/platform/upload/video/frame", timeout=15000)
+                    except Exception:
+                        # 回退到旧地址
+                        await page.goto("https://member.bilibili.com/platform/upload/video", timeout=20000)
+
+            bilibili_logger.info("[bilibili] wait page ready")
+
+            # 若存在“未提交的视频”提示，优先关闭
+            with timer.step("dismiss_prompt"):
+                await self._dismiss_unsubmitted_prompt(page)
+
+            # 选择视频上传输入框（第一个，接受视频格式的）
+            video_input_selector = 'input[type="file"][accept*=".mp4"]'
+            with timer.step("select_file"):
+                await page.locator(video_input_selector).first.set_input_files(self.file_path)
+            bilibili_logger.info(f"[bilibili] 视频文件已设置: {self.file_path}")
+
+            # 选择文件后表单即出现，标题/类型/分区/标签/简介/定时与上传同时进行
+            async def transfer() -> None:
+                bilibili_logger.info("[bilibili] wait upload complete")
+                await self._wait_upload_complete(page)
+
+            async def fill_form() -> None:
+                with timer.step("form_ready"):
+                    await page.locator('input[placeholder*="标题"]').first.wait_for(state='visible', timeout=30000)
+                with timer.step("title"):
+                    await self._fill_title(page)
+                with timer.step("type"):
+                    await self._set_type(page)
+                with timer.step("partition"):
+                    await self._set_partition(page)
+                with timer.step("tags"):
+                    await self._fill_tags(page)
+                with timer.step("desc"):
+                    await self._fill_desc(page)
+                with timer.step("schedule"):
+                    await self._set_schedule(page)
+
+            async def publish() -> bool:
+                bilibili_logger.info("[bilibili] click publish")
+                await self._click_publish(page)
+                # 等待发布结果
+                return await self._wait_publish_result(page)
+
+            publish_success = await UploadPipeline("bilibili", bilibili_logger, timer).run(transfer, fill_form, publish)
+
+            if publish_success:
+                bilibili_logger.info("[bilibili] 视频发布成功！")
+            else:
+                bilibili_logger.error("[bilibili] 视频发布失败或超时")
 
-        bilibili_logger.info("[bilibili] wait page ready")
-        
-        # 若存在“未提交的视频”提示，优先关闭
-        await self._dismiss_unsubmitted_prompt(page)
-
-        # 选择视频上传输入框（第一个，接受视频格式的）
-        video_input_selector = 'input[type="file"][accept*=".mp4"]'
-        await page.locator(video_input_selector).first.set_input_files(self.file_path)
-        bilibili_logger.info(f"[bilibili] 视频文件已设置: {self.file_path}")
-
-        bilibili_logger.info("[bilibili] wait upload complete")
-        # 等待上传完成或稳定
-        await self._wait_upload_complete(page)
-
-        await asyncio.sleep(1)
-        await self._fill_title(page)
-        await asyncio.sleep(1)
-        await self._set_type(page)
-        await asyncio.sleep(1)
-        await self._set_partition(page)
-        await asyncio.sleep(1)
-        await self._fill_tags(page)
-        await asyncio.sleep(1)
-        await self._fill_desc(page)
-        await asyncio.sleep(1)
-        await self._set_schedule(page)
-
-        # 等待300秒再发布（用户观察和确认）
-        bilibili_logger.info("[bilibili] waiting n seconds before publish...")
-        await asyncio.sleep(3)
-        
-        # 发布
-        bilibili_logger.info("[bilibili] click publish")
-        await self._click_publish(page)
-        
-        # 等待发布结果
-        publish_success = await self._wait_publish_result(page)
-        
-        if publish_success:
-            bilibili_logger.info("[bilibili] 视频发布成功！")
-        else:
-            bilibili_logger.error("[bilibili] 视频发布失败或超时")
-
-        # 保存cookie
-        await context.storage_state(path=str(self.account_file))
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+            # 保存cookie
+            await context.storage_state(path=str(self.account_file))
+            return publish_success
         
     async def main(self) -> None:
-        from playwright.async_api import async_playwright
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with use_browser_pool(headless=False):
+            await self.upload()
 
 
@@ -0,0 +1,158 @@
+"""
+B站发布入口：优先走 HTTP 分片上传（BilibiliUploader + upos），Playwright 页面上传（BilibiliVideo）只作兜底。
+
+HTTP 上传不需要浏览器，断点续传、自适应并发，占用的内存和时间都远小于页面上传。以下情况直接走 Playwright：
+  - BILIBILI_HTTP_UPLOAD=0，或没有安装 biliup
+  - 转载类型（需要填写来源）、分区无法对应到 tid、cookie 中缺少 SESSDATA / bili_jct
+HTTP 上传失败时同样回退到 Playwright；投稿请求发出后无论结果如何都不再回退，避免重复发布。
+"""
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+
+from uploader.bilibili_uploader.playwright_main import BilibiliVideo
+from utils import bandwidth
+from utils.browser_pool import use_browser_pool
+from utils.constant import VideoZoneTypes
+from utils.log import bilibili_logger
+from utils.timing import StepTimer
+
+# 是否优先使用 HTTP 上传
+BILIBILI_HTTP_UPLOAD = os.getenv('BILIBILI_HTTP_UPLOAD', '1').lower() not in ('0', 'false', 'no')
+# 未选择分区时使用的 tid（默认 生活）
+BILIBILI_DEFAULT_TID = int(os.getenv('BILIBILI_DEFAULT_TID', str(VideoZoneTypes.LIFE.value)))
+
+# 前端分区名称 -> tid；没有对应 tid 的分区（如 人工智能、小剧场）走 Playwright 按名称选择
+PARTITION_TIDS = {
+    '影视': VideoZoneTypes.CINEPHILE.value,
+    '娱乐': VideoZoneTypes.ENT.value,
+    '音乐': VideoZoneTypes.MUSIC.value,
+    '舞蹈': VideoZoneTypes.DANCE.value,
+    '动画': VideoZoneTypes.DOUGA.value,
+    '绘画': VideoZoneTypes.LIFE_PAINTING.value,
+    '鬼畜': VideoZoneTypes.KICHIKU.value,
+    '游戏': VideoZoneTypes.GAME.value,
+    '资讯': VideoZoneTypes.INFORMATION.value,
+    '知识': VideoZoneTypes.KNOWLEDGE.value,
+    '科技数码': VideoZoneTypes.TECH.value,
+    '汽车': VideoZoneTypes.CAR.value,
+    '时尚美妆': VideoZoneTypes.FASHION.value,
+    '家装房产': VideoZoneTypes.LIFE_HOME.value,
+    '健身': VideoZoneTypes.SPORTS_AEROBICS.value,
+    '体育运动': VideoZoneTypes.SPORTS.value,
+    '手工': VideoZoneTypes.LIFE_HANDMAKE.value,
+    '美食': VideoZoneTypes.FOOD.value,
+    '旅游出行': VideoZoneTypes.LIFE_TRAVEL.value,
+    '三农': VideoZoneTypes.LIFE_RURALLIFE.value,
+    '动物': VideoZoneTypes.ANIMAL.value,
+    '生活兴趣': VideoZoneTypes.LIFE.value,
+    '生活经验': VideoZoneTypes.LIFE.value,
+}
+
+
+def partition_tid(partition: str) -> int | None:
+    partition = (partition or '').strip()
+    if not partition:
+        return BILIBILI_DEFAULT_TID
+    if partition.isdigit():
+        return int(partition)
+    return PARTITION_TIDS.get(partition)
+
+
+def load_cookie_data(account_file) -> dict:
+    """把账号文件（Playwright storage_state 或 biliup 登录生成的 JSON）转换为 biliup 使用的 cookie 字典。"""
+    from uploader.bilibili_uploader.main import extract_keys_from_json, read_cookie_json_file
+
+    return extract_keys_from_json(read_cookie_json_file(Path(account_file)))
+
+
+class BilibiliPublisher:
+    """构造参数与 BilibiliVideo 相同，发布注册表中 B站的上传器。"""
+
+    def __init__(self, title: str, file_path: str, tags: list[str], publish_date: datetime | int, account_file: Path,
+                 thumbnail_path: str | None = None, desc: str | None = None, bili_type: str | None = None,
+                 partition: str | None = None) -> None:
+        self.title = title
+        self.file_path = file_path
+        self.tags = tags
+        self.publish_date = publish_date
+        self.account_file = account_file
+        self.desc = desc or ""
+        self.bili_type = (bili_type or "自制").strip()
+        self.partition = (partition or "").strip()
+        self._submitting = False
+        self.fallback = BilibiliVideo(title, file_path, tags, publish_date, account_file, thumbnail_path,
+                                      desc=desc, bili_type=bili_type, partition=partition)
+
+    def _http_unsupported_reason(self, cookie_data: dict) -> str | None:
+        if self.bili_type != "自制":
+            return f"类型 {self.bili_type} 需要在页面中填写来源"
+        if partition_tid(self.partition) is None:
+            return f"分区 {self.partition} 没有对应的 tid"
+        if not cookie_data.get('SESSDATA') or not cookie_data.get('bili_jct'):
+            return "cookie 中缺少 SESSDATA / bili_jct"
+        return None
+
+    async def upload_http(self) -> bool:
+        from uploader.bilibili_uploader.main import BilibiliUploader
+
+        cookie_data = await asyncio.to_thread(load_cookie_data, self.account_file)
+        reason = self._http_unsupported_reason(cookie_data)
+        if reason:
+            raise NotImplementedError(reason)
+        dtime = int(self.publish_date.timestamp()) if isinstance(self.publish_date, datetime) else int(self.publish_date or 0)
+        uploader = BilibiliUploader(cookie_data, Path(self.file_path), self.title, self.desc,
+                                    partition_tid(self.partition), list(self.tags or []), dtime)
+        timer = StepTimer("bilibili_http", bilibili_logger)
+        outcome = "failed"
+        try:
+            with timer.step("preupload"):
+                state = await asyncio.to_thread(uploader.upos.prepare, uploader.file)
+            with timer.step("transfer"):
+                bandwidth.transfer_started()
+                transferred = False
+                try:
+                    state = await asyncio.to_thread(uploader.upos.transfer, state)
+                    transferred = True
+                finally:
+                    if transferred:
+                        bandwidth.transfer_finished()
+                    else:
+                        # 回退到页面上传会在同一个名额下重新传输，这次的时长不计入速率测量
+                        bandwidth.transfer_failed()
+            with timer.step("complete"):
+                video_part = await asyncio.to_thread(uploader.upos.complete, state)
+            with timer.step("submit"):
+                # 投稿请求发出后不再回退到页面上传：结果不明确时宁可失败，也不重复发布
+                self._submitting = True
+                published = await asyncio.to_thread(uploader.submit, video_part)
+            outcome = "success" if published else "failed"
+            return published
+        finally:
+            timer.log_report(outcome)
+
+    async def upload(self) -> bool:
+        if BILIBILI_HTTP_UPLOAD:
+            try:
+                if await self.upload_http():
+                    return True
+                if self._submitting:
+                    # 投稿接口返回失败（或 submit 吞掉了异常）：视频可能已经提交，不再重复发布
+                    bilibili_logger.error("[bilibili] HTTP 投稿未成功，不再改用页面上传")
+                    return False
+                bilibili_logger.warning("[bilibili] HTTP 投稿未成功，改用页面上传")
+            except ImportError as e:
+                bilibili_logger.warning(f"[bilibili] 未安装 biliup，使用页面上传: {e}")
+            except NotImplementedError as e:
+                bilibili_logger.info(f"[bilibili] {e}，使用页面上传")
+            except Exception as e:
+                if self._submitting:
+                    bilibili_logger.error(f"[bilibili] HTTP 投稿结果未知，不再改用页面上传: {e}")
+                    return False
+                bilibili_logger.warning(f"[bilibili] HTTP 上传失败，改用页面上传: {e}")
+        return await self.fallback.upload()
+
+    async def main(self) -> None:
+        async with use_browser_pool(headless=False):
+            await self.upload()
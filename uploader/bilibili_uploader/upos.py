@@ -0,0 +1,340 @@
+"""
+B站 upos 分片上传（HTTP，不经过浏览器）。
+
+流程与 biliup 的 BiliBili.upload_file 相同：preupload 取得上传地址和分片大小 -> 初始化 upload_id ->
+并发 PUT 各分片 -> 提交分片列表合并，但有两点不同：
+  - 并发数按实测吞吐自适应：每完成一批分片比较吞吐，提升明显则加一个线程，下降则减一个，分片失败时减半
+  - 断点续传：上传状态（upload_id、上传地址、已完成的分片）保存在 db/bilibili_uploads/，
+    中断后（进程退出、任务重试）在 BILIBILI_RESUME_TTL_HOURS 内重新上传同一文件时只补传缺少的分片
+线路为 auto、并发数为 0 时由 line_probe 按探测结果选择线路、估算初始并发数。
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import requests
+
+from conf import BASE_DIR
+
+PREUPLOAD_URL = 'https://member.bilibili.com/preupload'
+# 上传线路 -> preupload 查询参数与探测地址（与 biliup 的线路表一致）
+LINES = {
+    'bda2': {'query': 'upcdn=bda2&probe_version=20221109', 'probe_url': '//upos-cs-upcdnbda2.bilivideo.com/OK'},
+    'bldsa': {'query': 'upcdn=bldsa&probe_version=20221109', 'probe_url': '//upos-cs-upcdnbldsa.bilivideo.com/OK'},
+    'qn': {'query': 'upcdn=qn&probe_version=20221109', 'probe_url': '//upos-cs-upcdnqn.bilivideo.com/OK'},
+    'ws': {'query': 'upcdn=ws&probe_version=20221109', 'probe_url': '//upos-cs-upcdnws.bilivideo.com/OK'},
+    'tx': {'query': 'upcdn=tx&probe_version=20221109', 'probe_url': '//upos-cs-upcdntx.bilivideo.com/OK'},
+}
+RESUME_DIR = Path(BASE_DIR / "db" / "bilibili_uploads")
+
+# 上传线路，auto 表示探测后选择最快的线路
+BILIBILI_UPLOAD_LINE = os.getenv('BILIBILI_UPLOAD_LINE', 'auto')
+# 初始并发分片数（0 表示按线路探测结果和文件大小估算）和自适应的上限
+BILIBILI_UPLOAD_THREADS = int(os.getenv('BILIBILI_UPLOAD_THREADS', '0'))
+BILIBILI_UPLOAD_MAX_THREADS = int(os.getenv('BILIBILI_UPLOAD_MAX_THREADS', '8'))
+# 单个分片的重试次数
+BILIBILI_CHUNK_RETRIES = int(os.getenv('BILIBILI_CHUNK_RETRIES', '3'))
+# 断点续传状态的有效期（小时），超过后重新申请上传地址
+BILIBILI_RESUME_TTL_HOURS = float(os.getenv('BILIBILI_RESUME_TTL_HOURS', '12'))
+
+
+class UposError(Exception):
+    """preupload / 初始化 / 合并返回了错误，或分片重试后仍失败。"""
+
+
+@dataclass
+class UploadState:
+    file: str
+    size: int
+    mtime: float
+    line: str
+    upos_uri: str
+    auth: str
+    endpoint: str
+    biz_id: int
+    chunk_size: int
+    upload_id: str
+    created_at: float
+    done: list = field(default_factory=list)
+
+    @property
+    def chunks(self) -> int:
+        return max(1, math.ceil(self.size / self.chunk_size))
+
+
+class AdaptiveConcurrency:
+    """
+    按吞吐调整并发分片数（爬山法）：每完成 window 个分片（默认为当前并发数）计算一次这段时间的吞吐，
+    比上一段高出 step_ratio 时沿当前方向再调一步，低出 step_ratio 时反向，变化不明显时保持；分片重试时减半。
+    """
+
+    def __init__(self, initial: int = 3, minimum: int = 1,
+                 maximum: int = BILIBILI_UPLOAD_MAX_THREADS, window: int | None = None, step_ratio: float = 0.1):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.window = window
+        self.step_ratio = step_ratio
+        self.history: list[tuple[int, float]] = []
+        self._bytes = 0
+        self._count = 0
+        self._started = time.perf_counter()
+        self._last_rate: float | None = None
+        self._direction = 1
+
+    def on_success(self, nbytes: int) -> None:
+        self._bytes += nbytes
+        self._count += 1
+        if self._count < (self.window or self.limit):
+            return
+        rate = self._bytes / max(time.perf_counter() - self._started, 1e-6)
+        self.history.append((self.limit, rate))
+        if self._last_rate is None or rate > self._last_rate * (1 + self.step_ratio):
+            # 首次测量或吞吐明显提升：沿当前方向继续调整
+            move = self._direction
+        elif rate < self._last_rate * (1 - self.step_ratio):
+            # 吞吐下降：反向调整
+            self._direction = -self._direction
+            move = self._direction
+        else:
+            move = 0
+        self.limit = min(max(self.limit + move, self.minimum), self.maximum)
+        self._last_rate = rate
+        self._bytes = 0
+        self._count = 0
+        self._started = time.perf_counter()
+
+    def on_error(self) -> None:
+        self.limit = max(self.minimum, self.limit // 2)
+        self._direction = 1
+        self._last_rate = None
+        self._bytes = 0
+        self._count = 0
+        self._started = time.perf_counter()
+
+
+class UposUploader:
+    def __init__(self, cookies: dict, line: str = BILIBILI_UPLOAD_LINE, threads: int = BILIBILI_UPLOAD_THREADS,
+                 max_threads: int = BILIBILI_UPLOAD_MAX_THREADS, scheme: str = 'https',
+                 preupload_url: str = PREUPLOAD_URL, resume_dir: Path = RESUME_DIR, lines: dict = LINES,
+                 probe=None, logger=None):
+        if line != 'auto' and line not in lines:
+            raise ValueError(f"unknown upload line: {line}")
+        self.line = line
+        self.lines = lines
+        # line_probe.LineProbe，线路为 auto 或并发数为 0 时才创建
+        self.probe = probe
+        self.threads = threads
+        self.max_threads = max_threads
+        self.scheme = scheme
+        self.preupload_url = preupload_url
+        self.resume_dir = Path(resume_dir)
+        self.logger = logger
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                                              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+        self.session.headers['Referer'] = 'https://member.bilibili.com/'
+        self.session.cookies.update({k: v for k, v in cookies.items() if k != 'access_token'})
+        self.account = str(cookies.get('DedeUserID', ''))
+        self.concurrency: AdaptiveConcurrency | None = None
+        # 最近一次 prepare() 是否复用了保存的续传状态
+        self.resumed = False
+        # 最近一次 prepare() 使用的线路的探测结果
+        self.sample = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------ 公共接口
+
+    def upload(self, file) -> dict:
+        """上传整个文件，返回 biliup Data.append 使用的分P信息。"""
+        state = self.transfer(self.prepare(file))
+        return self.complete(state)
+
+    def prepare(self, file) -> UploadState:
+        """取得上传会话：同一账号、同一文件（大小和修改时间未变）且未过期时复用保存的状态。"""
+        file = Path(file)
+        state = self._load_state(file)
+        self.resumed = state is not None
+        if state is not None:
+            self._log(f"[upos] 续传 {file.name}: 已完成 {len(state.done)}/{state.chunks} 个分片")
+            self.sample = self._get_probe().sample(state.line) if not self.threads else None
+            return state
+        line = self._choose_line()
+        stat = file.stat()
+        resp = self.session.get(f"{self.preupload_url}?{self.lines[line]['query']}", params={
+            'name': file.name, 'size': stat.st_size, 'r': 'upos', 'profile': 'ugcupos/bup',
+            'ssl': 0, 'version': '2.14.0', 'build': 2140000,
+        }, timeout=15)
+        ret = resp.json()
+        if ret.get('OK') != 1:
+            raise UposError(f"preupload failed: {ret}")
+        state = UploadState(str(file.resolve()), stat.st_size, stat.st_mtime, line, ret['upos_uri'], ret['auth'],
+                            ret['endpoint'], ret['biz_id'], int(ret['chunk_size']), '', time.time())
+        init = self.session.post(f"{self._url(state)}?uploads&output=json", headers=self._headers(state),
+                                 timeout=15).json()
+        if not init.get('upload_id'):
+            raise UposError(f"init upload failed: {init}")
+        state.upload_id = init['upload_id']
+        self._save_state(state)
+        return state
+
+    def transfer(self, state: UploadState) -> UploadState:
+        """
+        并发上传缺少的分片，每个分片完成后立即写入续传状态；返回最终使用的状态。
+        续传的上传会话已失效（分片被拒绝）时丢弃状态，重新申请上传地址后整体重传一次。
+        """
+        try:
+            self._transfer(state)
+            return state
+        except UposError as e:
+            if self.probe is not None:
+                # 线路的测量结果可能已经不准，下次重新探测
+                self.probe.forget(state.line)
+            if not self.resumed:
+                raise
+            self._log(f"[upos] 续传失败，重新上传: {e}")
+            self.discard(state)
+            state = self.prepare(state.file)
+            self._transfer(state)
+            return state
+
+    def _transfer(self, state: UploadState) -> None:
+        pending = [index for index in range(state.chunks) if index not in set(state.done)]
+        initial = self.threads
+        if not initial:
+            from uploader.bilibili_uploader.line_probe import tune_threads
+
+            initial = tune_threads(state.size, state.chunk_size, self.sample, maximum=self.max_threads)
+            self._log(f"[upos] 线路 {state.line} 初始并发分片数 {initial}")
+        self.concurrency = AdaptiveConcurrency(min(initial, self.max_threads), maximum=self.max_threads)
+        with ThreadPoolExecutor(max_workers=self.concurrency.maximum, thread_name_prefix='upos') as executor:
+            running = {}
+            while pending or running:
+                while pending and len(running) < self.concurrency.limit:
+                    index = pending.pop(0)
+                    running[executor.submit(self._put_chunk, state, index)] = index
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = running.pop(future)
+                    try:
+                        nbytes, retried = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    if retried:
+                        self.concurrency.on_error()
+                    self.concurrency.on_success(nbytes)
+                    with self._lock:
+                        state.done.append(index)
+                        self._save_state(state)
+        self._log(f"[upos] 并发调整记录: {[(limit, round(rate / 1024 / 1024, 2)) for limit, rate in self.concurrency.history]}")
+
+    def complete(self, state: UploadState) -> dict:
+        """合并分片；成功后删除续传状态。"""
+        name = Path(state.file).name
+        parts = [{"partNumber": index + 1, "eTag": "etag"} for index in range(state.chunks)]
+        ret = self.session.post(self._url(state), params={
+            'name': name, 'uploadId': state.upload_id, 'biz_id': state.biz_id, 'output': 'json',
+            'profile': 'ugcupos/bup',
+        }, data=json.dumps({"parts": parts}), headers=self._headers(state), timeout=30).json()
+        if ret.get('OK') != 1:
+            raise UposError(f"complete upload failed: {ret}")
+        self.discard(state)
+        return {"title": Path(name).stem, "filename": Path(state.upos_uri).stem, "desc": ""}
+
+    def discard(self, state: UploadState) -> None:
+        self._state_path(Path(state.file)).unlink(missing_ok=True)
+
+    # ------------------------------------------------------------ 内部实现
+
+    def _get_probe(self):
+        if self.probe is None:
+            from uploader.bilibili_uploader.line_probe import LineProbe
+
+            self.probe = LineProbe(self.lines, self.scheme, max_threads=self.max_threads, logger=self.logger)
+        return self.probe
+
+    def _choose_line(self) -> str:
+        """确定本次上传的线路，并在需要估算并发数时取得该线路的探测结果。"""
+        self.sample = None
+        if self.line != 'auto':
+            if not self.threads:
+                self.sample = self._get_probe().sample(self.line)
+            return self.line
+        self.sample = self._get_probe().choose()
+        if self.sample is None:
+            line = next(iter(self.lines))
+            self._log(f"[upos] 所有线路探测失败，使用 {line}")
+            return line
+        self._log(f"[upos] 自动选择线路 {self.sample.line}")
+        return self.sample.line
+
+    def _url(self, state: UploadState) -> str:
+        return f"{self.scheme}:{state.endpoint}/{state.upos_uri.replace('upos://', '')}"
+
+    @staticmethod
+    def _headers(state: UploadState) -> dict:
+        return {"X-Upos-Auth": state.auth}
+
+    def _put_chunk(self, state: UploadState, index: int) -> tuple[int, bool]:
+        start = index * state.chunk_size
+        size = min(state.chunk_size, state.size - start)
+        with open(state.file, 'rb') as f:
+            f.seek(start)
+            data = f.read(size)
+        params = {
+            'partNumber': index + 1, 'uploadId': state.upload_id, 'chunk': index, 'chunks': state.chunks,
+            'size': size, 'start': start, 'end': start + size, 'total': state.size,
+        }
+        for attempt in range(BILIBILI_CHUNK_RETRIES + 1):
+            try:
+                resp = self.session.put(self._url(state), params=params, data=data, headers=self._headers(state),
+                                        timeout=max(30, size / (64 * 1024)))
+                resp.raise_for_status()
+                return size, attempt > 0
+            except requests.RequestException as e:
+                status = getattr(e.response, 'status_code', None)
+                # 4xx（限流和超时除外）说明上传会话无效，重试没有意义
+                if status is not None and 400 <= status < 500 and status not in (408, 429):
+                    raise UposError(f"chunk {index} rejected with HTTP {status}") from e
+                if attempt >= BILIBILI_CHUNK_RETRIES:
+                    raise UposError(f"chunk {index} failed after {attempt + 1} attempts: {e}") from e
+                time.sleep(min(2 ** attempt, 10))
+
+    def _state_path(self, file: Path) -> Path:
+        key = hashlib.sha1(f"{self.account}|{Path(file).resolve()}".encode()).hexdigest()[:16]
+        return self.resume_dir / f"{key}.json"
+
+    def _load_state(self, file: Path) -> UploadState | None:
+        path = self._state_path(file)
+        try:
+            state = UploadState(**json.loads(path.read_text(encoding='utf-8')))
+            stat = file.stat()
+        except (OSError, ValueError, TypeError):
+            return None
+        fresh = time.time() - state.created_at < BILIBILI_RESUME_TTL_HOURS * 3600
+        line_matches = state.line == self.line or (self.line == 'auto' and state.line in self.lines)
+        if fresh and state.size == stat.st_size and state.mtime == stat.st_mtime and line_matches:
+            return state
+        path.unlink(missing_ok=True)
+        return None
+
+    def _save_state(self, state: UploadState) -> None:
+        path = self._state_path(Path(state.file))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(asdict(state)), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def _log(self, message: str) -> None:
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
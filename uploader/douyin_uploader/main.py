@@ -2,13 +2,21 @@
 from datetime import datetime
 from time import sleep
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import async_playwright, Page
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script, launch_chromium_with_codecs
-from utils.log import douyin_logger, DOUYIN_SCREENSHOT_DIR
+from utils.base_social_media import set_init_script
+from utils.browser_pool import get_browser_pool, use_browser_pool
+from utils.log import douyin_logger
+from utils.timing import StepTimer
+from utils.upload_pipeline import UploadPipeline
+from utils.diagnostics import DiagnosticsRecorder
+from utils.waiters import ResponseSignal, WaitDeadline, wait_for_upload
+
+# 视频分片全部传完后，页面调用 VOD 的 CommitUploadInner 确认上传
+UPLOAD_DONE_RESPONSES = [ResponseSignal(r"[?&]Action=CommitUploadInner", method="POST")]
 
 
 async def cookie_auth(account_file):
@@ -77,6 +85,7 @@ class DouYinVideo(object):
         self.tags = tags
         self.publish_date = publish_date
         self.account_file = account_file
+        self.diagnostics = DiagnosticsRecorder('douyin')
         self.date_format = '%Y年%m月%d日 %H:%M'
         self.local_executable_path = LOCAL_CHROME_PATH
         self.thumbnail_path = thumbnail_path
@@ -101,99 +110,98 @@ class DouYinVideo(object):
         douyin_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        browser = await launch_chromium_with_codecs(playwright, headless=False, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(
+    async def upload(self) -> None:
+        # 从常驻浏览器池中获取独立的浏览器上下文，使用指定的 cookie 文件
+        pool = get_browser_pool(headless=False)
+        async with pool.context(
+            trace="douyin",
             storage_state=f"{self.account_file}",
             permissions=[],  # 禁用所有权限请求
             geolocation=None,  # 禁用地理位置
             locale='zh-CN',  # 设置语言为中文
             timezone_id='Asia/Shanghai'  # 设置时区
-        )
-        context = await set_init_script(context)
-
-        # 创建一个新的页面
-        page = await context.new_page()
-
-        try:
-            await page.goto("https://creator.douyin.com/creator-micro/content/post/video?enter_from=publish_page", timeout=3000)
-            douyin_logger.info("[+] 成功进入version_2发布页面!")
-        except Exception as e:
-            douyin_logger.error(f"  [-] 超时未进入视频发布页面，cookies过期或者其他原因，重新尝试...{e}")
-
-        await page.locator("div[class^='upload-card'] input[type=file]").set_input_files(self.file_path)  #上传视频
-        douyin_logger.info(f'[+]正在上传-------{self.title}.mp4')
-        await asyncio.sleep(1)
-
-        await page.locator("div[class^='container-'] input[type=text]").first.fill(self.title[:30])
-        douyin_logger.info(f'  [-] 正在填充标题...')
-        await asyncio.sleep(1)
-
-        css_selector = ".zone-container"
-        for _, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await page.press(css_selector, "Space")
-            await asyncio.sleep(0.5)
-        douyin_logger.info(f'总共添加{len(self.tags)}个话题')
-
-        while True:
-            # 判断重新上传按钮是否存在，如果不存在，代表视频正在上传，则等待
-            try:
-                #  新版：定位重新上传
-                number = await page.locator('[class^="long-card"] div:has-text("重新上传")').count()
-                if number > 0:
-                    douyin_logger.success("  [-]视频上传完毕")
-                    break
-                else:
-                    douyin_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-
-                    if await page.locator('div.progress-div > div:has-text("上传失败")').count():
-                        douyin_logger.error("  [-] 发现上传出错了... 准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                douyin_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
-        
-        #上传视频封面
-        await self.set_thumbnail(page, self.thumbnail_path)
-
-        # # 頭條/西瓜
-        # third_part_element = '[class^="info"] > [class^="first-part"] div div.semi-switch'
-        # # 定位是否有第三方平台
-        # if await page.locator(third_part_element).count():
-        #     # 检测是否是已选中状态
-        #     if 'semi-switch-checked' not in await page.eval_on_selector(third_part_element, 'div => div.className'):
-        #         await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
-
-        # if self.publish_date != 0:
-        #     await self.set_schedule_time_douyin(page, self.publish_date)
-
-        # 判断视频是否发布成功
-        while True:
-            # 判断视频是否发布成功
-            try:
-                publish_button = page.get_by_role('button', name="发布", exact=True)
-                if await publish_button.count():
-                    await publish_button.click()
-                await page.wait_for_url("https://creator.douyin.com/creator-micro/content/manage**",
-                                        timeout=3000)  # 如果自动跳转到作品页面，则代表发布成功
-                douyin_logger.success("  [-]视频发布成功")
-                break
-            except:
-                douyin_logger.info("  [-] 视频正在发布中...")
-                screenshot_path = os.path.join(DOUYIN_SCREENSHOT_DIR, f"douyin_{int(asyncio.get_event_loop().time()*1000)}.png")
-                await page.screenshot(path=screenshot_path, full_page=True)
-                await asyncio.sleep(0.5)
-
-        await context.storage_state(path=self.account_file)  # 保存cookie
-        douyin_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+        ) as context:
+            # 创建一个新的页面
+            page = await context.new_page()
+            timer = StepTimer("douyin", douyin_logger)
+
+            with timer.step("goto"):
+                try:
+                    await page.goto("https://creator.douyin.com/creator-micro/content/post/video?enter_from=publish_page", timeout=3000)
+                    douyin_logger.info("[+] 成功进入version_2发布页面!")
+                except Exception as e:
+                    douyin_logger.error(f"  [-] 超时未进入视频发布页面，cookies过期或者其他原因，重新尝试...{e}")
+
+            with timer.step("select_file"):
+                await page.locator("div[class^='upload-card'] input[type=file]").set_input_files(self.file_path)  #上传视频
+            douyin_logger.info(f'[+]正在上传-------{self.title}.mp4')
+
+            async def transfer():
+                # 等待上传完成：VOD 提交接口返回或出现"重新上传"按钮，出现"上传失败"则重新上传
+                await wait_for_upload(
+                    page,
+                    platform="douyin",
+                    responses=UPLOAD_DONE_RESPONSES,
+                    selectors=['[class^="long-card"] div:has-text("重新上传")'],
+                    failure_selectors=['div.progress-div > div:has-text("上传失败")'],
+                    on_failure=self.handle_upload_error,
+                    logger=douyin_logger,
+                )
+                douyin_logger.success("  [-]视频上传完毕")
+
+            async def fill_form():
+                title_input = page.locator("div[class^='container-'] input[type=text]").first
+                await title_input.wait_for(state='visible')
+                await title_input.fill(self.title[:30])
+                douyin_logger.info(f'  [-] 正在填充标题...')
+
+                css_selector = ".zone-container"
+                for _, tag in enumerate(self.tags, start=1):
+                    await page.type(css_selector, "#" + tag)
+                    await page.press(css_selector, "Space")
+                    await asyncio.sleep(0.5)
+                douyin_logger.info(f'总共添加{len(self.tags)}个话题')
+
+            async def publish():
+                #上传视频封面
+                await self.set_thumbnail(page, self.thumbnail_path)
+
+                # # 頭條/西瓜
+                # third_part_element = '[class^="info"] > [class^="first-part"] div div.semi-switch'
+                # # 定位是否有第三方平台
+                # if await page.locator(third_part_element).count():
+                #     # 检测是否是已选中状态
+                #     if 'semi-switch-checked' not in await page.eval_on_selector(third_part_element, 'div => div.className'):
+                #         await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
+
+                # if self.publish_date != 0:
+                #     await self.set_schedule_time_douyin(page, self.publish_date)
+
+                # 判断视频是否发布成功，超过 PUBLISH_WAIT_TIMEOUT 仍未跳转按失败处理
+                deadline = WaitDeadline("douyin", "publish", signal="url content/manage")
+                while True:
+                    # 判断视频是否发布成功
+                    try:
+                        publish_button = page.get_by_role('button', name="发布", exact=True)
+                        if await publish_button.count():
+                            await publish_button.click()
+                        await page.wait_for_url("https://creator.douyin.com/creator-micro/content/manage**",
+                                                timeout=3000)  # 如果自动跳转到作品页面，则代表发布成功
+                        douyin_logger.success("  [-]视频发布成功")
+                        break
+                    except Exception:
+                        douyin_logger.info("  [-] 视频正在发布中...")
+                        # 只在内存中保留最近几帧，发布失败时才落盘（utils/diagnostics.py）
+                        await self.diagnostics.capture(page, 'publishing')
+                        deadline.check()
+                        await asyncio.sleep(0.5)
+
+            # 标题、话题与视频传输并行，二者都完成后再设置封面并发布
+            await UploadPipeline("douyin", douyin_logger, timer).run(transfer, fill_form, publish)
+
+            await context.storage_state(path=self.account_file)  # 保存cookie
+            douyin_logger.success('  [-]cookie更新完毕！')
+            await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
     
     async def set_thumbnail(self, page: Page, thumbnail_path: str):
         if thumbnail_path:
@@ -232,7 +240,7 @@ class DouYinVideo(object):
         await page.locator('div[role="listbox"] [role="option"]').first.click()
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with use_browser_pool(headless=False):
+            await self.upload()
 
 
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
 from utils.base_social_media import set_init_script
+from utils.browser_pool import get_browser_pool, use_browser_pool
 from utils.files_times import get_absolute_path
-from utils.log import kuaishou_logger, KUAISHOU_SCREENSHOT_DIR
+from utils.log import kuaishou_logger
+from utils.timing import StepTimer
+from utils.upload_pipeline import UploadPipeline
+from utils.diagnostics import DiagnosticsRecorder
+from utils.waiters import ResponseSignal, WaitDeadline, wait_for_upload
+
+# 分片传完后先在上传域名 complete 合并，再由创作者中心 upload/finish 确认
+UPLOAD_DONE_RESPONSES = [ResponseSignal(r"/api/upload/complete|/video/pc/upload/finish")]
 
 
 async def cookie_auth(account_file):
@@ -73,6 +81,7 @@ class KSVideo(object):
         self.tags = tags
         self.publish_date = publish_date
         self.account_file = account_file
+        self.diagnostics = DiagnosticsRecorder('kuaishou')
         self.date_format = '%Y-%m-%d %H:%M'
         self.local_executable_path = LOCAL_CHROME_PATH
 
@@ -80,133 +89,121 @@ class KSVideo(object):
         kuaishou_logger.error("视频出错了，重新上传中")
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        print(self.local_executable_path)
-        if self.local_executable_path and self.local_executable_path.strip():
-            browser = await playwright.chromium.launch(
-                headless=False,
-                executable_path=self.local_executable_path,
-            )
-        else:
-            browser = await playwright.chromium.launch(
-                headless=False
-            )  # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(
+    async def upload(self) -> None:
+        # 从常驻浏览器池中获取独立的浏览器上下文，使用指定的 cookie 文件
+        pool = get_browser_pool(headless=False)
+        async with pool.context(
+            trace="kuaishou",
             storage_state=f"{self.account_file}",
             permissions=[],  # 禁用所有权限请求
             geolocation=None,  # 禁用地理位置
             locale='zh-CN',  # 设置语言为中文
             timezone_id='Asia/Shanghai'  # 设置时区
-        )
-        context = await set_init_script(context)
-        # 创建一个新的页面
-        page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://cp.kuaishou.com/article/publish/video")
-        kuaishou_logger.info('正在上传-------{}.mp4'.format(self.title))
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        kuaishou_logger.info('正在打开主页...')
-        await page.wait_for_url("https://cp.kuaishou.com/article/publish/video")
-        # 点击 "上传视频" 按钮
-        upload_button = page.locator("button[class^='_upload-btn']")
-        await upload_button.wait_for(state='visible')  # 确保按钮可见
-
-        async with page.expect_file_chooser() as fc_info:
-            await upload_button.click()
-        file_chooser = await fc_info.value
-        await file_chooser.set_files(self.file_path)
-
-        await asyncio.sleep(2)
-
-        # if not await page.get_by_text("封面编辑").count():
-        #     raise Exception("似乎没有跳转到到编辑页面")
-
-        await asyncio.sleep(1)
-
-        # 等待按钮可交互
-        new_feature_button = page.locator('button[type="button"] span:text("我知道了")')
-        if await new_feature_button.count() > 0:
-            await new_feature_button.click()
-
-        kuaishou_logger.info("正在填充标题和话题...")
-        await page.get_by_text("描述").locator("xpath=following-sibling::div").click()
-        kuaishou_logger.info("clear existing title")
-        await page.keyboard.press("Backspace")
-        await page.keyboard.press("Control+KeyA")
-        await page.keyboard.press("Delete")
-        kuaishou_logger.info("filling new  title")
-        await page.keyboard.type(self.title)
-        await page.keyboard.press("Enter")
-
-        # 快手只能添加3个话题
-        for index, tag in enumerate(self.tags[:3], start=1):
-            kuaishou_logger.info("正在添加第%s个话题" % index)
-            await page.keyboard.type(f"#{tag} ")
-            await asyncio.sleep(2)
-
-        max_retries = 60  # 设置最大重试次数,最大等待时间为 2 分钟
-        retry_count = 0
-
-        while retry_count < max_retries:
-            try:
-                # 获取包含 '上传中' 文本的元素数量
-                number = await page.locator("text=上传中").count()
-
-                if number == 0:
-                    kuaishou_logger.success("视频上传完毕")
-                    break
-                else:
-                    if retry_count % 5 == 0:
-                        kuaishou_logger.info("正在上传视频中...")
-                    await asyncio.sleep(2)
-            except Exception as e:
-                kuaishou_logger.error(f"检查上传状态时发生错误: {e}")
-                await asyncio.sleep(2)  # 等待 2 秒后重试
-            retry_count += 1
-
-        if retry_count == max_retries:
-            kuaishou_logger.warning("超过最大重试次数，视频上传可能未完成。")
-
-        # 定时任务
-        if self.publish_date != 0:
-            await self.set_schedule_time(page, self.publish_date)
-
-        # 判断视频是否发布成功
-        while True:
-            try:
-                publish_button = page.get_by_text("发布", exact=True)
-                if await publish_button.count() > 0:
-                    await publish_button.click()
-
-                await asyncio.sleep(1)
-                confirm_button = page.get_by_text("确认发布")
-                if await confirm_button.count() > 0:
-                    await confirm_button.click()
-
-                # 等待页面跳转，确认发布成功
-                await page.wait_for_url(
-                    "https://cp.kuaishou.com/article/manage/video?status=2&from=publish",
-                    timeout=5000,
+        ) as context:
+            # 创建一个新的页面
+            page = await context.new_page()
+            timer = StepTimer("kuaishou", kuaishou_logger)
+            # 访问指定的 URL
+            with timer.step("goto"):
+                await page.goto("https://cp.kuaishou.com/article/publish/video")
+                kuaishou_logger.info('正在上传-------{}.mp4'.format(self.title))
+                # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
+                kuaishou_logger.info('正在打开主页...')
+                await page.wait_for_url("https://cp.kuaishou.com/article/publish/video")
+            # 点击 "上传视频" 按钮
+            with timer.step("select_file"):
+                upload_button = page.locator("button[class^='_upload-btn']")
+                await upload_button.wait_for(state='visible')  # 确保按钮可见
+
+                async with page.expect_file_chooser() as fc_info:
+                    await upload_button.click()
+                file_chooser = await fc_info.value
+                await file_chooser.set_files(self.file_path)
+
+            # if not await page.get_by_text("封面编辑").count():
+            #     raise Exception("似乎没有跳转到到编辑页面")
+
+            # 选择文件后跳转到编辑页，"描述"输入区出现即可开始填写
+            desc_editor = page.get_by_text("描述").locator("xpath=following-sibling::div")
+
+            async def transfer():
+                # 编辑页渲染后上传进度才会出现，先等编辑页再判断 '上传中' 是否消失
+                await desc_editor.wait_for(state='visible')
+                # 等待上传完成：确认接口返回，或页面上 '上传中' 文案消失
+                await wait_for_upload(
+                    page,
+                    platform="kuaishou",
+                    responses=UPLOAD_DONE_RESPONSES,
+                    selectors=[("text=上传中", "detached")],
+                    logger=kuaishou_logger,
                 )
-                kuaishou_logger.success("视频发布成功")
-                break
-            except Exception as e:
-                kuaishou_logger.info(f"视频正在发布中... 错误: {e}")
-                screenshot_path = os.path.join(KUAISHOU_SCREENSHOT_DIR, f"ks_{int(asyncio.get_event_loop().time()*1000)}.png")
-                await page.screenshot(path=screenshot_path, full_page=True)
-                await asyncio.sleep(1)
-
-        await context.storage_state(path=self.account_file)  # 保存cookie
-        kuaishou_logger.info('cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+                kuaishou_logger.success("视频上传完毕")
+
+            async def fill_form():
+                await desc_editor.wait_for(state='visible')
+                # 等待按钮可交互
+                new_feature_button = page.locator('button[type="button"] span:text("我知道了")')
+                if await new_feature_button.count() > 0:
+                    await new_feature_button.click()
+
+                kuaishou_logger.info("正在填充标题和话题...")
+                await desc_editor.click()
+                kuaishou_logger.info("clear existing title")
+                await page.keyboard.press("Backspace")
+                await page.keyboard.press("Control+KeyA")
+                await page.keyboard.press("Delete")
+                kuaishou_logger.info("filling new  title")
+                await page.keyboard.type(self.title)
+                await page.keyboard.press("Enter")
+
+                # 快手只能添加3个话题
+                for index, tag in enumerate(self.tags[:3], start=1):
+                    kuaishou_logger.info("正在添加第%s个话题" % index)
+                    await page.keyboard.type(f"#{tag} ")
+                    await asyncio.sleep(2)
+
+                # 定时任务
+                if self.publish_date != 0:
+                    await self.set_schedule_time(page, self.publish_date)
+
+            async def publish():
+                # 判断视频是否发布成功，超过 PUBLISH_WAIT_TIMEOUT 仍未跳转按失败处理
+                deadline = WaitDeadline("kuaishou", "publish", signal="url article/manage/video")
+                while True:
+                    try:
+                        publish_button = page.get_by_text("发布", exact=True)
+                        if await publish_button.count() > 0:
+                            await publish_button.click()
+
+                        await asyncio.sleep(1)
+                        confirm_button = page.get_by_text("确认发布")
+                        if await confirm_button.count() > 0:
+                            await confirm_button.click()
+
+                        # 等待页面跳转，确认发布成功
+                        await page.wait_for_url(
+                            "https://cp.kuaishou.com/article/manage/video?status=2&from=publish",
+                            timeout=5000,
+                        )
+                        kuaishou_logger.success("视频发布成功")
+                        break
+                    except Exception as e:
+                        kuaishou_logger.info(f"视频正在发布中... 错误: {e}")
+                        # 只在内存中保留最近几帧，发布失败时才落盘（utils/diagnostics.py）
+                        await self.diagnostics.capture(page, 'publishing')
+                        deadline.check()
+                        await asyncio.sleep(1)
+
+            # 标题、话题、定时与视频传输并行，二者都完成后再点击发布
+            await UploadPipeline("kuaishou", kuaishou_logger, timer).run(transfer, fill_form, publish)
+
+            await context.storage_state(path=self.account_file)  # 保存cookie
+            kuaishou_logger.info('cookie更新完毕！')
+            await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with use_browser_pool(headless=False):
+            await self.upload()
 
     async def set_schedule_time(self, page, publish_date):
         kuaishou_logger.info("click schedule")
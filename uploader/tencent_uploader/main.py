@@ -1,14 +1,26 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
 from utils.base_social_media import set_init_script, launch_chromium_with_codecs
+from utils.browser_pool import get_browser_pool, use_browser_pool
 from utils.files_times import get_absolute_path
 from utils.log import tencent_logger
+from utils.timing import StepTimer
+from utils.upload_pipeline import UploadPipeline
+from utils.waiters import ResponseSignal, WaitDeadline, wait_for_upload
+
+# 分片全部传完后调用 completepartuploaddfs 合并
+UPLOAD_DONE_RESPONSES = [ResponseSignal(r"/completepartuploaddfs")]
+# "发表"按钮变为可用即代表视频上传、转码完毕
+PUBLISH_ENABLED_FUNCTION = """() => {
+    const button = [...document.querySelectorAll('button')].find(b => b.textContent.trim() === '发表');
+    return !!button && !button.className.includes('weui-desktop-btn_disabled');
+}"""
 
 
 def format_str_for_short_title(origin_title: str) -> str:
@@ -131,52 +143,52 @@ class TencentVideo(object):
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用系统浏览器优先，避免 H.264 错误
-        browser = await launch_chromium_with_codecs(playwright, headless=False, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(
+    async def upload(self) -> None:
+        # 从常驻浏览器池（系统浏览器优先，避免 H.264 错误）中获取独立的上下文，使用指定的 cookie 文件
+        pool = get_browser_pool(headless=False)
+        async with pool.context(
+            trace="tencent",
             storage_state=f"{self.account_file}",
             permissions=[],  # 禁用所有权限请求
             geolocation=None,  # 禁用地理位置
             locale='zh-CN',  # 设置语言为中文
             timezone_id='Asia/Shanghai'  # 设置时区
-        )
-        context = await set_init_script(context)
-
-        # 创建一个新的页面
-        page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://channels.weixin.qq.com/platform/post/create")
-        tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
-        # await page.wait_for_selector('input[type="file"]', timeout=10000)
-        file_input = page.locator('input[type="file"]')
-        await file_input.set_input_files(self.file_path)
-        # 填充标题和话题
-        await self.add_title_tags(page)
-        # 添加商品
-        # await self.add_product(page)
-        # 合集功能
-        await self.add_collection(page)
-        # 原创选择
-        await self.add_original(page)
-        # 检测上传状态
-        await self.detect_upload_status(page)
-        if self.publish_date != 0:
-            await self.set_schedule_time_tencent(page, self.publish_date)
-        # 添加短标题
-        await self.add_short_title(page)
-
-        await self.click_publish(page)
-
-        await context.storage_state(path=f"{self.account_file}")  # 保存cookie
-        tencent_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+        ) as context:
+            # 创建一个新的页面
+            page = await context.new_page()
+            timer = StepTimer("tencent", tencent_logger)
+            # 访问指定的 URL
+            with timer.step("goto"):
+                await page.goto("https://channels.weixin.qq.com/platform/post/create")
+                tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
+                # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
+                await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
+            # await page.wait_for_selector('input[type="file"]', timeout=10000)
+            file_input = page.locator('input[type="file"]')
+            with timer.step("select_file"):
+                await file_input.set_input_files(self.file_path)
+
+            async def fill_form():
+                # 填充标题和话题
+                await self.add_title_tags(page)
+                # 添加商品
+                # await self.add_product(page)
+                # 合集功能
+                await self.add_collection(page)
+                # 原创选择
+                await self.add_original(page)
+                if self.publish_date != 0:
+                    await self.set_schedule_time_tencent(page, self.publish_date)
+                # 添加短标题
+                await self.add_short_title(page)
+
+            # 表单填写与上传检测并行，二者都完成后再点击发表
+            await UploadPipeline("tencent", tencent_logger, timer).run(
+                lambda: self.detect_upload_status(page), fill_form, lambda: self.click_publish(page))
+
+            await context.storage_state(path=f"{self.account_file}")  # 保存cookie
+            tencent_logger.success('  [-]cookie更新完毕！')
+            await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
 
     async def add_short_title(self, page):
         short_title_element = page.get_by_text("短标题", exact=True).locator("..").locator(
@@ -187,6 +199,8 @@ class TencentVideo(object):
             await short_title_element.fill(short_title)
 
     async def click_publish(self, page):
+        # 超过 PUBLISH_WAIT_TIMEOUT 仍未跳转到作品列表按失败处理
+        deadline = WaitDeadline("tencent", "publish", signal="url platform/post/list")
         while True:
             try:
                 publish_buttion = page.locator('div.form-btns button:has-text("发表")')
@@ -203,28 +217,21 @@ class TencentVideo(object):
                 else:
                     tencent_logger.exception(f"  [-] Exception: {e}")
                     tencent_logger.info("  [-] 视频正在发布中...")
+                    deadline.check()
                     await asyncio.sleep(0.5)
 
     async def detect_upload_status(self, page):
-        while True:
-            # 匹配删除按钮，代表视频上传完毕，如果不存在，代表视频正在上传，则等待
-            try:
-                # 匹配删除按钮，代表视频上传完毕
-                if "weui-desktop-btn_disabled" not in await page.get_by_role("button", name="发表").get_attribute(
-                        'class'):
-                    tencent_logger.info("  [-]视频上传完毕")
-                    break
-                else:
-                    tencent_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-                    # 出错了视频出错
-                    if await page.locator('div.status-msg.error').count() and await page.locator(
-                            'div.media-status-content div.tag-inner:has-text("删除")').count():
-                        tencent_logger.error("  [-] 发现上传出错了...准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                tencent_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+        # 匹配"发表"按钮可用或合并接口返回，代表视频上传完毕；出错时删除后重新上传
+        await wait_for_upload(
+            page,
+            platform="tencent",
+            responses=UPLOAD_DONE_RESPONSES,
+            function=PUBLISH_ENABLED_FUNCTION,
+            failure_selectors=['div.status-msg.error'],
+            on_failure=self.handle_upload_error,
+            logger=tencent_logger,
+        )
+        tencent_logger.info("  [-]视频上传完毕")
 
     async def add_title_tags(self, page):
         await page.locator("div.input-editor").click()
@@ -267,5 +274,5 @@ class TencentVideo(object):
                 await page.locator('button:has-text("声明原创"):visible').click()
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with use_browser_pool(headless=False):
+            await self.upload()
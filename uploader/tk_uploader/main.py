@@ -8,7 +8,10 @@ import asyncio
 from uploader.tk_uploader.tk_config import Tk_Locator
 from utils.base_social_media import set_init_script
 from utils.files_times import get_absolute_path
-from utils.log import tiktok_logger, TIKTOK_SCREENSHOT_DIR
+from utils.diagnostics import DiagnosticsRecorder
+from utils.log import tiktok_logger
+from utils.timing import StepTimer
+from utils.waiters import UPLOAD_WAIT_TIMEOUT, WaitDeadline
 
 
 async def cookie_auth(account_file):
@@ -80,6 +83,8 @@ class TiktokVideo(object):
         self.tags = tags
         self.publish_date = publish_date
         self.account_file = account_file
+        self.diagnostics = DiagnosticsRecorder('tiktok')
+        self.timer = StepTimer('tiktok', tiktok_logger)
         self.locator_base = None
 
 
@@ -145,7 +150,8 @@ class TiktokVideo(object):
         await file_chooser.set_files(self.file_path)
 
     async def upload(self, playwright: Playwright) -> None:
-        browser = await playwright.firefox.launch(headless=False)
+        with self.timer.step("launch"):
+            browser = await playwright.firefox.launch(headless=False)
         context = await browser.new_context(
             storage_state=f"{self.account_file}",
             permissions=[],  # 禁用所有权限请求
@@ -156,10 +162,11 @@ class TiktokVideo(object):
         context = await set_init_script(context)
         page = await context.new_page()
 
-        await page.goto("https://www.tiktok.com/creator-center/upload")
-        tiktok_logger.info(f'[+]Uploading-------{self.title}.mp4')
+        with self.timer.step("goto"):
+            await page.goto("https://www.tiktok.com/creator-center/upload")
+            tiktok_logger.info(f'[+]Uploading-------{self.title}.mp4')
 
-        await page.wait_for_url("https://www.tiktok.com/tiktokstudio/upload", timeout=10000)
+            await page.wait_for_url("https://www.tiktok.com/tiktokstudio/upload", timeout=10000)
 
         try:
             await page.wait_for_selector('iframe[data-tt="Upload_index_iframe"], div.upload-container', timeout=10000)
@@ -169,22 +176,28 @@ class TiktokVideo(object):
 
         await self.choose_base_locator(page)
 
-        upload_button = self.locator_base.locator(
-            'button:has-text("Select video"):visible')
-        await upload_button.wait_for(state='visible')  # 确保按钮可见
+        with self.timer.step("select_file"):
+            upload_button = self.locator_base.locator(
+                'button:has-text("Select video"):visible')
+            await upload_button.wait_for(state='visible')  # 确保按钮可见
 
-        async with page.expect_file_chooser() as fc_info:
-            await upload_button.click()
-        file_chooser = await fc_info.value
-        await file_chooser.set_files(self.file_path)
+            async with page.expect_file_chooser() as fc_info:
+                await upload_button.click()
+            file_chooser = await fc_info.value
+            await file_chooser.set_files(self.file_path)
 
-        await self.add_title_tags(page)
+        with self.timer.step("form"):
+            await self.add_title_tags(page)
         # detact upload status
-        await self.detect_upload_status(page)
+        with self.timer.step("transfer"):
+            await self.detect_upload_status(page)
+        # 定时发布需在上传完成后设置，计入表单步骤（报告中同名步骤的耗时累加）
         if self.publish_date != 0:
-            await self.set_schedule_time(page, self.publish_date)
+            with self.timer.step("form"):
+                await self.set_schedule_time(page, self.publish_date)
 
-        await self.click_publish(page)
+        with self.timer.step("publish"):
+            await self.click_publish(page)
 
         await context.storage_state(path=f"{self.account_file}")  # save cookie
         tiktok_logger.info('  [-] update cookie！')
@@ -228,6 +241,8 @@ class TiktokVideo(object):
 
     async def click_publish(self, page):
         success_flag_div = '#\\:r9\\:'
+        # 超过 PUBLISH_WAIT_TIMEOUT 仍未出现发布成功提示按失败处理
+        deadline = WaitDeadline("tiktok", "publish", signal=f"visible {success_flag_div}")
         while True:
             try:
                 publish_button = self.locator_base.locator('div.btn-post')
@@ -244,12 +259,16 @@ class TiktokVideo(object):
                 else:
                     tiktok_logger.exception(f"  [-] Exception: {e}")
                     tiktok_logger.info("  [-] video publishing")
-                    screenshot_path = os.path.join(TIKTOK_SCREENSHOT_DIR, f"tiktok_{int(asyncio.get_event_loop().time()*1000)}.png")
-                    await page.screenshot(path=screenshot_path, full_page=True)
+                    # 只在内存中保留最近几帧，发布失败时才落盘（utils/diagnostics.py）
+                    await self.diagnostics.capture(page, 'publishing')
+                    deadline.check()
                     await asyncio.sleep(0.5)
 
     async def detect_upload_status(self, page):
+        # 超过 UPLOAD_WAIT_TIMEOUT 发布按钮仍不可用按失败处理
+        deadline = WaitDeadline("tiktok", "upload", UPLOAD_WAIT_TIMEOUT, signal="enabled div.btn-post > button")
         while True:
+            deadline.check()
             try:
                 if await self.locator_base.locator('div.btn-post > button').get_attribute("disabled") is None:
                     tiktok_logger.info("  [-]video uploaded.")
@@ -260,7 +279,7 @@ class TiktokVideo(object):
                     if await self.locator_base.locator('button[aria-label="Select file"]').count():
                         tiktok_logger.info("  [-] found some error while uploading now retry...")
                         await self.handle_upload_error(page)
-            except:
+            except Exception:
                 tiktok_logger.info("  [-] video uploading...")
                 await asyncio.sleep(2)
 
@@ -272,6 +291,11 @@ class TiktokVideo(object):
             self.locator_base = page.locator(Tk_Locator.default) 
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        outcome = "failed"
+        try:
+            async with async_playwright() as playwright:
+                await self.upload(playwright)
+            outcome = "success"
+        finally:
+            self.timer.log_report(outcome)
 
@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import async_playwright, Page
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script, launch_chromium_with_codecs
-from utils.log import xiaohongshu_logger, XIAOHONGSHU_SCREENSHOT_DIR
+from utils.base_social_media import set_init_script
+from utils.browser_pool import get_browser_pool, use_browser_pool
+from utils.log import xiaohongshu_logger
+from utils.timing import StepTimer
+from utils.upload_pipeline import UploadPipeline
+from utils.diagnostics import DiagnosticsRecorder
+from utils.waiters import ResponseSignal, WaitDeadline, wait_for_upload
+
+# 分片上传到 ros-upload 后，不带 partNumber 的 POST 为合并请求
+UPLOAD_DONE_RESPONSES = [ResponseSignal(r"ros-upload.*\.xiaohongshu\.com/.*[?&]uploadId=", method="POST",
+                                        exclude=r"[?&]partNumber=")]
 
 
 async def cookie_auth(account_file):
@@ -75,6 +84,7 @@ class XiaoHongShuVideo(object):
         self.tags = tags
         self.publish_date = publish_date
         self.account_file = account_file
+        self.diagnostics = DiagnosticsRecorder('xhs')
         self.date_format = '%Y年%m月%d日 %H:%M'
         self.local_executable_path = LOCAL_CHROME_PATH
         self.thumbnail_path = thumbnail_path
@@ -110,112 +120,100 @@ class XiaoHongShuVideo(object):
         xiaohongshu_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        browser = await launch_chromium_with_codecs(playwright, headless=False, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(
+    async def upload(self) -> None:
+        # 从常驻浏览器池中获取独立的浏览器上下文，使用指定的 cookie 文件
+        pool = get_browser_pool(headless=False)
+        async with pool.context(
+            trace="xhs",
             viewport={"width": 1600, "height": 900},
             storage_state=f"{self.account_file}",
             permissions=[],  # 禁用所有权限请求
             geolocation=None,  # 禁用地理位置
             locale='zh-CN',  # 设置语言为中文
             timezone_id='Asia/Shanghai'  # 设置时区
-        )
-        context = await set_init_script(context)
+        ) as context:
+            # 创建一个新的页面
+            page = await context.new_page()
+            timer = StepTimer("xhs", xiaohongshu_logger)
+            # 访问指定的 URL
+            with timer.step("goto"):
+                await page.goto("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
+                xiaohongshu_logger.info(f'[+]正在上传-------{self.title}.mp4')
+                # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
+                xiaohongshu_logger.info(f'[-] 正在打开主页...')
+                await page.wait_for_url("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
+            # 点击 "上传视频" 按钮
+            with timer.step("select_file"):
+                await page.locator("div[class^='upload-content'] input[class='upload-input']").set_input_files(self.file_path)
 
-        # 创建一个新的页面
-        page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
-        xiaohongshu_logger.info(f'[+]正在上传-------{self.title}.mp4')
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        xiaohongshu_logger.info(f'[-] 正在打开主页...')
-        await page.wait_for_url("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
-        # 点击 "上传视频" 按钮
-        await page.locator("div[class^='upload-content'] input[class='upload-input']").set_input_files(self.file_path)
+            async def transfer():
+                # 等待上传成功 2025.01.08修改在原有基础上兼容两种页面：upload-input 后的 preview-new 中出现"上传成功"
+                await wait_for_upload(
+                    page,
+                    platform="xhs",
+                    responses=UPLOAD_DONE_RESPONSES,
+                    selectors=['input.upload-input ~ div[class*="preview-new"] div.stage:has-text("上传成功")'],
+                    logger=xiaohongshu_logger,
+                )
+                xiaohongshu_logger.info("[+] 检测到上传成功标识!")
 
-        # 等待页面跳转到指定的 URL 2025.01.08修改在原有基础上兼容两种页面
-        while True:
-            try:
-                # 等待upload-input元素出现
-                upload_input = await page.wait_for_selector('input.upload-input', timeout=3000)
-                # 获取下一个兄弟元素
-                preview_new = await upload_input.query_selector(
-                    'xpath=following-sibling::div[contains(@class, "preview-new")]')
-                if preview_new:
-                    # 在preview-new元素中查找包含"上传成功"的stage元素
-                    stage_elements = await preview_new.query_selector_all('div.stage')
-                    upload_success = False
-                    for stage in stage_elements:
-                        text_content = await page.evaluate('(element) => element.textContent', stage)
-                        if '上传成功' in text_content:
-                            upload_success = True
-                            break
-                    if upload_success:
-                        xiaohongshu_logger.info("[+] 检测到上传成功标识!")
-                        break  # 成功检测到上传成功后跳出循环
-                    else:
-                        print("  [-] 未找到上传成功标识，继续等待...")
+            async def fill_form():
+                # 填充标题和话题
+                # 检查是否存在包含输入框的元素
+                # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
+                # 选择文件后编辑区与上传进度同时出现，等标题输入框（两种页面之一）可见即可填写
+                title_container = page.locator('div.plugin.title-container').locator('input.d-text')
+                await page.locator('div.plugin.title-container input.d-text, .notranslate').first.wait_for(state='visible')
+                xiaohongshu_logger.info(f'  [-] 正在填充标题和话题...')
+                if await title_container.count():
+                    await title_container.fill(self.title[:30])
                 else:
-                    print("  [-] 正在上传，继续等待...")
-                    await asyncio.sleep(1)
-            except Exception as e:
-                print(f"  [-] 检测过程出错: {str(e)}，重新尝试...")
-                await asyncio.sleep(0.5)  # 等待0.5秒后重新尝试
+                    titlecontainer = page.locator(".notranslate")
+                    await titlecontainer.click()
+                    await page.keyboard.press("Backspace")
+                    await page.keyboard.press("Control+KeyA")
+                    await page.keyboard.press("Delete")
+                    await page.keyboard.type(self.title)
+                    await page.keyboard.press("Enter")
+                css_selector = ".tiptap.ProseMirror" # 更新为正确的CSS选择器，匹配contenteditable的div元素
+                for _, tag in enumerate(self.tags, start=1):
+                    await page.type(css_selector, "#" + tag)
+                    await asyncio.sleep(2)
+                    await page.keyboard.press("Enter")
+                xiaohongshu_logger.info(f'总共添加{len(self.tags)}个话题')
 
-        # 填充标题和话题
-        # 检查是否存在包含输入框的元素
-        # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
-        await asyncio.sleep(1)
-        xiaohongshu_logger.info(f'  [-] 正在填充标题和话题...')
-        title_container = page.locator('div.plugin.title-container').locator('input.d-text')
-        if await title_container.count():
-            await title_container.fill(self.title[:30])
-        else:
-            titlecontainer = page.locator(".notranslate")
-            await titlecontainer.click()
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("Control+KeyA")
-            await page.keyboard.press("Delete")
-            await page.keyboard.type(self.title)
-            await page.keyboard.press("Enter")
-        css_selector = ".tiptap.ProseMirror" # 更新为正确的CSS选择器，匹配contenteditable的div元素
-        for _, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await asyncio.sleep(2)
-            await page.keyboard.press("Enter")
-        xiaohongshu_logger.info(f'总共添加{len(self.tags)}个话题')
+                if self.publish_date != 0:
+                    await self.set_schedule_time_xiaohongshu(page, self.publish_date)
 
-        if self.publish_date != 0:
-            await self.set_schedule_time_xiaohongshu(page, self.publish_date)
+            async def publish():
+                # 判断视频是否发布成功，超过 PUBLISH_WAIT_TIMEOUT 仍未跳转按失败处理
+                deadline = WaitDeadline("xhs", "publish", signal="url publish/success")
+                while True:
+                    try:
+                        # 等待包含"定时发布"文本的button元素出现并点击
+                        if self.publish_date != 0:
+                            await page.locator('button:has-text("定时发布")').click()
+                        else:
+                            await page.locator('button:has-text("发布")').click()
+                        await page.wait_for_url(
+                            "https://creator.xiaohongshu.com/publish/success?**",
+                            timeout=3000
+                        )  # 如果自动跳转到作品页面，则代表发布成功
+                        xiaohongshu_logger.success("  [-]视频发布成功")
+                        break
+                    except Exception:
+                        xiaohongshu_logger.info("  [-] 视频正在发布中...")
+                        # 只在内存中保留最近几帧，发布失败时才落盘（utils/diagnostics.py）
+                        await self.diagnostics.capture(page, 'publishing')
+                        deadline.check()
+                        await asyncio.sleep(0.5)
 
-        # 判断视频是否发布成功
-        while True:
-            try:
-                # 等待包含"定时发布"文本的button元素出现并点击
-                if self.publish_date != 0:
-                    await page.locator('button:has-text("定时发布")').click()
-                else:
-                    await page.locator('button:has-text("发布")').click()
-                await page.wait_for_url(
-                    "https://creator.xiaohongshu.com/publish/success?**",
-                    timeout=3000
-                )  # 如果自动跳转到作品页面，则代表发布成功
-                xiaohongshu_logger.success("  [-]视频发布成功")
-                break
-            except:
-                xiaohongshu_logger.info("  [-] 视频正在发布中...")
-                screenshot_path = os.path.join(XIAOHONGSHU_SCREENSHOT_DIR, f"xiaohongshu_{int(asyncio.get_event_loop().time()*1000)}.png")
-                await page.screenshot(path=screenshot_path, full_page=True)
-                await asyncio.sleep(0.5)
+            # 标题、话题、定时与视频传输并行，二者都完成后再点击发布
+            await UploadPipeline("xhs", xiaohongshu_logger, timer).run(transfer, fill_form, publish)
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
-        xiaohongshu_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+            await context.storage_state(path=self.account_file)  # 保存cookie
+            xiaohongshu_logger.success('  [-]cookie更新完毕！')
+            await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
     
     async def set_thumbnail(self, page: Page, thumbnail_path: str):
         if thumbnail_path:
@@ -336,7 +334,7 @@ class XiaoHongShuVideo(object):
             return False
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with use_browser_pool(headless=False):
+            await self.upload()
 
 
@@ -0,0 +1,267 @@
+"""
+上传带宽调度。
+
+多个上传同时 set_input_files 时会抢占同一条上行带宽，每个传输都变慢，部分平台因此超时。
+BandwidthScheduler 放在上传器前面，决定一个发布项何时可以开始传输：
+  - 按实测的总上行速率准入：再加入一个传输后每个传输分到的速率仍不低于 BANDWIDTH_MIN_RATE_KBPS 才放行；
+    还没有测量结果时最多同时 BANDWIDTH_INITIAL_SLOTS 个，UPLOAD_BANDWIDTH_KBPS 可直接指定上行带宽
+  - 每个平台同时在传的字节数不超过上限（单个文件超过上限时，该平台空闲即放行）
+  - 等待中的发布项按定时发布时间排序，越早发布越先传输，立即发布的最优先
+
+速率测量：传输期间链路被 n 个传输平分，文件大小 / ∫(1/n)dt 即为链路总速率的一个样本，按 EWMA 平滑。
+只有走完 UploadPipeline transfer 轨道的传输才计入测量；失败或不经过流水线的发布项在结束时释放名额，不计入。
+
+benchmarks/bench_bandwidth.py 用模拟的链路对比调度前后的超时数和完成顺序。
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from utils import metrics
+
+# 是否启用带宽调度
+BANDWIDTH_SCHEDULER = os.getenv('BANDWIDTH_SCHEDULER', '1').lower() not in ('0', 'false', 'no')
+# 上行带宽（KB/s），0 表示根据已完成的传输自动测量
+UPLOAD_BANDWIDTH_KBPS = float(os.getenv('UPLOAD_BANDWIDTH_KBPS', '0'))
+# 新传输加入后每个传输至少应分到的速率（KB/s）
+BANDWIDTH_MIN_RATE_KBPS = float(os.getenv('BANDWIDTH_MIN_RATE_KBPS', '1024'))
+# 尚无测量结果时同时进行的传输数
+BANDWIDTH_INITIAL_SLOTS = int(os.getenv('BANDWIDTH_INITIAL_SLOTS', '2'))
+# 单平台同时在传的字节数上限（MB），可用 BANDWIDTH_PLATFORM_MAX_MB_OVERRIDES="douyin=2048,xhs=512" 单独设置
+BANDWIDTH_PLATFORM_MAX_MB = float(os.getenv('BANDWIDTH_PLATFORM_MAX_MB', '1024'))
+BANDWIDTH_PLATFORM_LIMITS = {}
+for _item in os.getenv('BANDWIDTH_PLATFORM_MAX_MB_OVERRIDES', '').split(','):
+    if '=' in _item:
+        _name, _limit = _item.split('=', 1)
+        BANDWIDTH_PLATFORM_LIMITS[_name.strip()] = float(_limit) * 1024 * 1024
+# 速率测量的 EWMA 系数，越大越偏向最近的样本
+BANDWIDTH_EWMA_ALPHA = float(os.getenv('BANDWIDTH_EWMA_ALPHA', '0.3'))
+
+ESTIMATED_RATE = metrics.gauge('sau_upload_bandwidth_bytes_per_second', 'Estimated aggregate upload rate')
+BYTES_IN_FLIGHT = metrics.gauge('sau_upload_bytes_in_flight', 'Bytes admitted for transfer', ['platform'])
+WAITING = metrics.gauge('sau_upload_transfers_waiting', 'Publish items waiting for bandwidth')
+
+
+@dataclass(eq=False)
+class Ticket:
+    platform: str
+    size: int
+    priority: float
+    seq: int
+    future: asyncio.Future
+    requested_at: float
+    admitted_at: Optional[float] = None
+    started_at: Optional[float] = None
+    # ∫(1/n)dt：传输期间按平分带宽折算的独占时长
+    share: float = 0.0
+    released: bool = False
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def publish_priority(publish_date) -> float:
+    """定时发布时间 -> 排序键（时间戳）；立即发布（0 / None）排在最前。"""
+    if isinstance(publish_date, datetime):
+        return publish_date.timestamp()
+    return float(publish_date or 0)
+
+
+@dataclass
+class BandwidthScheduler:
+    capacity: Optional[float] = None          # 固定的上行带宽（字节/秒），None 表示自动测量
+    min_rate: float = BANDWIDTH_MIN_RATE_KBPS * 1024
+    initial_slots: int = BANDWIDTH_INITIAL_SLOTS
+    platform_limit: float = BANDWIDTH_PLATFORM_MAX_MB * 1024 * 1024
+    platform_limits: Dict[str, float] = field(default_factory=lambda: dict(BANDWIDTH_PLATFORM_LIMITS))
+    alpha: float = BANDWIDTH_EWMA_ALPHA
+    clock: Callable[[], float] = time.monotonic
+
+    def __post_init__(self):
+        self.estimate: Optional[float] = None
+        self._waiting: List[Ticket] = []
+        self._admitted: List[Ticket] = []
+        self._in_flight: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._last_change = self.clock()
+        self.samples = 0
+
+    # ------------------------------------------------------------ 公共接口
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self.capacity or self.estimate
+
+    async def acquire(self, platform: str, size: int, priority: float = 0.0) -> Ticket:
+        """排队等待准入，返回的 Ticket 必须 release()。等待期间被取消时自动出队。"""
+        ticket = Ticket(platform, max(0, int(size)), priority, next(self._seq),
+                        asyncio.get_running_loop().create_future(), self.clock())
+        heapq.heappush(self._waiting, ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.admitted_at is None:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._publish_stats()
+            else:
+                self.release(ticket, measured=False)
+            raise
+        return ticket
+
+    def start(self, ticket: Ticket) -> None:
+        """文件开始占用带宽（set_input_files 之后），此后的时长计入速率测量。"""
+        if ticket.released or ticket.started_at is not None:
+            return
+        self._advance()
+        ticket.started_at = self.clock()
+
+    def abort_transfer(self, ticket: Ticket) -> None:
+        """传输失败但发布项继续（如改用页面上传）：保留名额，之前的时长不计入测量，下次 start() 重新计时。"""
+        if ticket.released or ticket.started_at is None:
+            return
+        self._advance()
+        ticket.started_at = None
+        ticket.share = 0.0
+
+    def release(self, ticket: Ticket, measured: bool = True) -> None:
+        """释放名额；measured=True 且传输完整时用它更新速率估计。重复调用无副作用。"""
+        if ticket.released:
+            return
+        self._advance()
+        ticket.released = True
+        if ticket.admitted_at is not None:
+            self._admitted.remove(ticket)
+            self._in_flight[ticket.platform] -= ticket.size
+        if measured and ticket.started_at is not None and ticket.share > 0 and ticket.size > 0:
+            self._observe(ticket.size / ticket.share)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 1) if self.rate else None,
+            "measured": self.capacity is None,
+            "samples": self.samples,
+            "admitted": len(self._admitted),
+            "transferring": len(self._transferring()),
+            "waiting": len(self._waiting),
+            "bytes_in_flight": {name: size for name, size in self._in_flight.items() if size},
+        }
+
+    # ------------------------------------------------------------ 内部实现
+
+    def _transferring(self) -> List[Ticket]:
+        return [t for t in self._admitted if t.started_at is not None]
+
+    def _advance(self) -> None:
+        """把上次状态变化以来的时间按当前并发数折算到每个在传的传输上。"""
+        now = self.clock()
+        active = self._transferring()
+        if active:
+            delta = (now - self._last_change) / len(active)
+            for ticket in active:
+                ticket.share += delta
+        self._last_change = now
+
+    def _observe(self, sample: float) -> None:
+        self.samples += 1
+        self.estimate = sample if self.estimate is None else self.alpha * sample + (1 - self.alpha) * self.estimate
+
+    def _link_has_room(self) -> bool:
+        if not self._admitted:
+            return True
+        rate = self.rate
+        if rate is None:
+            return len(self._admitted) < self.initial_slots
+        return rate / (len(self._admitted) + 1) >= self.min_rate
+
+    def _platform_has_room(self, ticket: Ticket) -> bool:
+        in_flight = self._in_flight.get(ticket.platform, 0)
+        limit = self.platform_limits.get(ticket.platform, self.platform_limit)
+        return in_flight == 0 or in_flight + ticket.size <= limit
+
+    def _dispatch(self) -> None:
+        """按优先级依次放行；平台字节数已满的跳过（不阻塞其他平台），链路没有余量时停止。"""
+        for ticket in sorted(self._waiting):
+            if not self._link_has_room():
+                break
+            if ticket.future.done() or not self._platform_has_room(ticket):
+                continue
+            self._waiting.remove(ticket)
+            ticket.admitted_at = self.clock()
+            self._admitted.append(ticket)
+            self._in_flight[ticket.platform] = self._in_flight.get(ticket.platform, 0) + ticket.size
+            ticket.future.set_result(ticket)
+        heapq.heapify(self._waiting)
+        self._publish_stats()
+
+    def _publish_stats(self) -> None:
+        ESTIMATED_RATE.set(self.rate or 0)
+        BYTES_IN_FLIGHT.replace({(name,): size for name, size in self._in_flight.items()})
+        WAITING.set(len(self._waiting))
+
+
+# Future 绑定在事件循环上，因此按循环维护调度器（与浏览器池相同）
+_schedulers: Dict[asyncio.AbstractEventLoop, BandwidthScheduler] = {}
+_current: contextvars.ContextVar[Optional[Ticket]] = contextvars.ContextVar('bandwidth_ticket', default=None)
+
+
+def get_scheduler() -> BandwidthScheduler:
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        capacity = UPLOAD_BANDWIDTH_KBPS * 1024 if UPLOAD_BANDWIDTH_KBPS > 0 else None
+        scheduler = _schedulers[loop] = BandwidthScheduler(capacity=capacity)
+    return scheduler
+
+
+@asynccontextmanager
+async def admit(platform: str, file, publish_date=0):
+    """
+    在上传器外层使用：等待带宽准入后执行整个发布项，结束时释放名额。
+    名额绑定在当前上下文中，UploadPipeline 的 transfer 轨道据此标记传输开始和完成。
+    """
+    if not BANDWIDTH_SCHEDULER:
+        yield None
+        return
+    try:
+        size = Path(file).stat().st_size
+    except OSError:
+        size = 0
+    scheduler = get_scheduler()
+    ticket = await scheduler.acquire(platform, size, publish_priority(publish_date))
+    token = _current.set(ticket)
+    try:
+        yield ticket
+    finally:
+        _current.reset(token)
+        scheduler.release(ticket, measured=False)
+
+
+def transfer_started() -> None:
+    ticket = _current.get()
+    if ticket is not None:
+        get_scheduler().start(ticket)
+
+
+def transfer_finished() -> None:
+    """传输轨道正常结束：提前释放名额（发布和等待结果阶段不再占用带宽）并更新速率估计。"""
+    ticket = _current.get()
+    if ticket is not None:
+        get_scheduler().release(ticket)
+
+
+def transfer_failed() -> None:
+    """传输失败：停止计时，不计入速率测量；名额保留到发布项结束（admit 退出）或在同一名额下重新传输。"""
+    ticket = _current.get()
+    if ticket is not None:
+        get_scheduler().abort_transfer(ticket)
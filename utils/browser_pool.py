@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright
+
+from conf import LOCAL_CHROME_PATH
+from utils import log
+from utils.base_social_media import launch_chromium_with_codecs, set_init_script
+from utils.timing import traced
+
+# 每个事件循环中最多保持的常驻浏览器数量
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+# 单个浏览器累计发放多少个 context 后回收重启，避免长时间运行的内存膨胀
+BROWSER_MAX_CONTEXTS = int(os.getenv('BROWSER_MAX_CONTEXTS', '20'))
+# 单个浏览器同时打开的 context 数超过该值时，优先启动新浏览器分担
+BROWSER_MAX_OPEN_CONTEXTS = int(os.getenv('BROWSER_MAX_OPEN_CONTEXTS', '4'))
+
+
+class _PooledBrowser:
+    def __init__(self, browser, launch_seconds: float):
+        self.browser = browser
+        self.launched_at = time.time()
+        self.launch_seconds = launch_seconds
+        self.open_contexts = 0
+        self.served_contexts = 0
+        # 达到回收阈值后不再发放新 context，最后一个 context 关闭时关闭浏览器
+        self.retired = False
+
+    @property
+    def alive(self) -> bool:
+        return not self.retired and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Keep a few warm Chromium instances per event loop and hand out one isolated
+    BrowserContext per account/job instead of launching a browser every time.
+
+    Browsers are launched lazily through launch_chromium_with_codecs (or eagerly with start()),
+    shared until they have served max_contexts_per_browser contexts, then retired and relaunched.
+    """
+
+    def __init__(self, headless: bool = False, size: int = BROWSER_POOL_SIZE,
+                 max_contexts_per_browser: int = BROWSER_MAX_CONTEXTS,
+                 max_open_contexts: int = BROWSER_MAX_OPEN_CONTEXTS,
+                 executable_path: Optional[str] = LOCAL_CHROME_PATH):
+        self.headless = headless
+        self.size = max(1, size)
+        self.max_contexts_per_browser = max(1, max_contexts_per_browser)
+        self.max_open_contexts = max(1, max_open_contexts)
+        self.executable_path = executable_path
+        self.closed = False
+        self._playwright = None
+        self._browsers: List[_PooledBrowser] = []
+        self._contexts: Dict[object, _PooledBrowser] = {}
+        self._lock = asyncio.Lock()
+        # 统计信息
+        self.launches = 0
+        self.recycles = 0
+        self.contexts_served = 0
+        self.launch_seconds_total = 0.0
+
+    async def start(self, warm: Optional[int] = None) -> "BrowserPool":
+        """Pre-launch `warm` browsers (defaults to the pool size) so the first jobs skip the launch cost."""
+        async with self._lock:
+            target = min(self.size, warm if warm is not None else self.size)
+            while len(self._live_browsers()) < target:
+                self._browsers.append(await self._launch())
+        return self
+
+    async def new_context(self, **context_kwargs):
+        """Open a context (stealth script applied) on the least loaded browser; pair with release()."""
+        entry = await self._acquire()
+        try:
+            context = await entry.browser.new_context(**context_kwargs)
+            context = await set_init_script(context)
+        except Exception:
+            await self._release_entry(entry)
+            raise
+        self._contexts[context] = entry
+        return context
+
+    async def release(self, context) -> None:
+        entry = self._contexts.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            log.browser_logger.warning(f"[browser_pool] context close failed: {e}")
+        if entry is not None:
+            await self._release_entry(entry)
+
+    @asynccontextmanager
+    async def context(self, trace: Optional[str] = None, **context_kwargs):
+        """trace: 平台名，按 UPLOAD_TRACE 为该 context 录制 Playwright trace（utils/timing.traced）。"""
+        context = await self.new_context(**context_kwargs)
+        try:
+            if trace:
+                async with traced(context, trace):
+                    yield context
+            else:
+                yield context
+        finally:
+            await self.release(context)
+
+    async def close(self) -> None:
+        async with self._lock:
+            self.closed = True
+            for entry in self._browsers:
+                await self._close_browser(entry)
+            self._browsers.clear()
+            self._contexts.clear()
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    log.browser_logger.warning(f"[browser_pool] playwright stop failed: {e}")
+                self._playwright = None
+
+    def stats(self) -> dict:
+        live = self._live_browsers()
+        return {
+            "headless": self.headless,
+            "size": self.size,
+            "browsers": len(live),
+            "retiring_browsers": len([b for b in self._browsers if b.retired]),
+            "open_contexts": sum(b.open_contexts for b in self._browsers),
+            "contexts_served": self.contexts_served,
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "avg_launch_seconds": round(self.launch_seconds_total / self.launches, 3) if self.launches else 0.0,
+        }
+
+    def _live_browsers(self) -> List[_PooledBrowser]:
+        return [b for b in self._browsers if b.alive]
+
+    async def _acquire(self) -> _PooledBrowser:
+        async with self._lock:
+            if self.closed:
+                raise RuntimeError("browser pool is closed")
+            # 清理已断开的浏览器（崩溃或被手动关闭）
+            self._browsers = [b for b in self._browsers if b.browser.is_connected()]
+            live = self._live_browsers()
+            idle = [b for b in live if b.open_contexts < self.max_open_contexts]
+            if idle:
+                entry = min(idle, key=lambda b: b.open_contexts)
+            elif len(live) < self.size:
+                entry = await self._launch()
+                self._browsers.append(entry)
+            elif live:
+                # 池已满：超额复用负载最低的浏览器，而不是阻塞等待
+                entry = min(live, key=lambda b: b.open_contexts)
+            else:
+                entry = await self._launch()
+                self._browsers.append(entry)
+            entry.open_contexts += 1
+            entry.served_contexts += 1
+            self.contexts_served += 1
+            if entry.served_contexts >= self.max_contexts_per_browser:
+                entry.retired = True
+            return entry
+
+    async def _release_entry(self, entry: _PooledBrowser) -> None:
+        async with self._lock:
+            entry.open_contexts = max(0, entry.open_contexts - 1)
+            if entry.retired and entry.open_contexts == 0 and entry in self._browsers:
+                self._browsers.remove(entry)
+                self.recycles += 1
+                await self._close_browser(entry)
+
+    async def _launch(self) -> _PooledBrowser:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        started = time.perf_counter()
+        browser = await launch_chromium_with_codecs(self._playwright, headless=self.headless,
+                                                    executable_path=self.executable_path)
+        elapsed = time.perf_counter() - started
+        self.launches += 1
+        self.launch_seconds_total += elapsed
+        log.browser_logger.info(f"[browser_pool] launched browser #{self.launches} headless={self.headless} in {elapsed:.2f}s")
+        return _PooledBrowser(browser, elapsed)
+
+    @staticmethod
+    async def _close_browser(entry: _PooledBrowser) -> None:
+        try:
+            await entry.browser.close()
+        except Exception as e:
+            log.browser_logger.warning(f"[browser_pool] browser close failed: {e}")
+
+
+# Playwright 对象绑定在创建它的事件循环上，因此按 (loop, headless) 维护池
+_pools: Dict[Tuple[asyncio.AbstractEventLoop, bool], BrowserPool] = {}
+_pool_users: Dict[Tuple[asyncio.AbstractEventLoop, bool], int] = {}
+
+
+def get_browser_pool(headless: bool = False) -> BrowserPool:
+    """Return the pool bound to the running event loop, creating it on first use."""
+    key = (asyncio.get_running_loop(), headless)
+    pool = _pools.get(key)
+    if pool is None or pool.closed:
+        pool = _pools[key] = BrowserPool(headless=headless)
+    return pool
+
+
+@asynccontextmanager
+async def use_browser_pool(headless: bool = False):
+    """
+    Keep the running loop's pool open for the duration of the block.
+    Nested users share the same warm browsers; the outermost user closes the pool on exit.
+    """
+    key = (asyncio.get_running_loop(), headless)
+    pool = get_browser_pool(headless)
+    _pool_users[key] = _pool_users.get(key, 0) + 1
+    try:
+        yield pool
+    finally:
+        _pool_users[key] -= 1
+        if _pool_users[key] <= 0:
+            _pool_users.pop(key, None)
+            if _pools.get(key) is pool:
+                _pools.pop(key, None)
+            await pool.close()
+
+
+def browser_pool_stats() -> List[dict]:
+    return [pool.stats() for pool in list(_pools.values())]
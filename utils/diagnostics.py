@@ -0,0 +1,109 @@
+"""
+发布过程的诊断截图。
+
+等待发布结果的循环中不再每 0.5~1 秒保存一张整页 PNG，而是由 DiagnosticsRecorder 在内存中保留最近几帧
+可视区域的 JPEG（截图有最小间隔，开销远小于整页截图），只有发布失败时才写入磁盘：
+  logs/diagnostics/<平台>_<时间>_<id>/NN_<标签>.jpg + reason.txt
+写入后按总大小和保存天数清理旧的诊断目录，最旧的先删除。
+"""
+import os
+import shutil
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from conf import BASE_DIR
+
+DIAG_DIR = Path(BASE_DIR / "logs" / "diagnostics")
+# 内存中保留的最近截图数
+DIAG_RING_SIZE = int(os.getenv('DIAG_RING_SIZE', '20'))
+# 两次截图的最小间隔（秒），间隔内的 capture() 直接跳过
+DIAG_CAPTURE_INTERVAL = float(os.getenv('DIAG_CAPTURE_INTERVAL', '2'))
+DIAG_JPEG_QUALITY = int(os.getenv('DIAG_JPEG_QUALITY', '60'))
+# 诊断目录的总大小上限（MB）和最长保存天数
+DIAG_MAX_MB = float(os.getenv('DIAG_MAX_MB', '200'))
+DIAG_MAX_AGE_DAYS = float(os.getenv('DIAG_MAX_AGE_DAYS', '7'))
+# 单次截图的超时（毫秒），页面卡住时不拖慢等待循环
+DIAG_CAPTURE_TIMEOUT_MS = int(os.getenv('DIAG_CAPTURE_TIMEOUT_MS', '3000'))
+
+
+@dataclass(frozen=True)
+class Frame:
+    taken_at: float
+    label: str
+    data: bytes
+
+
+class DiagnosticsRecorder:
+    """每个上传器实例一个：capture() 写入环形缓冲，flush() 在失败时落盘，clear() 在成功时丢弃。"""
+
+    def __init__(self, platform: str, capacity: int = DIAG_RING_SIZE, interval: float = DIAG_CAPTURE_INTERVAL,
+                 quality: int = DIAG_JPEG_QUALITY):
+        self.platform = platform
+        self.interval = interval
+        self.quality = quality
+        self.frames: deque[Frame] = deque(maxlen=max(1, capacity))
+        self._last_capture = 0.0
+
+    async def capture(self, page, label: str = '', force: bool = False) -> bool:
+        """截取可视区域 JPEG 放入缓冲；距上次截图不足 interval 秒时跳过。截图失败不影响发布流程。"""
+        now = time.monotonic()
+        if not force and now - self._last_capture < self.interval:
+            return False
+        self._last_capture = now
+        try:
+            data = await page.screenshot(type='jpeg', quality=self.quality, full_page=False,
+                                         timeout=DIAG_CAPTURE_TIMEOUT_MS)
+        except Exception:
+            return False
+        self.frames.append(Frame(time.time(), label, data))
+        return True
+
+    def clear(self) -> None:
+        self.frames.clear()
+
+    def flush(self, reason: str = '') -> Path | None:
+        """把缓冲中的截图写入新的诊断目录并清空缓冲，随后执行磁盘配额清理；没有截图时返回 None。"""
+        if not self.frames:
+            return None
+        frames = list(self.frames)
+        self.frames.clear()
+        target = DIAG_DIR / f"{self.platform}_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        target.mkdir(parents=True, exist_ok=True)
+        for index, frame in enumerate(frames):
+            label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in frame.label)[:40]
+            (target / f"{index:02d}_{label or 'frame'}.jpg").write_bytes(frame.data)
+        first, last = frames[0].taken_at, frames[-1].taken_at
+        (target / "reason.txt").write_text(
+            f"platform: {self.platform}\nreason: {reason}\nframes: {len(frames)}\n"
+            f"from: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))}\n"
+            f"to: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last))}\n", encoding='utf-8')
+        enforce_quota()
+        return target
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def enforce_quota(root: Path | None = None, max_bytes: float | None = None, max_age_days: float | None = None) -> int:
+    """删除超过保存天数的诊断目录，再从最旧的开始删除直到总大小不超过上限；返回删除的目录数。"""
+    root = root or DIAG_DIR
+    max_bytes = DIAG_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    max_age_days = DIAG_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if not root.is_dir():
+        return 0
+    entries = sorted(((d.stat().st_mtime, d) for d in root.iterdir() if d.is_dir()), key=lambda e: e[0])
+    deadline = time.time() - max_age_days * 86400
+    sizes = {d: _dir_size(d) for _, d in entries}
+    total = sum(sizes.values())
+    removed = 0
+    for mtime, d in entries:
+        if mtime >= deadline and total <= max_bytes:
+            break
+        shutil.rmtree(d, ignore_errors=True)
+        total -= sizes[d]
+        removed += 1
+    return removed
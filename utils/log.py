@@ -1,9 +1,9 @@
+import threading
 from pathlib import Path
 from sys import stdout
 from loguru import logger
 
 from conf import BASE_DIR
-from pathlib import Path as _Path
 
 
 def log_formatter(record: dict) -> str:
@@ -44,23 +44,31 @@ logger.remove()
 # Add a standard console handler
 logger.add(stdout, colorize=True, format=log_formatter)
 
-douyin_logger = create_logger('douyin', 'logs/douyin.log')
-tencent_logger = create_logger('tencent', 'logs/tencent.log')
-xhs_logger = create_logger('xhs', 'logs/xhs.log')
-tiktok_logger = create_logger('tiktok', 'logs/tiktok.log')
-bilibili_logger = create_logger('bilibili', 'logs/bilibili.log')
-kuaishou_logger = create_logger('kuaishou', 'logs/kuaishou.log')
-baijiahao_logger = create_logger('baijiahao', 'logs/baijiahao.log')
-xiaohongshu_logger = create_logger('xiaohongshu', 'logs/xiaohongshu.log')
+# 各业务日志在首次使用时才创建（import utils.log 不再产生任何文件），
+# 只用到某个平台时不会为其余平台打开日志文件
+_LOGGERS = {
+    'douyin_logger': ('douyin', 'logs/douyin.log'),
+    'tencent_logger': ('tencent', 'logs/tencent.log'),
+    'xhs_logger': ('xhs', 'logs/xhs.log'),
+    'tiktok_logger': ('tiktok', 'logs/tiktok.log'),
+    'bilibili_logger': ('bilibili', 'logs/bilibili.log'),
+    'kuaishou_logger': ('kuaishou', 'logs/kuaishou.log'),
+    'baijiahao_logger': ('baijiahao', 'logs/baijiahao.log'),
+    'xiaohongshu_logger': ('xiaohongshu', 'logs/xiaohongshu.log'),
+    # 与平台无关的基础设施：浏览器池、扫码登录会话、发布任务队列与并发发布
+    'browser_logger': ('browser', 'logs/browser.log'),
+    'login_logger': ('login', 'logs/login.log'),
+    'publish_logger': ('publish', 'logs/publish.log'),
+}
 
-# screenshot directories (created on import)
-_SCREENSHOT_BASE = BASE_DIR / 'logs'
-DOUYIN_SCREENSHOT_DIR = str(_Path(_SCREENSHOT_BASE / 'douyin_screenshot'))
-KUAISHOU_SCREENSHOT_DIR = str(_Path(_SCREENSHOT_BASE / 'kuaishou_screenshot'))
-TIKTOK_SCREENSHOT_DIR = str(_Path(_SCREENSHOT_BASE / 'tiktok_screenshot'))
-XIAOHONGSHU_SCREENSHOT_DIR = str(_Path(_SCREENSHOT_BASE / 'xiaohongshu_screenshot'))
+_lock = threading.Lock()
 
-_Path(DOUYIN_SCREENSHOT_DIR).mkdir(parents=True, exist_ok=True)
-_Path(KUAISHOU_SCREENSHOT_DIR).mkdir(parents=True, exist_ok=True)
-_Path(TIKTOK_SCREENSHOT_DIR).mkdir(parents=True, exist_ok=True)
-_Path(XIAOHONGSHU_SCREENSHOT_DIR).mkdir(parents=True, exist_ok=True)
+
+def __getattr__(name: str):
+    """from utils.log import douyin_logger 等首次访问时创建对应的日志文件，之后直接读取模块属性。"""
+    if name not in _LOGGERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lock:
+        if name not in globals():
+            globals()[name] = create_logger(*_LOGGERS[name])
+    return globals()[name]
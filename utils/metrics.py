@@ -0,0 +1,304 @@
+"""
+Prometheus 指标。
+
+不依赖 prometheus_client：指标保存在进程内存中，/metrics 按 Prometheus 文本格式（0.0.4）输出。
+  - Counter / Histogram 在事件发生时更新（加锁 + 二分查找桶，开销为微秒级）
+  - 队列深度、浏览器数量等状态类指标由 collector 在抓取时读取（一次带索引的 COUNT 和若干内存读取）
+因此抓取的开销与指标序列数成正比，和请求量无关，每 5 秒抓取一次没有负担。
+
+标签值应当是有限集合（平台名、路由模板、结果），不要用文件名、账号等作为标签。
+
+独立运行的发布 worker（python -m myUtils.jobs）可用 --metrics-port 单独暴露自己的指标。
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 是否启用 /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认桶（秒）：覆盖毫秒级的数据库查询到分钟级的上传
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, values: Dict[Tuple[str, ...], float]) -> None:
+        """整体替换所有序列，collector 用它去掉已消失的标签组合（如已关闭的浏览器池）。"""
+        with self._lock:
+            self._values = dict(values)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签组合 -> [各桶计数（非累计，最后一个为 +Inf）, sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {round(total, 6)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 模块被重复导入时返回已有指标，而不是注册两份
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """注册抓取时执行的回调，用于刷新状态类 Gauge；回调出错只记入 sau_metrics_collector_errors_total。"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        started = time.perf_counter()
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                COLLECTOR_ERRORS.inc(collector=getattr(collector, '__name__', 'collector'))
+                print(f"[metrics] collector failed: {e}")
+        SCRAPE_SECONDS.set(time.perf_counter() - started)
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+add_collector = REGISTRY.add_collector
+render = REGISTRY.render
+
+COLLECTOR_ERRORS = counter('sau_metrics_collector_errors_total', 'Collectors that raised during a scrape',
+                           ['collector'])
+SCRAPE_SECONDS = gauge('sau_metrics_collect_seconds', 'Time spent running collectors for the last scrape')
+
+# ---------------------------------------------------------------- 公共指标
+
+HTTP_REQUESTS = counter('sau_http_requests_total', 'HTTP requests by route template, method and status',
+                        ['route', 'method', 'status'])
+HTTP_LATENCY = histogram('sau_http_request_duration_seconds', 'HTTP request latency by route template',
+                         ['route', 'method'])
+UPLOADS = counter('sau_uploads_total', 'Publish items by platform and outcome', ['platform', 'outcome'])
+UPLOAD_LATENCY = histogram('sau_upload_duration_seconds', 'Publish item wall time by platform and outcome',
+                           ['platform', 'outcome'])
+UPLOAD_STEPS = histogram('sau_upload_step_seconds', 'Uploader step durations (utils/timing.py)',
+                         ['platform', 'step'])
+COOKIE_CHECKS = histogram('sau_cookie_validation_seconds', 'Cookie validation latency',
+                          ['platform', 'method', 'result'])
+DB_QUERY = histogram('sau_db_query_seconds', 'Time a pooled SQLite connection is held per call', [],
+                     FAST_BUCKETS)
+DB_POOL_WAIT = histogram('sau_db_pool_wait_seconds', 'Time spent waiting for a pooled SQLite connection', [],
+                         FAST_BUCKETS)
+PUBLISH_JOBS = gauge('sau_publish_jobs', 'Publish jobs waiting or running (queue depth)', ['status'])
+BROWSERS = gauge('sau_browser_pool_browsers', 'Live browsers in the shared browser pools', ['headless'])
+BROWSER_CONTEXTS = gauge('sau_browser_pool_open_contexts', 'Open contexts in the shared browser pools', ['headless'])
+
+
+def _record_steps(record: dict) -> None:
+    platform = record.get('platform') or 'unknown'
+    for step, seconds in (record.get('steps') or {}).items():
+        UPLOAD_STEPS.observe(seconds, platform=platform, step=step)
+
+
+def _collect_browser_pools() -> None:
+    # 浏览器池模块会连带导入 Playwright；尚未导入说明还没有任何浏览器池，不为抓取而导入
+    browser_pool = sys.modules.get('utils.browser_pool')
+    if browser_pool is None:
+        return
+    browsers: Dict[Tuple[str, ...], float] = {}
+    contexts: Dict[Tuple[str, ...], float] = {}
+    for stats in browser_pool.browser_pool_stats():
+        key = (str(stats['headless']).lower(),)
+        browsers[key] = browsers.get(key, 0) + stats['browsers']
+        contexts[key] = contexts.get(key, 0) + stats['open_contexts']
+    BROWSERS.replace(browsers)
+    BROWSER_CONTEXTS.replace(contexts)
+
+
+def _collect_publish_jobs() -> None:
+    from myUtils.jobs import count_active_jobs
+
+    PUBLISH_JOBS.replace({(status,): count for status, count in count_active_jobs().items()})
+
+
+_install_lock = threading.Lock()
+_installed = False
+
+
+def install_default_collectors() -> None:
+    """接入步骤耗时监听、浏览器池和发布队列；服务进程和独立 worker 启动时各调用一次。"""
+    from utils import timing
+
+    with _install_lock:
+        global _installed
+        if _installed:
+            return
+        _installed = True
+    timing.add_listener(_record_steps)
+    add_collector(_collect_browser_pools)
+    add_collector(_collect_publish_jobs)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """在后台线程中提供 /metrics（供没有 Flask 的独立 worker 进程使用）。"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics').start()
+    print(f"[metrics] serving http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,258 @@
+"""
+上传步骤计时。
+
+各平台上传器用 StepTimer 记录 goto / select_file / transfer / form / publish 等步骤的耗时，
+结束时除了输出一行日志，还会把一条记录追加到 JSONL 文件（UPLOAD_SPANS_FILE，由后台线程写入），并通知已注册的监听器：
+  {"ts", "platform", "outcome", "total", "steps": {步骤: 秒}, "job", "file", "account"}
+job / file / account 来自 bind() 绑定的上下文变量（发布任务和批量发布时自动绑定）。
+
+按平台、步骤统计 p50 / p95：
+    python -m utils.timing --since 7d [--platform douyin] [--by-day]
+
+UPLOAD_TRACE=1 时为每个发布项录制 Playwright trace（UPLOAD_TRACE=failed 只保留失败的），
+保存到 logs/traces/，可用 `playwright show-trace <文件>` 查看。
+"""
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from conf import BASE_DIR
+
+# 步骤耗时记录文件，设为空字符串则不写文件
+UPLOAD_SPANS_FILE = os.getenv('UPLOAD_SPANS_FILE', str(BASE_DIR / 'logs' / 'upload_spans.jsonl'))
+# Playwright trace：0 关闭 / 1 全部保留 / failed 只保留失败的发布项
+UPLOAD_TRACE = os.getenv('UPLOAD_TRACE', '0').lower()
+TRACE_DIR = Path(BASE_DIR / 'logs' / 'traces')
+
+_labels: contextvars.ContextVar[Dict[str, object]] = contextvars.ContextVar('upload_span_labels', default={})
+_listeners: List[Callable[[dict], None]] = []
+
+
+class _SpanWriter:
+    """
+    后台线程追加 JSONL：emit() 多在事件循环上调用（上传器结束时），文件写入不应阻塞循环。
+    进程退出时写完队列中剩余的记录。
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def write(self, path: Path, line: str) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="upload-spans-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        self._queue.put((path, line))
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def flush(self) -> None:
+        """等待已提交的记录全部写入。"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, line = item
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(path, 'a', encoding='utf-8') as f:
+                        f.write(line)
+                except OSError as e:
+                    print(f"[timing] write spans failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+_writer = _SpanWriter()
+
+
+def bind(**labels) -> contextvars.Token:
+    """在当前上下文中追加标签（job、file、account 等），之后在此上下文中完成的 StepTimer 记录都会带上。"""
+    return _labels.set({**_labels.get(), **labels})
+
+
+def unbind(token: contextvars.Token) -> None:
+    _labels.reset(token)
+
+
+def current_labels() -> Dict[str, object]:
+    return dict(_labels.get())
+
+
+def add_listener(listener: Callable[[dict], None]) -> None:
+    """注册记录监听器（如 /metrics 的直方图），每条 StepTimer 记录完成时同步调用。"""
+    _listeners.append(listener)
+
+
+def emit(record: dict) -> None:
+    if UPLOAD_SPANS_FILE:
+        _writer.write(Path(UPLOAD_SPANS_FILE), json.dumps(record, ensure_ascii=False) + "\n")
+    for listener in list(_listeners):
+        try:
+            listener(record)
+        except Exception as e:
+            print(f"[timing] listener failed: {e}")
+
+
+class StepTimer:
+    """
+    记录上传流程中每个步骤的耗时，结束时输出一行报告，便于对比优化前后的时间。
+    可并发使用：并行执行的步骤各自计时，报告中的 total 为整体墙钟时间。
+    """
+
+    def __init__(self, name: str, logger=None):
+        self.name = name
+        self.logger = logger
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def record(self, name: str, seconds: float) -> None:
+        self.steps.append((name, seconds))
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self) -> Dict[str, float]:
+        result: Dict[str, float] = {}
+        for name, seconds in self.steps:
+            result[name] = round(result.get(name, 0.0) + seconds, 3)
+        result["total"] = round(self.total, 3)
+        return result
+
+    def log_report(self, outcome: Optional[str] = None) -> Dict[str, float]:
+        """输出报告并写入记录；outcome 为 success / failed，未知时为 None。"""
+        report = self.report()
+        line = " ".join(f"{name}={seconds:.2f}s" for name, seconds in report.items())
+        message = f"[{self.name}] 步骤耗时: {line}"
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
+        steps = dict(report)
+        total = steps.pop("total")
+        emit({"ts": round(time.time(), 3), "platform": self.name, "outcome": outcome, "total": total,
+              "steps": steps, **current_labels()})
+        return report
+
+
+@asynccontextmanager
+async def traced(context, name: str):
+    """按 UPLOAD_TRACE 为 context 录制 Playwright trace；未开启时什么也不做。"""
+    if UPLOAD_TRACE not in ('1', 'true', 'yes', 'failed'):
+        yield None
+        return
+    try:
+        await context.tracing.start(screenshots=True, snapshots=True)
+    except Exception as e:
+        print(f"[timing] start trace failed: {e}")
+        yield None
+        return
+    failed = False
+    try:
+        yield context
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        path = None
+        if failed or UPLOAD_TRACE != 'failed':
+            TRACE_DIR.mkdir(parents=True, exist_ok=True)
+            labels = current_labels()
+            path = TRACE_DIR / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{labels.get('job', 'na')}_{os.getpid()}.zip"
+        try:
+            await context.tracing.stop(path=str(path) if path else None)
+        except Exception as e:
+            print(f"[timing] stop trace failed: {e}")
+
+
+def _percentile(values: List[float], q: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def load_records(path: Path, since: float = 0.0, platform: Optional[str] = None):
+    if not path.exists():
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('ts', 0) >= since and (platform is None or record.get('platform') == platform):
+                yield record
+
+
+def summarize(records, by_day: bool = False) -> List[dict]:
+    """按 (日期,) 平台、步骤汇总 count / p50 / p95 / max，total 作为一个步骤一起统计。"""
+    samples: Dict[tuple, List[float]] = defaultdict(list)
+    for record in records:
+        day = time.strftime('%Y-%m-%d', time.localtime(record['ts'])) if by_day else ''
+        steps = dict(record.get('steps') or {}, total=record.get('total', 0.0))
+        for step, seconds in steps.items():
+            samples[(day, record.get('platform'), step)].append(float(seconds))
+    return [{
+        "day": day, "platform": platform, "step": step, "count": len(values),
+        "p50": round(_percentile(values, 50), 3), "p95": round(_percentile(values, 95), 3), "max": round(max(values), 3),
+    } for (day, platform, step), values in sorted(samples.items())]
+
+
+def _parse_since(value: str) -> float:
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    if value and value[-1] in units:
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return float(value or 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upload step latency report")
+    parser.add_argument('--file', default=UPLOAD_SPANS_FILE, help="步骤耗时记录文件")
+    parser.add_argument('--since', default='', help="只统计最近一段时间，如 30m / 24h / 7d，或 unix 时间戳")
+    parser.add_argument('--platform')
+    parser.add_argument('--by-day', action='store_true', help="按天分组，观察耗时随时间的变化")
+    args = parser.parse_args()
+
+    rows = summarize(load_records(Path(args.file), _parse_since(args.since), args.platform), args.by_day)
+    if not rows:
+        print("no records")
+        return
+    day_col = f"{'day':<11} " if args.by_day else ''
+    print(f"{day_col}{'platform':<10} {'step':<16} {'count':>6} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+    for row in rows:
+        day = f"{row['day']:<11} " if args.by_day else ''
+        print(f"{day}{row['platform']:<10} {row['step']:<16} {row['count']:>6} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['max']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from utils import bandwidth
+from utils.timing import StepTimer
+
+T = TypeVar("T")
+
+
+class UploadPipeline:
+    """
+    上传流程分为两条并行的轨道，只在点击发布前汇合：
+      - transfer: 等待视频文件传输/转码完成
+      - form:     填写标题、话题、简介、定时等与上传无关的表单项
+    单个视频的耗时约为 max(transfer, form) 而不是二者之和。
+    任一轨道失败时取消另一条轨道并向上抛出异常。
+    """
+
+    def __init__(self, name: str, logger=None, timer: Optional[StepTimer] = None):
+        self.name = name
+        self.logger = logger
+        self.timer = timer or StepTimer(name, logger)
+
+    async def _track(self, name: str, func: Callable[[], Awaitable[None]]) -> None:
+        with self.timer.step(name):
+            if name == "transfer":
+                bandwidth.transfer_started()
+            try:
+                await func()
+            except BaseException:
+                if name == "transfer":
+                    # 失败（或被取消）的传输时长不计入速率测量
+                    bandwidth.transfer_failed()
+                raise
+        if name == "transfer":
+            # 传输完成后立即把带宽名额让给排队中的发布项
+            bandwidth.transfer_finished()
+
+    async def run(
+        self,
+        transfer: Callable[[], Awaitable[None]],
+        form: Callable[[], Awaitable[None]],
+        publish: Callable[[], Awaitable[T]],
+    ) -> T:
+        tracks = [
+            asyncio.ensure_future(self._track("transfer", transfer)),
+            asyncio.ensure_future(self._track("form", form)),
+        ]
+        outcome = "failed"
+        try:
+            try:
+                await asyncio.gather(*tracks)
+            except BaseException:
+                for track in tracks:
+                    track.cancel()
+                await asyncio.gather(*tracks, return_exceptions=True)
+                raise
+            with self.timer.step("publish"):
+                result = await publish()
+            if result is not False:
+                outcome = "success"
+            return result
+        finally:
+            self.timer.log_report(outcome)
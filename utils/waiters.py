@@ -0,0 +1,207 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, Optional, Sequence, Tuple, Union
+
+# 等待上传完成的默认硬超时（秒）
+UPLOAD_WAIT_TIMEOUT = float(os.getenv('UPLOAD_WAIT_TIMEOUT', '1800'))
+# 页面内 wait_for_function 的检测间隔（毫秒）；不用 raf，避免窗口被遮挡时停止检测
+DOM_POLL_INTERVAL_MS = int(os.getenv('DOM_POLL_INTERVAL_MS', '200'))
+# 点击发布后等待发布成功（页面跳转等）的硬超时（秒）
+PUBLISH_WAIT_TIMEOUT = float(os.getenv('PUBLISH_WAIT_TIMEOUT', '300'))
+
+
+class UploadWaitTimeout(TimeoutError):
+    """在硬超时内没有等到任何完成信号。"""
+
+    def __init__(self, platform: str, stage: str, timeout: float, elapsed: float, signals: Sequence[str]):
+        self.platform = platform
+        self.stage = stage
+        self.timeout = timeout
+        self.elapsed = elapsed
+        self.signals = list(signals)
+        super().__init__(f"[{platform}] {stage} not confirmed within {timeout:g}s "
+                         f"(elapsed {elapsed:.1f}s, waited for: {', '.join(self.signals) or '-'})")
+
+
+class UploadFailedError(RuntimeError):
+    """平台页面明确提示上传失败，且重试次数已用完。"""
+
+    def __init__(self, platform: str, stage: str, detail: str, failures: int):
+        self.platform = platform
+        self.stage = stage
+        self.detail = detail
+        self.failures = failures
+        super().__init__(f"[{platform}] {stage} failed after {failures} attempt(s): {detail}")
+
+
+class WaitDeadline:
+    """
+    轮询循环（反复点击发布并等待跳转、轮询上传状态）的硬超时。
+    每轮失败后调用 check()，超过 timeout 抛出 UploadWaitTimeout，发布项按失败处理（并落盘诊断截图）。
+    """
+
+    def __init__(self, platform: str, stage: str, timeout: float = PUBLISH_WAIT_TIMEOUT, signal: str = ""):
+        self.platform = platform
+        self.stage = stage
+        self.timeout = timeout
+        self.signal = signal
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def check(self) -> None:
+        if self.elapsed > self.timeout:
+            raise UploadWaitTimeout(self.platform, self.stage, self.timeout, self.elapsed,
+                                    [self.signal] if self.signal else [])
+
+
+@dataclass(frozen=True)
+class ResponseSignal:
+    """匹配上传/提交接口的响应：url 为正则，exclude 命中的请求忽略（如分片请求），check 校验 JSON 响应体。"""
+    url: str
+    method: Optional[str] = None
+    exclude: Optional[str] = None
+    check: Optional[Callable[[Any], bool]] = None
+
+    def describe(self) -> str:
+        return f"response {self.method or '*'} /{self.url}/"
+
+
+@dataclass(frozen=True)
+class WaitResult:
+    source: str
+    detail: str
+    elapsed: float
+
+
+Selector = Union[str, Tuple[str, str]]
+
+
+async def wait_for_upload(
+    page,
+    *,
+    platform: str,
+    stage: str = "upload",
+    timeout: float = UPLOAD_WAIT_TIMEOUT,
+    responses: Iterable[ResponseSignal] = (),
+    selectors: Iterable[Selector] = (),
+    function: Optional[str] = None,
+    function_arg: Any = None,
+    failure_selectors: Iterable[str] = (),
+    on_failure: Optional[Callable[[Any], Awaitable[None]]] = None,
+    max_failures: int = 3,
+    logger=None,
+    log_interval: float = 15.0,
+) -> WaitResult:
+    """
+    等待任一完成信号出现，返回最先命中的信号：
+      - responses: 平台确认上传/提交的网络响应（page 'response' 事件）
+      - selectors: 页面元素，str 表示出现即完成，(selector, state) 可指定 attached/visible/detached/hidden
+      - function: 页面内 JS 表达式，返回真值即完成
+    failure_selectors 出现时调用 on_failure(page) 重试（最多 max_failures 次），没有 on_failure 时直接抛出 UploadFailedError。
+    超过 timeout 抛出 UploadWaitTimeout。
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    responses = list(responses)
+    selectors = [(s, 'attached') if isinstance(s, str) else s for s in selectors]
+    failure_selectors = list(failure_selectors)
+    signals = [r.describe() for r in responses] + [f"{state} {sel}" for sel, state in selectors]
+    if function:
+        signals.append("function")
+    done = loop.create_future()
+
+    def finish(source: str, detail: str) -> None:
+        if not done.done():
+            done.set_result((source, detail))
+
+    async def on_response(response) -> None:
+        if done.done():
+            return
+        for signal in responses:
+            if not re.search(signal.url, response.url):
+                continue
+            if signal.exclude and re.search(signal.exclude, response.url):
+                continue
+            if signal.method and response.request.method != signal.method:
+                continue
+            if not response.ok:
+                continue
+            if signal.check is not None:
+                try:
+                    if not signal.check(await response.json()):
+                        continue
+                except Exception:
+                    continue
+            finish("response", response.url)
+            return
+
+    async def watch_selector(selector: str, state: str) -> None:
+        await page.wait_for_selector(selector, state=state, timeout=0)
+        finish("selector", selector)
+
+    async def watch_function() -> None:
+        await page.wait_for_function(function, arg=function_arg, polling=DOM_POLL_INTERVAL_MS, timeout=0)
+        finish("function", function)
+
+    async def watch_failure(selector: str) -> None:
+        failures = 0
+        while True:
+            await page.wait_for_selector(selector, state='visible', timeout=0)
+            failures += 1
+            if on_failure is None or failures > max_failures:
+                raise UploadFailedError(platform, stage, selector, failures)
+            if logger:
+                logger.warning(f"[{platform}] 检测到上传失败（第 {failures} 次），准备重试: {selector}")
+            await on_failure(page)
+            # 等待失败提示消失后再重新监听，避免同一个提示被重复计数
+            try:
+                await page.wait_for_selector(selector, state='hidden', timeout=30000)
+            except Exception:
+                pass
+
+    async def log_progress() -> None:
+        while True:
+            await asyncio.sleep(log_interval)
+            logger.info(f"[{platform}] 正在等待 {stage} 完成... ({loop.time() - started:.0f}s)")
+
+    if responses:
+        page.on("response", on_response)
+    tasks = [asyncio.ensure_future(watch_selector(sel, state)) for sel, state in selectors]
+    if function:
+        tasks.append(asyncio.ensure_future(watch_function()))
+    tasks += [asyncio.ensure_future(watch_failure(sel)) for sel in failure_selectors]
+    if logger and log_interval:
+        tasks.append(asyncio.ensure_future(log_progress()))
+
+    try:
+        waiting = set(tasks) | {done}
+        while not done.done():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise UploadWaitTimeout(platform, stage, timeout, loop.time() - started, signals)
+            finished, _ = await asyncio.wait(waiting, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not finished:
+                raise UploadWaitTimeout(platform, stage, timeout, loop.time() - started, signals)
+            for task in finished:
+                waiting.discard(task)
+                if task is not done and task.exception() is not None and not done.done():
+                    # 页面关闭、确认失败等，直接向上抛出
+                    raise task.exception()
+        source, detail = done.result()
+        elapsed = loop.time() - started
+        if logger:
+            logger.info(f"[{platform}] {stage} 已确认（{source}: {detail}），耗时 {elapsed:.1f}s")
+        return WaitResult(source, detail, elapsed)
+    finally:
+        if responses:
+            page.remove_listener("response", on_response)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)